@@ -1,7 +1,9 @@
+import asyncio
 from langchain_core.messages import SystemMessage, HumanMessage
-from core.config import get_llm
+from core.config import compact_prompts_enabled, get_llm
+from core.llm_cache import invoke_cached, ainvoke_cached
 from core.state import TradingState
-from tools.market_data import get_financial_metrics
+from tools.market_data import get_financial_metrics, summarize_financial_metrics
 import json
 
 FUNDAMENTAL_SYSTEM_PROMPT = """You are an expert Fundamental Analyst for Indian Stock Markets.
@@ -11,26 +13,46 @@ Conclude with a clear 'Undervalued', 'Overvalued', or 'Fairly Valued' assessment
 Be concise but highly analytical.
 """
 
-def fundamental_analyst_node(state: TradingState) -> dict:
+def _prepare_messages(state: TradingState):
+    """Fetches the data for the prompt. Returns (messages, None), or (None, result) to short-circuit."""
     ticker = state.get("ticker", "")
     if not ticker:
-        return {"fundamental_analysis": "Error: No ticker provided."}
+        return None, {"fundamental_analysis": "Error: No ticker provided."}
 
     # Fetch financial metrics
     metrics = get_financial_metrics(ticker)
     
     if not metrics or metrics.get("marketCap") is None:
-        return {"fundamental_analysis": f"Could not retrieve fundamental metrics for {ticker}."}
+        return None, {"fundamental_analysis": f"Could not retrieve fundamental metrics for {ticker}."}
 
-    metrics_str = json.dumps(metrics, indent=2)
+    if compact_prompts_enabled():
+        metrics_str = summarize_financial_metrics(metrics)
+    else:
+        metrics_str = json.dumps(metrics, indent=2)
 
-    llm = get_llm(temperature=0.1)
-    
     messages = [
         SystemMessage(content=FUNDAMENTAL_SYSTEM_PROMPT),
         HumanMessage(content=f"Analyze the following financial metrics for {ticker}:\n{metrics_str}")
     ]
+    return messages, None
+
+def fundamental_analyst_node(state: TradingState) -> dict:
+    messages, result = _prepare_messages(state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = invoke_cached("fundamental", llm, messages)
     
-    response = llm.invoke(messages)
-    
-    return {"fundamental_analysis": response.content}
+    return {"fundamental_analysis": content}
+
+async def afundamental_analyst_node(state: TradingState) -> dict:
+    """Async variant: data fetching runs in a worker thread and the LLM call is awaited."""
+    messages, result = await asyncio.to_thread(_prepare_messages, state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = await ainvoke_cached("fundamental", llm, messages)
+
+    return {"fundamental_analysis": content}
@@ -1,5 +1,6 @@
 from langchain_core.messages import SystemMessage, HumanMessage
 from core.config import get_llm
+from core.llm_cache import invoke_cached, ainvoke_cached
 from core.state import TradingState
 
 JUDGE_SYSTEM_PROMPT = """You are the Lead Portfolio Manager and Final Judge.
@@ -14,7 +15,7 @@ FINAL RECOMMENDATION: SELL
 Keep your synthesis concise, highlighting the most heavily weighted factors.
 """
 
-def judge_node(state: TradingState) -> dict:
+def _build_messages(state: TradingState) -> list:
     ticker = state.get("ticker", "Unknown")
     tech = state.get("technical_analysis", "")
     fund = state.get("fundamental_analysis", "")
@@ -37,13 +38,24 @@ def judge_node(state: TradingState) -> dict:
     {risk}
     """
 
-    llm = get_llm(temperature=0.3)
-    
-    messages = [
+    return [
         SystemMessage(content=JUDGE_SYSTEM_PROMPT),
         HumanMessage(content=f"Here are the analyst reports to synthesize:\n{synthesis_report}")
     ]
+
+def judge_node(state: TradingState) -> dict:
+    messages = _build_messages(state)
+
+    llm = get_llm(temperature=0.3)
+    content = invoke_cached("judge", llm, messages)
     
-    response = llm.invoke(messages)
-    
-    return {"final_recommendation": response.content}
+    return {"final_recommendation": content}
+
+async def ajudge_node(state: TradingState) -> dict:
+    """Async variant of judge_node; awaits the LLM instead of blocking a thread."""
+    messages = _build_messages(state)
+
+    llm = get_llm(temperature=0.3)
+    content = await ainvoke_cached("judge", llm, messages)
+
+    return {"final_recommendation": content}
@@ -1,5 +1,7 @@
+import asyncio
 from langchain_core.messages import SystemMessage, HumanMessage
 from core.config import get_llm
+from core.llm_cache import invoke_cached, ainvoke_cached
 from core.state import TradingState
 from tools.market_data import get_financial_metrics
 
@@ -10,10 +12,11 @@ Conclude with a clear 'High Risk', 'Medium Risk', or 'Low Risk' rating.
 Provide a concise risk assessment.
 """
 
-def risk_analyst_node(state: TradingState) -> dict:
+def _prepare_messages(state: TradingState):
+    """Fetches the data for the prompt. Returns (messages, None), or (None, result) to short-circuit."""
     ticker = state.get("ticker", "")
     if not ticker:
-        return {"risk_analysis": "Error: No ticker provided."}
+        return None, {"risk_analysis": "Error: No ticker provided."}
 
     # Fetch basic metrics necessary for risk (beta, 52 wk high/low)
     metrics = get_financial_metrics(ticker)
@@ -30,13 +33,29 @@ def risk_analyst_node(state: TradingState) -> dict:
             f"Debt to Equity: {metrics.get('debtToEquity')}\n"
         )
 
-    llm = get_llm(temperature=0.1)
-    
     messages = [
         SystemMessage(content=RISK_SYSTEM_PROMPT),
         HumanMessage(content=f"Evaluate the risk for {ticker} based on this data:\n{risk_data}")
     ]
+    return messages, None
+
+def risk_analyst_node(state: TradingState) -> dict:
+    messages, result = _prepare_messages(state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = invoke_cached("risk", llm, messages)
     
-    response = llm.invoke(messages)
-    
-    return {"risk_analysis": response.content}
+    return {"risk_analysis": content}
+
+async def arisk_analyst_node(state: TradingState) -> dict:
+    """Async variant: data fetching runs in a worker thread and the LLM call is awaited."""
+    messages, result = await asyncio.to_thread(_prepare_messages, state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = await ainvoke_cached("risk", llm, messages)
+
+    return {"risk_analysis": content}
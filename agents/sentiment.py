@@ -1,7 +1,9 @@
+import asyncio
 from langchain_core.messages import SystemMessage, HumanMessage
 from core.config import get_llm
+from core.llm_cache import invoke_cached, ainvoke_cached
 from core.state import TradingState
-from tools.search import search_financial_news
+from tools.search import search_financial_news, stock_news_query
 import json
 
 SENTIMENT_SYSTEM_PROMPT = """You are an expert Market Sentiment Analyst.
@@ -11,29 +13,44 @@ Conclude with a clear 'Bullish', 'Bearish', or 'Neutral' sentiment rating.
 Be concise.
 """
 
-def sentiment_analyst_node(state: TradingState) -> dict:
+def _prepare_messages(state: TradingState):
+    """Fetches the data for the prompt. Returns (messages, None), or (None, result) to short-circuit."""
     ticker = state.get("ticker", "")
     query = state.get("user_query", ticker)
     if not ticker:
-        return {"sentiment_analysis": "Error: No ticker provided."}
+        return None, {"sentiment_analysis": "Error: No ticker provided."}
 
     # Search DuckDuckGo for news
-    # Removing .NS/.BO for better search results if purely searching news
-    search_term = ticker.split(".")[0] + " share news Indian stock market"
-    news_items = search_financial_news(search_term, max_results=5)
+    news_items = search_financial_news(stock_news_query(ticker), max_results=5)
     
     if not news_items:
-        return {"sentiment_analysis": f"Could not find recent news for {ticker}."}
+        return None, {"sentiment_analysis": f"Could not find recent news for {ticker}."}
 
     news_str = json.dumps(news_items, indent=2)
 
-    llm = get_llm(temperature=0.2)
-    
     messages = [
         SystemMessage(content=SENTIMENT_SYSTEM_PROMPT),
         HumanMessage(content=f"Analyze the following recent news for {ticker}:\n{news_str}")
     ]
+    return messages, None
+
+def sentiment_analyst_node(state: TradingState) -> dict:
+    messages, result = _prepare_messages(state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.2)
+    content = invoke_cached("sentiment", llm, messages)
     
-    response = llm.invoke(messages)
-    
-    return {"sentiment_analysis": response.content}
+    return {"sentiment_analysis": content}
+
+async def asentiment_analyst_node(state: TradingState) -> dict:
+    """Async variant: the news search runs in a worker thread and the LLM call is awaited."""
+    messages, result = await asyncio.to_thread(_prepare_messages, state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.2)
+    content = await ainvoke_cached("sentiment", llm, messages)
+
+    return {"sentiment_analysis": content}
@@ -1,8 +1,13 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
 from langchain_core.messages import SystemMessage, HumanMessage
-from core.config import get_llm
+from core.config import compact_prompts_enabled, get_llm
+from core.llm_cache import invoke_cached, ainvoke_cached
 from core.state import TradingState
 from tools.market_data import get_stock_history
-from tools.technical_ind import add_all_indicators
+from tools.technical_ind import add_all_indicators, score_technicals, summarize_indicators
 import pandas as pd
 
 TECHNICAL_SYSTEM_PROMPT = """You are an expert Technical Analyst for Indian Stock Markets.
@@ -12,29 +17,82 @@ Conclude with a clear 'Bullish', 'Bearish', or 'Neutral' technical signal.
 Be concise but highly analytical.
 """
 
-def technical_analyst_node(state: TradingState) -> dict:
+# Rule-based signals at or above this confidence replace the LLM call when
+# pre-scoring is on (watchlist scans with prescore=true).
+PRESCORE_MIN_CONFIDENCE = float(os.getenv("PRESCORE_MIN_CONFIDENCE", "0.75"))
+
+_prescore: ContextVar[bool] = ContextVar("technical_prescore", default=False)
+
+
+@contextmanager
+def technical_prescoring(enabled: bool = True):
+    """Answer clear-cut technical setups inside this block from the rule engine, without Gemini."""
+    token = _prescore.set(enabled)
+    try:
+        yield
+    finally:
+        _prescore.reset(token)
+
+
+def _rule_based_text(ticker: str, scored: dict) -> str:
+    reasons = "\n".join(f"- {reason}" for reason in scored["reasons"])
+    return (
+        f"Rule-based technical read for {ticker}: {scored['signal']} "
+        f"(confidence {scored['confidence']:.2f}, score {scored['score']:+.2f}).\n"
+        f"{reasons}\n"
+        f"Technical signal: {scored['signal']}"
+    )
+
+
+def _prepare_messages(state: TradingState):
+    """Fetches the data for the prompt. Returns (messages, None), or (None, result) to short-circuit."""
     ticker = state.get("ticker", "")
     if not ticker:
-        return {"technical_analysis": "Error: No ticker provided for technical analysis."}
+        return None, {"technical_analysis": "Error: No ticker provided for technical analysis."}
 
     # Fetch data directly (Guarantees data availability without agent reasoning loops)
     df = get_stock_history(ticker, period="3mo")
     if df.empty:
-        return {"technical_analysis": f"Could not retrieve historical data for {ticker}."}
+        return None, {"technical_analysis": f"Could not retrieve historical data for {ticker}."}
     
     # Add indicators
     df_ind = add_all_indicators(df)
-    
-    # Get the last 10 days of data to provide to the LLM to avoid overwhelming context
-    recent_data = df_ind.tail(10).to_json(orient="records")
 
-    llm = get_llm(temperature=0.1)
+    if _prescore.get():
+        scored = score_technicals(df_ind)
+        if scored["confidence"] >= PRESCORE_MIN_CONFIDENCE:
+            return None, {"technical_analysis": _rule_based_text(ticker, scored), "technical_signal": scored}
     
+    if compact_prompts_enabled():
+        # Derived features plus a fixed-precision table, within the token budget
+        recent_data = summarize_indicators(df_ind, ticker)
+    else:
+        # Get the last 10 days of data to provide to the LLM to avoid overwhelming context
+        recent_data = df_ind.tail(10).to_json(orient="records")
+
     messages = [
         SystemMessage(content=TECHNICAL_SYSTEM_PROMPT),
         HumanMessage(content=f"Analyze the following recent technical data for {ticker}:\n{recent_data}")
     ]
+    return messages, None
+
+def technical_analyst_node(state: TradingState) -> dict:
+    messages, result = _prepare_messages(state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = invoke_cached("technical", llm, messages)
     
-    response = llm.invoke(messages)
-    
-    return {"technical_analysis": response.content}
+    return {"technical_analysis": content}
+
+async def atechnical_analyst_node(state: TradingState) -> dict:
+    """Async variant: data fetching runs in a worker thread and the LLM call is awaited."""
+    messages, result = await asyncio.to_thread(_prepare_messages, state)
+    if result is not None:
+        return result
+
+    llm = get_llm(temperature=0.1)
+    content = await ainvoke_cached("technical", llm, messages)
+
+    return {"technical_analysis": content}
@@ -1,11 +1,26 @@
-import os
+import asyncio
+import json
 import re
-from fastapi import FastAPI, HTTPException
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 
-from graph.workflow import build_graph
-from core.router import route_query
+from graph.workflow import get_graph
+from core.config import api_key_override
+from core.rate_limit import BATCH, get_rate_limit_stats, request_priority
+from core.router import aroute_query, astream_analysis, astream_query
+from core.state import initial_state
+from core.scanner import scan_tickers
+from core.screener import screen_universe
+from core.intraday import IntradayMonitor
+from core import jobs
+from core import tracing
+from core.llm_cache import get_stats as get_llm_cache_stats
+from core.prefetch import get_prefetch_stats
+from tools.market_data import get_cache_stats
+from tools.search import get_news_cache_stats
 
 app = FastAPI(
     title="Trade Today API",
@@ -13,14 +28,30 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Initialize the LangGraph app once globally (or per request if needed)
-# Depending on how the state depends on instantiation, we can also instantiate inside the endpoint.
-# But build_graph() likely returns a standard compiled StateGraph which can be shared.
-try:
-    swarm_app = build_graph()
-except Exception as e:
-    swarm_app = None
-    print(f"Error initializing swarm graph: {e}")
+def _swarm_app():
+    """The shared compiled async LangGraph app, or None if it failed to compile."""
+    try:
+        return get_graph(async_mode=True)
+    except Exception as e:
+        print(f"Error initializing swarm graph: {e}")
+        return None
+
+# Compile once at startup so the first request doesn't pay for it
+_swarm_app()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give every request an id (X-Request-ID, generated if absent) and collect the
+    spans it records: graph nodes, yfinance/DuckDuckGo fetches, cache lookups
+    and Gemini calls. Fetch them afterwards from GET /traces/{request_id}.
+    """
+    request_id = request.headers.get("x-request-id") or None
+    with tracing.start_trace(f"{request.method} {request.url.path}", request_id=request_id) as trace:
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = trace.request_id
+    return response
 
 class AnalyzeRequest(BaseModel):
     query: str
@@ -39,6 +70,48 @@ class WatchlistRequest(BaseModel):
     """Request model for watchlist scan."""
     tickers: List[str]  # e.g. ["RELIANCE.NS", "TCS.NS", "INFY.NS"]
     signal_filter: Optional[str] = None  # "BUY", "SELL", or None for all
+    max_concurrency: Optional[int] = None  # tickers analyzed at once (default: SCAN_MAX_CONCURRENCY)
+    ticker_timeout: Optional[float] = None  # seconds per ticker (default: SCAN_TICKER_TIMEOUT)
+    prescore: bool = False  # answer clear-cut technical setups with rules instead of the LLM
+
+
+class ScreenFilter(BaseModel):
+    """One numeric/categorical condition of a screen, e.g. rsi_14 < 40."""
+    field: str  # see core.screener.FIELDS
+    op: str  # <, <=, >, >=, ==, !=, between, in
+    value: Any
+
+
+class ScreenRequest(BaseModel):
+    """Request model for the two-stage universe screener."""
+    filters: List[ScreenFilter]
+    tickers: Optional[List[str]] = None  # default: every known NSE symbol (SYMBOL_MASTER_CSV)
+    sort_by: Optional[str] = None
+    descending: bool = True
+    top_k: Optional[int] = None  # survivors sent to the full pipeline (default: SCREEN_TOP_K)
+    analyze: bool = True  # run the LangGraph pipeline on the top-K survivors
+    prescore: bool = False  # as for /watchlist-scan
+    period: str = "6mo"
+    fetch_missing: bool = True  # False screens strictly from the local store
+
+
+class JobResponse(BaseModel):
+    """Status of a background analysis job."""
+    id: str
+    query: str
+    status: str  # queued, running, succeeded, failed, cancelled
+    progress: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class IntradayWatchlistRequest(BaseModel):
+    """Request model for starting the intraday monitor."""
+    tickers: List[str]
+    interval: Optional[str] = None  # "1m", "5m", ... (default: INTRADAY_INTERVAL)
+    poll_seconds: Optional[float] = None  # default: INTRADAY_POLL_SECONDS
 
 
 class StockSignal(BaseModel):
@@ -47,6 +120,8 @@ class StockSignal(BaseModel):
     recommendation: str  # "BUY", "HOLD", "SELL"
     risk_level: str
     summary: str
+    technical_source: str = "llm"  # "rules" when the technical read came from the rule engine
+    technical_confidence: Optional[float] = None  # rule engine confidence (rules only)
 
 
 class WatchlistResponse(BaseModel):
@@ -56,6 +131,16 @@ class WatchlistResponse(BaseModel):
     actionable: List[StockSignal]  # filtered BUY/SELL signals
 
 
+class ScreenResponse(BaseModel):
+    """Response model for the universe screener."""
+    universe_size: int
+    screened: int  # tickers with price data
+    passed: int  # tickers passing every filter
+    candidates: List[Dict[str, Any]]  # top-K survivors with their screen fields
+    signals: List[StockSignal]  # pipeline results for the candidates (empty when analyze is false)
+    stage_seconds: Dict[str, float]
+
+
 class SmartAnalyzeResponse(BaseModel):
     """Response model that handles both single-stock and multi-stock results."""
     intent: str
@@ -76,7 +161,40 @@ def health_check():
     """
     Health check endpoint to verify backend is running.
     """
-    return {"status": "ok", "graph_initialized": swarm_app is not None}
+    return {"status": "ok", "graph_initialized": _swarm_app() is not None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: per-span latency histograms, errors, cache hits, tokens and queue gauges."""
+    gauges = {}
+    limiter = get_rate_limit_stats()
+    gauges["trade_today_llm_queue_depth"] = limiter["queue_depth"]
+    gauges["trade_today_llm_wait_seconds_avg"] = limiter["wait_seconds_avg"]
+    gauges["trade_today_llm_requests_last_minute"] = limiter["requests_last_minute"]
+    gauges["trade_today_llm_tokens_last_minute"] = limiter["tokens_last_minute"]
+    gauges["trade_today_llm_cache_hit_rate"] = get_llm_cache_stats()["hit_rate"]
+    for name, stats in {**get_cache_stats(), "news": get_news_cache_stats()}.items():
+        gauges[f"trade_today_{name}_cache_hit_rate"] = stats["hit_rate"]
+        gauges[f"trade_today_{name}_cache_size"] = stats["size"]
+    for name, value in get_prefetch_stats().items():
+        gauges[f"trade_today_prefetch_{name}"] = value
+    return tracing.render_prometheus(gauges)
+
+
+@app.get("/traces/{request_id}")
+def get_trace(request_id: str):
+    """JSON trace of a recent request: every span with wall/CPU/wait time, tokens, cache hits and errors."""
+    trace = tracing.get_trace(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (only recent requests are kept).")
+    return trace
+
+
+@app.get("/llm/rate-limit")
+def rate_limit_stats():
+    """Gemini scheduler metrics: budget usage, queue depth per priority, wait times, 429 retries."""
+    return get_rate_limit_stats()
 
 
 @app.post("/analyze", response_model=AnalyzeResponse)
@@ -84,27 +202,14 @@ async def analyze_query(request: AnalyzeRequest):
     """
     Accepts a query about a stock and returns the swarm's analysis and final verdict.
     """
+    swarm_app = _swarm_app()
     if swarm_app is None:
         raise HTTPException(status_code=500, detail="Graph failed to initialize.")
 
-    if request.api_key:
-        os.environ["GEMINI_API_KEY"] = request.api_key
-
-    initial_state = {
-        "user_query": request.query,
-        "ticker": "",
-        "technical_analysis": "",
-        "fundamental_analysis": "",
-        "sentiment_analysis": "",
-        "risk_analysis": "",
-        "final_recommendation": "",
-        "messages": []
-    }
-
     try:
-        # We can use .invoke() for a full synchronous run, returning the final state
-        # The stream() approach is better for UI, but for a simple REST backend, invoke is easier.
-        final_state = swarm_app.invoke(initial_state)
+        # Await the async graph so other requests are served while the analysts wait on Gemini
+        with api_key_override(request.api_key):
+            final_state = await swarm_app.ainvoke(initial_state(request.query))
 
         return AnalyzeResponse(
             ticker=final_state.get("ticker", ""),
@@ -125,16 +230,126 @@ async def smart_analyze(request: AnalyzeRequest):
     - Single stock queries -> existing LangGraph pipeline
     - Compare/portfolio queries -> CrewAI crew
     """
-    if request.api_key:
-        os.environ["GEMINI_API_KEY"] = request.api_key
-
     try:
-        result = route_query(request.query)
+        with api_key_override(request.api_key):
+            result = await aroute_query(request.query, graph=_swarm_app())
         return SmartAnalyzeResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+def submit_job(request: AnalyzeRequest):
+    """
+    Queue a query for background analysis and return its job id immediately.
+    Same routing as /smart-analyze, but long crews no longer hold the HTTP request;
+    at most JOB_MAX_WORKERS jobs run at once.
+    """
+    return JobResponse(**jobs.submit_job(request.query, api_key=request.api_key))
+
+
+@app.get("/jobs", response_model=List[JobResponse])
+def list_jobs(status: Optional[str] = None, limit: int = 50):
+    """Most recent jobs, optionally filtered by status."""
+    return [JobResponse(**job) for job in jobs.list_jobs(status=status, limit=limit)]
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+    """Poll a job's status and progress."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobResponse(**job)
+
+
+@app.get("/jobs/{job_id}/result", response_model=SmartAnalyzeResponse)
+def get_job_result(job_id: str):
+    """Result of a finished job, shaped like the /smart-analyze response."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["result"] is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; no result available.")
+    return SmartAnalyzeResponse(**job["result"])
+
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+def cancel_job(job_id: str):
+    """Cancel a queued job, or discard the result of a running one."""
+    job = jobs.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JobResponse(**job)
+
+
+def _format_event(event: Dict[str, Any], fmt: str) -> str:
+    if fmt == "ndjson":
+        return json.dumps(event, default=str) + "\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def _stream_response(events, api_key: Optional[str], fmt: str) -> StreamingResponse:
+    """Serve an async iterator of event dicts as SSE (default) or NDJSON."""
+    if fmt not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+
+    async def body():
+        # The key override must be active inside the generator, which is where the graph runs
+        with api_key_override(api_key):
+            try:
+                async for event in events():
+                    yield _format_event(event, fmt)
+            except Exception as e:
+                yield _format_event({"event": "error", "detail": str(e)}, fmt)
+
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "text/event-stream"
+    return StreamingResponse(body(), media_type=media_type)
+
+
+@app.post("/analyze/stream")
+async def analyze_query_stream(request: AnalyzeRequest, format: str = "sse"):
+    """
+    Streaming variant of /analyze. Emits a "node" event as the supervisor and
+    each analyst finish, "token" events while the judge writes its verdict, and
+    a final "result" event with the same fields as AnalyzeResponse.
+    Use ?format=ndjson for newline-delimited JSON instead of server-sent events.
+    """
+    swarm_app = _swarm_app()
+    if swarm_app is None:
+        raise HTTPException(status_code=500, detail="Graph failed to initialize.")
+
+    async def events():
+        async for event in astream_analysis(initial_state(request.query), graph=swarm_app):
+            if event["event"] == "done":
+                state = event["state"]
+                yield {"event": "result", "result": AnalyzeResponse(
+                    ticker=state.get("ticker", ""),
+                    technical_analysis=state.get("technical_analysis", ""),
+                    fundamental_analysis=state.get("fundamental_analysis", ""),
+                    sentiment_analysis=state.get("sentiment_analysis", ""),
+                    risk_analysis=state.get("risk_analysis", ""),
+                    final_recommendation=state.get("final_recommendation", ""),
+                ).model_dump()}
+            else:
+                yield event
+
+    return _stream_response(events, request.api_key, format)
+
+
+@app.post("/smart-analyze/stream")
+async def smart_analyze_stream(request: AnalyzeRequest, format: str = "sse"):
+    """
+    Streaming variant of /smart-analyze. Emits a "route" event with the detected
+    intent and tickers, node/token events for single-stock queries, and a final
+    "result" event shaped like SmartAnalyzeResponse.
+    """
+    def events():
+        return astream_query(request.query, graph=_swarm_app())
+
+    return _stream_response(events, request.api_key, format)
+
+
 def _extract_recommendation(text: str) -> str:
     """Extract BUY/HOLD/SELL from the judge's final recommendation text."""
     text_upper = text.upper()
@@ -157,78 +372,100 @@ def _extract_risk_level(text: str) -> str:
     return "UNKNOWN"
 
 
+def _clean_text(text: str) -> str:
+    """Strip markdown formatting (headers, bold) and return the first meaningful sentence."""
+    cleaned = re.sub(r"[#*_`]+", "", text).strip()
+    # Get first meaningful sentence (skip empty lines)
+    for line in cleaned.split("\n"):
+        line = line.strip()
+        if len(line) > 20:
+            # Take first sentence
+            sentence = line.split(".")[0].strip()
+            return sentence + "." if not sentence.endswith(".") else sentence
+    return cleaned[:150] if cleaned else ""
+
+
+def _build_stock_signal(ticker: str, final_state: Dict[str, Any]) -> StockSignal:
+    """Turn a finished graph state into a StockSignal for the watchlist response."""
+    recommendation = _extract_recommendation(
+        final_state.get("final_recommendation", "")
+    )
+    risk_level = _extract_risk_level(
+        final_state.get("risk_analysis", "")
+    )
+
+    # Build a concise summary from all analyses
+    summary_parts = []
+    tech = final_state.get("technical_analysis", "")
+    if tech:
+        summary_parts.append(f"Technical: {_clean_text(tech)}")
+
+    fund = final_state.get("fundamental_analysis", "")
+    if fund:
+        summary_parts.append(f"Fundamental: {_clean_text(fund)}")
+
+    summary = " | ".join(summary_parts) if summary_parts else "Analysis completed."
+
+    scored = final_state.get("technical_signal") or {}
+    return StockSignal(
+        ticker=ticker,
+        recommendation=recommendation,
+        risk_level=risk_level,
+        summary=summary,
+        technical_source="rules" if scored else "llm",
+        technical_confidence=scored.get("confidence"),
+    )
+
+
+def _scan_signals(results: List[Dict[str, Any]]) -> List[StockSignal]:
+    """
+    One StockSignal per scan_tickers() result. A ticker whose analysis failed, or
+    whose final state can't be summarized, gets an ERROR signal instead of
+    failing the whole request.
+    """
+    signals: List[StockSignal] = []
+    for result in results:
+        ticker = result["ticker"]
+        if result["error"] is None:
+            try:
+                signals.append(_build_stock_signal(ticker, result["state"]))
+                continue
+            except Exception as e:
+                result["error"] = str(e)
+
+        signals.append(StockSignal(
+            ticker=ticker,
+            recommendation="ERROR",
+            risk_level="UNKNOWN",
+            summary=f"Analysis failed: {result['error']}",
+        ))
+    return signals
+
+
 @app.post("/watchlist-scan", response_model=WatchlistResponse)
 async def watchlist_scan(request: WatchlistRequest):
     """
     Scan a list of tickers and return analysis signals for each.
     Designed to be called by n8n's scheduled workflow for daily pre-market alerts.
 
-    - Runs the full LangGraph analysis pipeline on each ticker
+    - Runs the full LangGraph analysis pipeline on the tickers concurrently
+      (bounded by max_concurrency, each ticker limited to ticker_timeout seconds)
     - Returns structured signals with BUY/HOLD/SELL + risk level
     - Filters actionable signals (BUY or SELL) for easy alerting
+    - With prescore=true, clear-cut technical setups (extreme RSI, fresh MACD
+      cross, price far from SMA 50) skip the technical analyst's LLM call
     """
-    graph = build_graph()
-    signals: List[StockSignal] = []
+    # Batch work yields the Gemini budget to interactive requests
+    with request_priority(BATCH):
+        results = await scan_tickers(
+            request.tickers,
+            graph=_swarm_app(),
+            max_concurrency=request.max_concurrency,
+            ticker_timeout=request.ticker_timeout,
+            prescore=request.prescore,
+        )
 
-    for ticker in request.tickers:
-        try:
-            final_state = graph.invoke({
-                "user_query": f"Analyze {ticker}",
-                "ticker": ticker,
-                "technical_analysis": "",
-                "fundamental_analysis": "",
-                "sentiment_analysis": "",
-                "risk_analysis": "",
-                "final_recommendation": "",
-                "messages": [],
-            })
-
-            recommendation = _extract_recommendation(
-                final_state.get("final_recommendation", "")
-            )
-            risk_level = _extract_risk_level(
-                final_state.get("risk_analysis", "")
-            )
-
-            # Build a concise summary from all analyses
-            # Strip markdown formatting (headers, bold) for clean summaries
-            def clean_text(text: str) -> str:
-                cleaned = re.sub(r"[#*_`]+", "", text).strip()
-                # Get first meaningful sentence (skip empty lines)
-                for line in cleaned.split("\n"):
-                    line = line.strip()
-                    if len(line) > 20:
-                        # Take first sentence
-                        sentence = line.split(".")[0].strip()
-                        return sentence + "." if not sentence.endswith(".") else sentence
-                return cleaned[:150] if cleaned else ""
-
-            summary_parts = []
-            tech = final_state.get("technical_analysis", "")
-            if tech:
-                summary_parts.append(f"Technical: {clean_text(tech)}")
-
-            fund = final_state.get("fundamental_analysis", "")
-            if fund:
-                summary_parts.append(f"Fundamental: {clean_text(fund)}")
-
-            summary = " | ".join(summary_parts) if summary_parts else "Analysis completed."
-
-            signal = StockSignal(
-                ticker=ticker,
-                recommendation=recommendation,
-                risk_level=risk_level,
-                summary=summary,
-            )
-            signals.append(signal)
-
-        except Exception as e:
-            signals.append(StockSignal(
-                ticker=ticker,
-                recommendation="ERROR",
-                risk_level="UNKNOWN",
-                summary=f"Analysis failed: {str(e)}",
-            ))
+    signals = _scan_signals(results)
 
     # Filter actionable signals
     actionable = [
@@ -248,3 +485,116 @@ async def watchlist_scan(request: WatchlistRequest):
         signals=signals,
         actionable=actionable,
     )
+
+
+@app.post("/screen", response_model=ScreenResponse)
+async def screen(request: ScreenRequest):
+    """
+    Two-stage screener for a large universe (e.g. NIFTY 500).
+
+    1. A vectorized numeric filter over locally stored prices and fundamentals
+       (RSI, momentum, volatility, distance from SMAs, P/E, ROE, ...) for every
+       ticker, ranked by sort_by.
+    2. The full LangGraph pipeline on only the top_k survivors, as a batch scan.
+    """
+    filters = [f.model_dump() for f in request.filters]
+    try:
+        stage1 = await asyncio.to_thread(
+            screen_universe,
+            filters,
+            tickers=request.tickers,
+            sort_by=request.sort_by,
+            descending=request.descending,
+            top_k=request.top_k,
+            period=request.period,
+            fetch_missing=request.fetch_missing,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    signals: List[StockSignal] = []
+    analyze_seconds = 0.0
+    candidates = [c["ticker"] for c in stage1["candidates"]]
+    if request.analyze and candidates:
+        start = time.perf_counter()
+        with request_priority(BATCH):
+            results = await scan_tickers(candidates, graph=_swarm_app(), prescore=request.prescore)
+        analyze_seconds = round(time.perf_counter() - start, 3)
+        signals = _scan_signals(results)
+
+    return ScreenResponse(
+        universe_size=stage1["universe_size"],
+        screened=stage1["screened"],
+        passed=stage1["passed"],
+        candidates=stage1["candidates"],
+        signals=signals,
+        stage_seconds={"filter": stage1["seconds"], "analyze": analyze_seconds},
+    )
+
+
+# ============================================================
+# Intraday streaming
+# ============================================================
+
+_intraday_monitor: Optional[IntradayMonitor] = None
+
+
+@app.post("/intraday/watchlist")
+async def start_intraday(request: IntradayWatchlistRequest):
+    """
+    Start (or replace) the intraday monitor for a watchlist.
+    Bars are polled on a schedule and updates are published on /intraday/stream.
+    """
+    global _intraday_monitor
+    if not request.tickers:
+        raise HTTPException(status_code=400, detail="tickers must not be empty")
+    if _intraday_monitor is not None:
+        await _intraday_monitor.stop()
+    _intraday_monitor = IntradayMonitor(
+        request.tickers, interval=request.interval, poll_seconds=request.poll_seconds
+    )
+    _intraday_monitor.start()
+    return _intraday_monitor.snapshot()
+
+
+@app.get("/intraday/status")
+def intraday_status():
+    """Latest intraday indicator values per ticker and poller status."""
+    if _intraday_monitor is None:
+        return {"running": False}
+    return _intraday_monitor.snapshot()
+
+
+@app.delete("/intraday/watchlist")
+async def stop_intraday():
+    """Stop the intraday monitor."""
+    global _intraday_monitor
+    if _intraday_monitor is not None:
+        await _intraday_monitor.stop()
+        _intraday_monitor = None
+    return {"running": False}
+
+
+@app.get("/intraday/stream")
+async def intraday_stream(signals_only: bool = False):
+    """
+    Server-sent events feed of intraday updates.
+
+    Each event is JSON with type "indicator" (every new bar) or "signal"
+    (RSI crossing 70/30, MACD cross, price crossing SMA 20). Pass
+    signals_only=true to receive only signal changes. A final "stopped" event
+    ends the stream when the monitor is stopped or replaced.
+    """
+    monitor = _intraday_monitor
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Intraday monitor is not running.")
+
+    async def events():
+        async for event in monitor.events(signals_only=signals_only):
+            if event is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
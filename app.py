@@ -1,7 +1,8 @@
 import streamlit as st
-import os
-from graph.workflow import build_graph
-from core.classifier import classify_intent, extract_tickers
+from graph.workflow import get_graph
+from core.config import rotate_api_key
+from core.classifier import classify_query
+from core.state import initial_state
 from crew.portfolio_crew import run_compare_stocks_crew, run_portfolio_crew
 
 # --- Setup Streamlit Page ---
@@ -13,7 +14,7 @@ with st.sidebar:
     st.header("Settings")
     api_key = st.text_input("Gemini API Key override (optional)", type="password")
     if api_key:
-        os.environ["GEMINI_API_KEY"] = api_key
+        rotate_api_key(api_key)
     
     debug_mode = st.toggle("Debug Mode", value=False)
     st.markdown("---")
@@ -44,8 +45,9 @@ if prompt := st.chat_input("Ask about stocks (e.g., 'Analyze RELIANCE' or 'Compa
         status_placeholder.info("🔍 Classifying your query...")
 
         try:
-            # Step 1: Classify intent
-            intent = classify_intent(prompt)
+            # Step 1: Classify intent and resolve tickers in one pass
+            route = classify_query(prompt)
+            intent = route.intent
 
             if debug_mode:
                 st.sidebar.write(f"Detected intent: {intent}")
@@ -55,18 +57,10 @@ if prompt := st.chat_input("Ask about stocks (e.g., 'Analyze RELIANCE' or 'Compa
             # ============================================
             if intent == "single_stock_analysis":
                 status_placeholder.info("Initializing Single-Stock Swarm...")
-                app = build_graph()
-
-                initial_state = {
-                    "user_query": prompt,
-                    "ticker": "",
-                    "technical_analysis": "",
-                    "fundamental_analysis": "",
-                    "sentiment_analysis": "",
-                    "risk_analysis": "",
-                    "final_recommendation": "",
-                    "messages": []
-                }
+                app = get_graph()
+
+                # Seeding the ticker lets the supervisor skip its own extraction call
+                state = initial_state(prompt, ticker=route.tickers[0] if route.tickers else "")
 
                 expanders_data = []
                 st_expanders = {
@@ -78,7 +72,7 @@ if prompt := st.chat_input("Ask about stocks (e.g., 'Analyze RELIANCE' or 'Compa
                 }
                 verdict_placeholder = st.empty()
 
-                for step in app.stream(initial_state):
+                for step in app.stream(state):
                     for node_name, state_update in step.items():
                         if debug_mode:
                             st.sidebar.write(f"Node completed: {node_name}")
@@ -146,10 +140,9 @@ if prompt := st.chat_input("Ask about stocks (e.g., 'Analyze RELIANCE' or 'Compa
                     "portfolio_analysis": "📋 Portfolio Analysis",
                 }
                 label = intent_labels.get(intent, "Multi-Stock Analysis")
-                status_placeholder.info(f"Detected: **{label}** — extracting tickers...")
+                status_placeholder.info(f"Detected: **{label}**")
 
-                # Extract tickers from query
-                tickers = extract_tickers(prompt)
+                tickers = route.tickers
 
                 if not tickers:
                     status_placeholder.error(
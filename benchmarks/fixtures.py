@@ -0,0 +1,159 @@
+"""
+Fixtures replayed by the benchmark harness: price history, fundamentals and
+news per ticker, plus one Gemini response per analysis node.
+
+`python -m benchmarks.fixtures record RELIANCE.NS TCS.NS ...` captures live
+yfinance/DuckDuckGo data (and, with --llm, real Gemini answers) into
+benchmarks/fixtures/recorded.json. Without a recording, load_fixtures() falls
+back to deterministic synthetic data in the same format, so benchmarks always
+run offline.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "recorded.json")
+
+DEFAULT_TICKERS = ["RELIANCE.NS", "TCS.NS", "INFY.NS", "HDFCBANK.NS", "ITC.NS"]
+
+# Canned analyst output of realistic length, used when no Gemini answers were recorded.
+DEFAULT_LLM_RESPONSES = {
+    "supervisor": "RELIANCE.NS",
+    "technical": (
+        "Price is trading above the 20 and 50 day SMAs with the 20 EMA sloping up. RSI at 58 "
+        "shows momentum without being overbought, and the MACD line sits above its signal with a "
+        "widening histogram. Volume on up days exceeds down days. Technical signal: Bullish."
+    ),
+    "fundamental": (
+        "P/E is in line with the sector and forward EPS implies mid-teens growth. Operating margins "
+        "are stable, debt-to-equity is moderate and ROE is above 15%. Free cash flow is positive. "
+        "Valuation looks fair with reasonable growth. Verdict: Fairly Valued."
+    ),
+    "sentiment": (
+        "Recent coverage focuses on steady quarterly results and new capacity announcements, with "
+        "no major negative catalysts. Analyst commentary is constructive. Sentiment: Bullish."
+    ),
+    "risk": (
+        "Beta near 1.0 implies market-level volatility. The stock trades within its 52-week range, "
+        "leverage is manageable and liquidity is high. MEDIUM RISK."
+    ),
+    "judge": (
+        "Technicals and sentiment are constructive while fundamentals support the current "
+        "valuation, and risk is moderate. The balance favours accumulating on dips.\n"
+        "FINAL RECOMMENDATION: BUY"
+    ),
+}
+
+
+def _synthetic_history(seed: int, days: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days, tz="Asia/Kolkata")
+    close = 1000 * np.exp(np.cumsum(rng.normal(0.0004, 0.015, days)))
+    open_ = close * (1 + rng.normal(0, 0.004, days))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.006, days)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.006, days)))
+    volume = rng.integers(1_000_000, 8_000_000, days)
+    return [
+        {"Date": str(d), "Open": round(o, 2), "High": round(h, 2), "Low": round(l, 2),
+         "Close": round(c, 2), "Volume": int(v)}
+        for d, o, h, l, c, v in zip(dates, open_, high, low, close, volume)
+    ]
+
+
+def synthetic_fixtures(tickers: Optional[List[str]] = None, days: int = 260) -> Dict[str, Any]:
+    """Deterministic stand-in for a recording, for machines that have never recorded one."""
+    fixtures: Dict[str, Any] = {"source": "synthetic", "tickers": {}, "llm": dict(DEFAULT_LLM_RESPONSES)}
+    for i, ticker in enumerate(tickers or DEFAULT_TICKERS):
+        fixtures["tickers"][ticker] = {
+            "history": _synthetic_history(seed=i, days=days),
+            "metrics": {
+                "marketCap": 1.5e12 + i * 1e11, "peRatio": 22.0 + i, "forwardPE": 19.5 + i,
+                "eps": 95.0 - i, "forwardEps": 108.0 - i, "dividendYield": 0.012, "beta": 0.9 + 0.05 * i,
+                "fiftyTwoWeekHigh": 1250.0, "fiftyTwoWeekLow": 880.0, "profitMargins": 0.11,
+                "operatingMargins": 0.16, "revenueGrowth": 0.09, "freeCashflow": 4.2e10,
+                "debtToEquity": 38.0, "returnOnEquity": 0.17, "returnOnAssets": 0.08,
+                "sector": "Industrials", "industry": "Conglomerates",
+            },
+            "news": [
+                {"title": f"{ticker.split('.')[0]} posts steady quarterly growth",
+                 "snippet": "Revenue rose year on year, beating street estimates on margins.",
+                 "date": "2026-01-15", "source": "Business Daily", "url": "https://example.com/1"},
+                {"title": f"Brokerages stay positive on {ticker.split('.')[0]}",
+                 "snippet": "Analysts cite capacity additions and a stable demand outlook.",
+                 "date": "2026-01-12", "source": "Market Wire", "url": "https://example.com/2"},
+            ],
+        }
+    return fixtures
+
+
+def load_fixtures(path: Optional[str] = None) -> Dict[str, Any]:
+    """The recorded fixtures if present, else synthetic ones."""
+    path = path or FIXTURE_PATH
+    if os.path.exists(path):
+        with open(path) as f:
+            fixtures = json.load(f)
+        fixtures.setdefault("llm", {})
+        for node, text in DEFAULT_LLM_RESPONSES.items():
+            fixtures["llm"].setdefault(node, text)
+        return fixtures
+    return synthetic_fixtures()
+
+
+def record_fixtures(tickers: List[str], path: Optional[str] = None, with_llm: bool = False) -> Dict[str, Any]:
+    """Capture live responses for `tickers` (needs network, and GEMINI_API_KEY with with_llm)."""
+    from tools.market_data import _fetch_financial_metrics, _fetch_stock_history
+    from tools.search import search_financial_news
+
+    fixtures: Dict[str, Any] = {
+        "source": "recorded",
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tickers": {},
+        "llm": {},
+    }
+    for ticker in tickers:
+        history = _fetch_stock_history(ticker, period="1y")
+        if history.empty:
+            print(f"Skipping {ticker}: no price history")
+            continue
+        fixtures["tickers"][ticker] = {
+            "history": json.loads(history.to_json(orient="records")),
+            "metrics": _fetch_financial_metrics(ticker),
+            "news": search_financial_news(ticker.split(".")[0] + " share news Indian stock market", max_results=5),
+        }
+
+    if with_llm and fixtures["tickers"]:
+        from core.state import initial_state
+        from graph.workflow import get_graph
+
+        ticker = next(iter(fixtures["tickers"]))
+        state = get_graph().invoke(initial_state(f"Analyze {ticker}", ticker=ticker))
+        for node in ("technical", "fundamental", "sentiment", "risk"):
+            fixtures["llm"][node] = state.get(f"{node}_analysis", "")
+        fixtures["llm"]["judge"] = state.get("final_recommendation", "")
+
+    path = path or FIXTURE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(fixtures, f, default=str)
+    print(f"Recorded {len(fixtures['tickers'])} tickers to {path}")
+    return fixtures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record benchmark fixtures from live services.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="capture yfinance/DuckDuckGo (and optionally Gemini) responses")
+    rec.add_argument("tickers", nargs="*", default=DEFAULT_TICKERS)
+    rec.add_argument("--llm", action="store_true", help="also record one real Gemini answer per node")
+    rec.add_argument("--output", default=FIXTURE_PATH)
+    args = parser.parse_args()
+    record_fixtures(args.tickers, args.output, with_llm=args.llm)
+
+
+if __name__ == "__main__":
+    main()
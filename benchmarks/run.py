@@ -0,0 +1,518 @@
+"""
+Offline benchmark harness for the analysis pipeline.
+
+Replays recorded (or synthetic) yfinance, DuckDuckGo and Gemini responses with
+configurable simulated latency and writes machine-readable JSON results:
+
+    python -m benchmarks.run                          # all suites
+    python -m benchmarks.run --suite pipeline scan --llm-latency 1.2
+    python -m benchmarks.run --output bench.json --scan-sizes 10,50
+    python -m benchmarks.run --suite prompts          # raw vs compact analyst prompts
+
+Compare two runs by diffing their JSON files.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from benchmarks.fixtures import load_fixtures
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SUITES = ("pipeline", "concurrency", "scan", "indicators", "prompts")
+
+
+# ============================================================
+# Replay fakes
+# ============================================================
+
+def _node_prompts() -> Dict[str, str]:
+    from agents.fundamental import FUNDAMENTAL_SYSTEM_PROMPT
+    from agents.judge import JUDGE_SYSTEM_PROMPT
+    from agents.risk import RISK_SYSTEM_PROMPT
+    from agents.sentiment import SENTIMENT_SYSTEM_PROMPT
+    from agents.technical import TECHNICAL_SYSTEM_PROMPT
+    from graph.workflow import SUPERVISOR_SYSTEM_PROMPT
+
+    return {
+        SUPERVISOR_SYSTEM_PROMPT: "supervisor",
+        TECHNICAL_SYSTEM_PROMPT: "technical",
+        FUNDAMENTAL_SYSTEM_PROMPT: "fundamental",
+        SENTIMENT_SYSTEM_PROMPT: "sentiment",
+        RISK_SYSTEM_PROMPT: "risk",
+        JUDGE_SYSTEM_PROMPT: "judge",
+    }
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(len(str(m.content)) for m in messages) // 4
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Chat model that answers with the recorded response for the calling node
+    after `latency` seconds plus `input_latency_per_1k` per 1,000 prompt tokens.
+    """
+
+    responses: Dict[str, str]
+    prompts: Dict[str, str]
+    latency: float = 0.0
+    input_latency_per_1k: float = 0.0
+    model: str = "replay"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _delay(self, messages) -> float:
+        return self.latency + self.input_latency_per_1k * _prompt_tokens(messages) / 1000
+
+    def _result(self, messages) -> ChatResult:
+        node = self.prompts.get(messages[0].content, "judge") if messages else "judge"
+        text = self.responses.get(node, "")
+        prompt_tokens = _prompt_tokens(messages)
+        message = AIMessage(content=text, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(text) // 4,
+            "total_tokens": prompt_tokens + len(text) // 4,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay(messages))
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay(messages))
+        return self._result(messages)
+
+
+def _fixture_for(fixtures: Dict[str, Any], ticker: str) -> Dict[str, Any]:
+    """Recorded data for `ticker`; tickers beyond the recording reuse one, picked stably by name."""
+    recorded = fixtures["tickers"]
+    if ticker in recorded:
+        return recorded[ticker]
+    names = sorted(recorded)
+    return recorded[names[int(hashlib.md5(ticker.encode()).hexdigest(), 16) % len(names)]]
+
+
+@contextmanager
+def replay_environment(
+    fixtures: Dict[str, Any],
+    llm_latency: float = 0.0,
+    data_latency: float = 0.0,
+    search_latency: float = 0.0,
+    rpm: int = 0,
+    input_latency_per_1k: float = 0.0,
+):
+    """
+    Patch every external boundary (yfinance fetchers, DuckDuckGo, Gemini client)
+    to replay `fixtures` with the given latencies. Persistent caches point at a
+    throwaway database and are disabled so each run measures the full pipeline.
+    """
+    from core import rate_limit
+    from core.config import clear_llm_clients
+    from core.tracing import traced
+    from tools import market_data, search
+    from tools.price_store import period_start
+
+    def replay_history(ticker, period, start):
+        df = pd.DataFrame(_fixture_for(fixtures, ticker)["history"])
+        since = start or period_start(period)
+        return (df[df["Date"] >= since] if since else df).reset_index(drop=True)
+
+    def history(ticker, period="6mo", interval="1d", start=None):
+        time.sleep(data_latency)
+        return replay_history(ticker, period, start)
+
+    def history_bulk(tickers, period="6mo", interval="1d", start=None):
+        # One batched download: a single round-trip regardless of ticker count
+        time.sleep(data_latency)
+        return {t: replay_history(t, period, start) for t in tickers}
+
+    def metrics(ticker):
+        time.sleep(data_latency)
+        return dict(_fixture_for(fixtures, ticker)["metrics"])
+
+    def news(query, max_results=5):
+        time.sleep(search_latency)
+        symbol = query.split()[0]
+        ticker = next((t for t in fixtures["tickers"] if t.split(".")[0] == symbol), symbol)
+        return list(_fixture_for(fixtures, ticker)["news"])[:max_results]
+
+    prompts = _node_prompts()
+
+    def chat_model(**kwargs):
+        return ReplayChatModel(
+            responses=fixtures["llm"],
+            prompts=prompts,
+            latency=llm_latency,
+            input_latency_per_1k=input_latency_per_1k,
+            temperature=kwargs.get("temperature", 0.0),
+            rate_limiter=kwargs.get("rate_limiter"),
+            callbacks=kwargs.get("callbacks"),
+        )
+
+    tmpdir = tempfile.mkdtemp(prefix="trade-today-bench-")
+    env = {
+        "TRADE_TODAY_DB": os.path.join(tmpdir, "bench.db"),
+        "PRICE_STORE_ENABLED": "0",
+        "LLM_CACHE_ENABLED": "0",
+    }
+    with ExitStack() as stack:
+        stack.enter_context(patch.dict(os.environ, env))
+        # Replays keep the span names of the functions they stand in for
+        for name, replay, span_name in (
+            ("_fetch_stock_history", history, "yfinance.history"),
+            ("_fetch_stock_history_bulk", history_bulk, "yfinance.download"),
+            ("_fetch_financial_metrics", metrics, "yfinance.info"),
+        ):
+            stack.enter_context(patch.object(market_data, name, side_effect=traced(span_name, kind="io")(replay)))
+        stack.enter_context(patch(
+            "agents.sentiment.search_financial_news", side_effect=traced("duckduckgo.news", kind="io")(news)
+        ))
+        # Speculative prefetches search through tools.search directly
+        stack.enter_context(patch.object(search, "_fetch_financial_news", side_effect=traced("duckduckgo.news", kind="io")(news)))
+        stack.enter_context(patch("core.config.ChatGoogleGenerativeAI", side_effect=chat_model))
+        stack.enter_context(patch.object(rate_limit, "_scheduler", rate_limit.GeminiScheduler(rpm=rpm, tpm=0)))
+        clear_llm_clients()
+        market_data.clear_cache()
+        search.clear_cache()
+        try:
+            yield
+        finally:
+            clear_llm_clients()
+            market_data.clear_cache()
+            search.clear_cache()
+
+
+# ============================================================
+# Suites
+# ============================================================
+
+def _summary(values_ms: List[float]) -> Dict[str, float]:
+    if not values_ms:
+        return {"n": 0}
+    ordered = sorted(values_ms)
+    pct = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(pct(0.50), 3),
+        "p95_ms": round(pct(0.95), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _universe(fixtures: Dict[str, Any], n: int) -> List[str]:
+    tickers = list(fixtures["tickers"])
+    return (tickers + [f"BENCH{i:03d}.NS" for i in range(n)])[:n]
+
+
+async def bench_pipeline(fixtures: Dict[str, Any], iterations: int = 5) -> Dict[str, Any]:
+    """End-to-end and per-span latency of single /analyze-style graph runs, one at a time."""
+    from core import tracing
+    from core.state import initial_state
+    from graph.workflow import get_graph
+    from tools.market_data import clear_cache
+
+    graph = get_graph(async_mode=True)
+    end_to_end: List[float] = []
+    spans: Dict[str, List[float]] = {}
+    tickers = _universe(fixtures, iterations)
+    for ticker in tickers:
+        clear_cache()
+        start = time.perf_counter()
+        with tracing.start_trace("bench.pipeline") as trace:
+            await graph.ainvoke(initial_state(f"Analyze {ticker}", ticker=ticker))
+        end_to_end.append((time.perf_counter() - start) * 1000)
+        for span in trace.to_dict()["spans"]:
+            if span["wall_ms"] is not None:
+                spans.setdefault(span["name"], []).append(span["wall_ms"])
+
+    return {
+        "end_to_end": _summary(end_to_end),
+        "spans": {name: _summary(values) for name, values in sorted(spans.items())},
+    }
+
+
+async def bench_concurrency(fixtures: Dict[str, Any], clients: List[int], requests_per_client: int = 3) -> Dict[str, Any]:
+    """Throughput and latency of POST /analyze with N concurrent clients, through the ASGI app."""
+    import httpx
+
+    import api
+    from tools.market_data import clear_cache
+
+    results = {}
+    transport = httpx.ASGITransport(app=api.app)
+    for n in clients:
+        clear_cache()
+        tickers = _universe(fixtures, n * requests_per_client)
+        latencies: List[float] = []
+        errors = 0
+
+        async def client(worker: int, http: httpx.AsyncClient):
+            nonlocal errors
+            for i in range(requests_per_client):
+                ticker = tickers[worker * requests_per_client + i]
+                start = time.perf_counter()
+                response = await http.post("/analyze", json={"query": f"Analyze {ticker}"})
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += response.status_code != 200
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(client(w, http) for w in range(n)))
+            elapsed = time.perf_counter() - start
+
+        results[str(n)] = {
+            "clients": n,
+            "requests": len(latencies),
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "latency": _summary(latencies),
+        }
+    return results
+
+
+async def bench_scan(
+    fixtures: Dict[str, Any], sizes: List[int], max_concurrency: Optional[int] = None, prescore: bool = False,
+) -> Dict[str, Any]:
+    """Wall time of scan_tickers() for watchlists of each size."""
+    from core.scanner import SCAN_MAX_CONCURRENCY, scan_tickers
+    from graph.workflow import get_graph
+    from tools.market_data import clear_cache
+
+    graph = get_graph(async_mode=True)
+    results = {}
+    for size in sizes:
+        clear_cache()
+        tickers = _universe(fixtures, size)
+        start = time.perf_counter()
+        scanned = await scan_tickers(
+            tickers, graph=graph, max_concurrency=max_concurrency, ticker_timeout=3600, prescore=prescore,
+        )
+        elapsed = time.perf_counter() - start
+        results[str(size)] = {
+            "tickers": size,
+            "max_concurrency": max_concurrency or SCAN_MAX_CONCURRENCY,
+            "errors": sum(1 for r in scanned if r["error"]),
+            "prescore": prescore,
+            "prescored": sum(1 for r in scanned if r["state"] and r["state"].get("technical_signal")),
+            "seconds": round(elapsed, 3),
+            "tickers_per_second": round(size / elapsed, 3) if elapsed else None,
+        }
+    return results
+
+
+def bench_indicators(n_tickers: int = 200, n_bars: int = 250, repeat: int = 3) -> Dict[str, Any]:
+    """Indicator computation throughput: per-ticker batch, vectorized panel and incremental updates."""
+    from tools.technical_ind import IncrementalIndicators, add_all_indicators, compute_indicator_panel
+
+    rng = np.random.default_rng(0)
+    close = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n_bars, n_tickers)), axis=0)),
+        columns=[f"T{i}" for i in range(n_tickers)],
+    )
+
+    def best_of(fn) -> float:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    per_ticker = best_of(lambda: [add_all_indicators(close[[c]].rename(columns={c: "Close"})) for c in close])
+    panel = best_of(lambda: compute_indicator_panel(close))
+
+    states = [IncrementalIndicators.from_history(close[c].values[:-20]) for c in close.columns[:50]]
+    tail = close.iloc[-20:, :50].values
+    start = time.perf_counter()
+    for row in tail:
+        for state, price in zip(states, row):
+            state.update(price)
+    incremental = time.perf_counter() - start
+
+    bars = n_tickers * n_bars
+    return {
+        "tickers": n_tickers,
+        "bars_per_ticker": n_bars,
+        "per_ticker_seconds": round(per_ticker, 4),
+        "per_ticker_bars_per_second": round(bars / per_ticker),
+        "panel_seconds": round(panel, 4),
+        "panel_bars_per_second": round(bars / panel),
+        "incremental_updates_per_second": round(tail.size / incremental) if incremental else None,
+    }
+
+
+def bench_prompts(fixtures: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Prompt size and analyst latency with raw JSON payloads (COMPACT_PROMPTS=0)
+    versus the compact feature summaries, for the technical and fundamental nodes.
+    """
+    from agents import fundamental, technical
+
+    nodes = {
+        "technical": (technical._prepare_messages, technical.technical_analyst_node),
+        "fundamental": (fundamental._prepare_messages, fundamental.fundamental_analyst_node),
+    }
+    tickers = list(fixtures["tickers"])
+    results: Dict[str, Any] = {}
+    for name, (prepare, node) in nodes.items():
+        modes = {}
+        for mode, flag in (("raw", "0"), ("compact", "1")):
+            with patch.dict(os.environ, {"COMPACT_PROMPTS": flag}):
+                tokens, encode_ms, node_ms = [], [], []
+                for ticker in tickers:
+                    state = {"ticker": ticker}
+                    prepare(state)  # warm the market data cache so only encoding and the LLM are timed
+                    start = time.perf_counter()
+                    messages, _ = prepare(state)
+                    encode_ms.append((time.perf_counter() - start) * 1000)
+                    tokens.append(_prompt_tokens(messages))
+                    start = time.perf_counter()
+                    node(state)
+                    node_ms.append((time.perf_counter() - start) * 1000)
+            modes[mode] = {
+                "input_tokens_mean": round(statistics.fmean(tokens), 1),
+                "prepare": _summary(encode_ms),
+                "node": _summary(node_ms),
+            }
+        raw, compact = modes["raw"]["input_tokens_mean"], modes["compact"]["input_tokens_mean"]
+        modes["token_reduction"] = round(1 - compact / raw, 3) if raw else None
+        results[name] = modes
+    return results
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    suites=SUITES,
+    llm_latency: float = 0.8,
+    data_latency: float = 0.15,
+    search_latency: float = 0.4,
+    iterations: int = 5,
+    clients: List[int] = (1, 4, 16),
+    requests_per_client: int = 3,
+    scan_sizes: List[int] = (10, 50, 200),
+    scan_concurrency: Optional[int] = None,
+    scan_prescore: bool = False,
+    rpm: int = 0,
+    fixtures_path: Optional[str] = None,
+    input_latency_per_1k: float = 0.1,
+) -> Dict[str, Any]:
+    """Run the selected suites against replayed fixtures and return the results document."""
+    fixtures = load_fixtures(fixtures_path)
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "fixtures": fixtures.get("source", "recorded"),
+            "fixture_tickers": len(fixtures["tickers"]),
+            "latency_seconds": {
+                "llm": llm_latency, "llm_per_1k_input_tokens": input_latency_per_1k,
+                "data": data_latency, "search": search_latency,
+            },
+            "rpm_limit": rpm,
+        },
+        "results": {},
+    }
+
+    with replay_environment(fixtures, llm_latency, data_latency, search_latency, rpm, input_latency_per_1k):
+        if "pipeline" in suites:
+            report["results"]["pipeline"] = asyncio.run(bench_pipeline(fixtures, iterations))
+        if "concurrency" in suites:
+            report["results"]["concurrency"] = asyncio.run(
+                bench_concurrency(fixtures, list(clients), requests_per_client)
+            )
+        if "scan" in suites:
+            report["results"]["scan"] = asyncio.run(bench_scan(fixtures, list(scan_sizes), scan_concurrency, scan_prescore))
+        if "prompts" in suites:
+            report["results"]["prompts"] = bench_prompts(fixtures)
+    if "indicators" in suites:
+        report["results"]["indicators"] = bench_indicators()
+    return report
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Trade Today pipeline.")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="seconds per Gemini call")
+    parser.add_argument("--input-latency-per-1k", type=float, default=0.1,
+                        help="extra seconds per 1,000 prompt tokens on each Gemini call")
+    parser.add_argument("--data-latency", type=float, default=0.15, help="seconds per yfinance call")
+    parser.add_argument("--search-latency", type=float, default=0.4, help="seconds per DuckDuckGo call")
+    parser.add_argument("--iterations", type=int, default=5, help="sequential pipeline runs")
+    parser.add_argument("--clients", type=_int_list, default=[1, 4, 16], help="e.g. 1,4,16")
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--scan-sizes", type=_int_list, default=[10, 50, 200], help="e.g. 10,50,200")
+    parser.add_argument("--scan-concurrency", type=int, default=None)
+    parser.add_argument("--scan-prescore", action="store_true", help="rule-based technicals for clear-cut tickers")
+    parser.add_argument("--rpm", type=int, default=0, help="simulated Gemini RPM budget (0 = unlimited)")
+    parser.add_argument("--fixtures", default=None, help="fixture file (default: recorded, else synthetic)")
+    parser.add_argument("--output", default=None, help="results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        suites=args.suite,
+        llm_latency=args.llm_latency,
+        data_latency=args.data_latency,
+        search_latency=args.search_latency,
+        iterations=args.iterations,
+        clients=args.clients,
+        requests_per_client=args.requests_per_client,
+        scan_sizes=args.scan_sizes,
+        scan_concurrency=args.scan_concurrency,
+        scan_prescore=args.scan_prescore,
+        rpm=args.rpm,
+        fixtures_path=args.fixtures,
+        input_latency_per_1k=args.input_latency_per_1k,
+    )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
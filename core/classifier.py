@@ -1,59 +1,159 @@
+import os
+import re
+import threading
 from langchain_core.messages import SystemMessage, HumanMessage
+from pydantic import BaseModel, Field, field_validator
 from core.config import get_llm
-from typing import List
+from core.rate_limit import acall_with_retry, call_with_retry
+from core.symbols import resolve_tickers
+from typing import Any, Dict, List, Literal, Tuple
 
-CLASSIFIER_SYSTEM_PROMPT = """You are a query intent classifier for a stock trading analysis system.
-Classify the user query into EXACTLY one of these categories:
+# Fast-path answers below this confidence fall back to the LLM.
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
 
-1. single_stock_analysis - User wants analysis of ONE specific stock (e.g., "Should I buy RELIANCE?", "Analyze TCS", "How is HDFC today?")
-2. compare_stocks - User wants to compare TWO OR MORE specific stocks side-by-side (e.g., "Compare RELIANCE vs TCS", "Which is better, INFY or WIPRO?")
-3. portfolio_allocation - User wants help building or allocating a new portfolio with a budget (e.g., "I have 5L to invest in IT and pharma", "Build me a portfolio")
-4. portfolio_analysis - User already holds multiple stocks and wants a health check (e.g., "I hold RELIANCE, TCS, HDFC — how's my portfolio?", "Analyze my holdings")
+ROUTER_SYSTEM_PROMPT = """You are the query router for a stock trading analysis system.
+For the user query, determine BOTH the intent and the stock tickers mentioned.
 
-Respond with ONLY the category string, nothing else. No quotes, no explanation.
-"""
+Intent must be EXACTLY one of:
+1. single_stock_analysis - analysis of ONE specific stock (e.g., "Should I buy RELIANCE?", "Analyze TCS")
+2. compare_stocks - compare TWO OR MORE specific stocks (e.g., "Compare RELIANCE vs TCS", "Which is better, INFY or WIPRO?")
+3. portfolio_allocation - build or allocate a new portfolio with a budget (e.g., "I have 5L to invest in IT and pharma")
+4. portfolio_analysis - health check of stocks the user already holds (e.g., "I hold RELIANCE, TCS, HDFC — how's my portfolio?")
 
-TICKER_EXTRACTOR_PROMPT = """Extract ALL stock tickers mentioned in this query.
-For Indian stocks, append .NS (NSE) suffix if not already present.
-Return as a comma-separated list. Example: RELIANCE.NS,TCS.NS,INFY.NS
-If you cannot determine any tickers, output 'UNKNOWN'.
-Respond ONLY with the comma-separated tickers, no other text.
+Tickers: every stock mentioned, as Yahoo Finance symbols. For Indian stocks append .NS (NSE) if no suffix is given,
+or .BO if the user asks for BSE. Use an empty list if no stock can be determined.
 """
 
+Intent = Literal["single_stock_analysis", "compare_stocks", "portfolio_allocation", "portfolio_analysis"]
+
+
+class QueryRoute(BaseModel):
+    """Intent and tickers for a user query, produced by one classifier pass."""
+    intent: Intent = Field(description="The query intent")
+    tickers: List[str] = Field(default_factory=list, description="Yahoo Finance tickers mentioned in the query")
+
+    @field_validator("tickers")
+    @classmethod
+    def _normalize_tickers(cls, tickers: List[str]) -> List[str]:
+        cleaned = []
+        for ticker in tickers:
+            ticker = ticker.strip().upper()
+            if not ticker or ticker == "UNKNOWN":
+                continue
+            if "." not in ticker and not ticker.startswith("^"):
+                ticker += ".NS"
+            cleaned.append(ticker)
+        return list(dict.fromkeys(cleaned))
+
+
+_COMPARE_RE = re.compile(
+    r"\b(compare|comparison|versus|vs\.?|better|head[- ]to[- ]head|which (one|stock|is)|difference between)\b",
+    re.IGNORECASE,
+)
+_PORTFOLIO_ANALYSIS_RE = re.compile(
+    r"\b(my (portfolio|holdings|stocks|investments)|i (hold|own|have bought)|i'm holding|holdings|portfolio health)\b",
+    re.IGNORECASE,
+)
+_ALLOCATION_RE = re.compile(
+    r"\b(allocat\w*|build (me )?a portfolio|diversif\w*|how (much|should i split)|split|"
+    r"invest(ing)? \S*\d|\d+(\.\d+)?\s*(l|lakh|lakhs|lac|cr|crore|crores|k)\b|budget)",
+    re.IGNORECASE,
+)
+_SINGLE_RE = re.compile(
+    r"\b(analy[sz]e|analysis|should i (buy|sell)|buy|sell|hold|how is|outlook|target|view on|worth)\b",
+    re.IGNORECASE,
+)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "classify_query": {"fast": 0, "llm": 0},
+}
+
+
+def _record(name: str, path: str) -> None:
+    with _stats_lock:
+        _stats[name][path] += 1
+
+
+def get_fast_path_stats() -> Dict[str, Dict[str, Any]]:
+    """How often the local fast path answered instead of the LLM."""
+    with _stats_lock:
+        stats = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in stats.values():
+        total = counts["fast"] + counts["llm"]
+        counts["hit_rate"] = round(counts["fast"] / total, 4) if total else 0.0
+    return stats
+
 
-def classify_intent(query: str) -> str:
+def fast_classify_intent(query: str) -> Tuple[str, float]:
     """
-    Classify a user query into one of four intents.
-    Returns: single_stock_analysis, compare_stocks, portfolio_allocation, or portfolio_analysis
+    Rule-based intent classification. Returns (intent, confidence in [0, 1]).
+    Only clear-cut phrasings score high; anything mixed or unusual scores low so
+    that classify_query() defers to the LLM.
     """
-    llm = get_llm(temperature=0.0)
-    messages = [
-        SystemMessage(content=CLASSIFIER_SYSTEM_PROMPT),
+    tickers, ticker_conf = resolve_tickers(query)
+    n = len(tickers)
+    compare = bool(_COMPARE_RE.search(query))
+    holdings = bool(_PORTFOLIO_ANALYSIS_RE.search(query))
+    allocation = bool(_ALLOCATION_RE.search(query))
+    single = bool(_SINGLE_RE.search(query))
+
+    if sum([compare, holdings, allocation]) > 1:
+        return "single_stock_analysis", 0.0  # conflicting cues
+    if holdings:
+        return "portfolio_analysis", 0.9 if n >= 2 else 0.6
+    if allocation:
+        return "portfolio_allocation", 0.9 if n != 1 else 0.5
+    if compare:
+        return "compare_stocks", 0.95 if n >= 2 else 0.4
+    if n == 1:
+        return "single_stock_analysis", (0.95 if single else 0.85) * ticker_conf
+    return "single_stock_analysis", 0.0
+
+
+def _fast_route(query: str):
+    """QueryRoute from the local rules, or None if intent or tickers are uncertain."""
+    intent, intent_conf = fast_classify_intent(query)
+    tickers, ticker_conf = resolve_tickers(query)
+    if intent_conf >= FAST_PATH_MIN_CONFIDENCE and tickers and ticker_conf >= FAST_PATH_MIN_CONFIDENCE:
+        return QueryRoute(intent=intent, tickers=tickers)
+    return None
+
+
+def _route_messages(query: str) -> list:
+    return [
+        SystemMessage(content=ROUTER_SYSTEM_PROMPT),
         HumanMessage(content=query),
     ]
-    response = llm.invoke(messages)
-    intent = response.content.strip().lower().replace('"', "").replace("'", "")
 
-    valid_intents = {
-        "single_stock_analysis",
-        "compare_stocks",
-        "portfolio_allocation",
-        "portfolio_analysis",
-    }
-    return intent if intent in valid_intents else "single_stock_analysis"
 
+def classify_query(query: str) -> QueryRoute:
+    """
+    Determine intent and tickers together.
+    Uses the local fast path when it is confident about both; otherwise makes a
+    single structured-output LLM call instead of separate classify/extract calls.
+    """
+    route = _fast_route(query)
+    if route is not None:
+        _record("classify_query", "fast")
+        return route
+    _record("classify_query", "llm")
 
-def extract_tickers(query: str) -> List[str]:
-    """Extract multiple stock tickers from a user query."""
     llm = get_llm(temperature=0.0)
-    messages = [
-        SystemMessage(content=TICKER_EXTRACTOR_PROMPT),
-        HumanMessage(content=query),
-    ]
-    response = llm.invoke(messages)
-    raw = response.content.strip()
+    structured = llm.with_structured_output(QueryRoute)
+    result = call_with_retry(lambda: structured.invoke(_route_messages(query)), acquire=False)
+    return result if isinstance(result, QueryRoute) else QueryRoute(intent="single_stock_analysis")
+
 
-    if raw == "UNKNOWN" or not raw:
-        return []
+async def aclassify_query(query: str) -> QueryRoute:
+    """Async variant of classify_query."""
+    route = _fast_route(query)
+    if route is not None:
+        _record("classify_query", "fast")
+        return route
+    _record("classify_query", "llm")
 
-    return [t.strip() for t in raw.split(",") if t.strip()]
+    llm = get_llm(temperature=0.0)
+    structured = llm.with_structured_output(QueryRoute)
+    result = await acall_with_retry(lambda: structured.ainvoke(_route_messages(query)), acquire=False)
+    return result if isinstance(result, QueryRoute) else QueryRoute(intent="single_stock_analysis")
@@ -1,18 +1,103 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# We get the API key from the environment
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-def get_llm(temperature: float = 0.2):
-    """Returns a configured Gemini LLM instance."""
-    model1 = "gemini-2.5-flash"
-    model2 = "gemini-3-flash-preview"
-    return ChatGoogleGenerativeAI(
-        model=model1,
-        google_api_key=GEMINI_API_KEY, 
-        temperature=temperature
+from core.rate_limit import GeminiRateLimiter, TokenUsageCallback  # noqa: E402  (reads env loaded above)
+from core.tracing import TracingCallback  # noqa: E402
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Upper bound on pooled clients; per-request API keys each get their own entries.
+LLM_CLIENT_POOL_SIZE = int(os.getenv("LLM_CLIENT_POOL_SIZE", "32"))
+
+# Per-request API key override. Being a ContextVar, it follows the request into
+# asyncio tasks and worker threads without touching os.environ.
+_request_api_key: ContextVar[Optional[str]] = ContextVar("request_api_key", default=None)
+
+# Pooled LLM clients keyed by (kind, model, temperature, api_key). Each client
+# owns an HTTP session, so reusing it keeps connections alive across calls.
+_clients: "OrderedDict[Hashable, Any]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def compact_prompts_enabled() -> bool:
+    """Analysts send compact feature summaries instead of raw JSON (COMPACT_PROMPTS=0 restores the raw payloads)."""
+    return os.getenv("COMPACT_PROMPTS", "1") != "0"
+
+
+def get_api_key() -> Optional[str]:
+    """The Gemini API key for the current request: the override if set, else GEMINI_API_KEY."""
+    return _request_api_key.get() or os.getenv("GEMINI_API_KEY")
+
+
+@contextmanager
+def api_key_override(api_key: Optional[str]):
+    """Use `api_key` for every LLM created inside this block (no-op when api_key is falsy)."""
+    if not api_key:
+        yield
+        return
+    token = _request_api_key.set(api_key)
+    try:
+        yield
+    finally:
+        _request_api_key.reset(token)
+
+
+def rotate_api_key(new_key: str) -> None:
+    """Replace the process-wide Gemini API key and drop clients built with the old one."""
+    old_key = os.getenv("GEMINI_API_KEY")
+    os.environ["GEMINI_API_KEY"] = new_key
+    if old_key and old_key != new_key:
+        with _clients_lock:
+            for key in [k for k in _clients if k[-1] == old_key]:
+                del _clients[key]
+
+
+def get_pooled_client(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Return the pooled client for `key`, creating it with `factory()` on first use.
+    Clients are shared across threads and coroutines, so they must be stateless per call.
+    """
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+        client = factory()
+        _clients[key] = client
+        while len(_clients) > LLM_CLIENT_POOL_SIZE:
+            _clients.popitem(last=False)
+        return client
+
+
+def clear_llm_clients() -> None:
+    """Drop all pooled clients, e.g. after changing GEMINI_MODEL in tests."""
+    with _clients_lock:
+        _clients.clear()
+
+
+def get_llm(temperature: float = 0.2, api_key: Optional[str] = None):
+    """
+    Returns a configured Gemini LLM instance, reused across calls with the same settings.
+    Every call waits on the process-wide Gemini scheduler (core.rate_limit). SDK
+    retries are off so 429s reach call_with_retry()/acall_with_retry(), which back
+    off through the same scheduler.
+    """
+    api_key = api_key or get_api_key()
+    return get_pooled_client(
+        ("langchain", GEMINI_MODEL, temperature, api_key),
+        lambda: ChatGoogleGenerativeAI(
+            model=GEMINI_MODEL,
+            google_api_key=api_key,
+            temperature=temperature,
+            max_retries=0,
+            rate_limiter=GeminiRateLimiter(),
+            callbacks=[TokenUsageCallback(), TracingCallback()],
+        ),
     )
@@ -0,0 +1,25 @@
+import os
+import sqlite3
+
+_DEFAULT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "trade_today.db"
+)
+
+
+def get_db_path() -> str:
+    """Path of the local SQLite database (override with TRADE_TODAY_DB)."""
+    return os.getenv("TRADE_TODAY_DB", _DEFAULT_DB_PATH)
+
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens a new connection to the local database.
+    Connections are cheap, so callers open one per operation instead of sharing
+    one across threads. WAL mode lets readers proceed while a writer appends.
+    """
+    path = get_db_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
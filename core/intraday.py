@@ -0,0 +1,253 @@
+import asyncio
+import math
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from tools.market_data import _fetch_stock_history_bulk
+from tools.technical_ind import IncrementalIndicators
+
+# Bar size polled for the intraday watchlist ("1m", "2m", "5m", "15m", ...).
+INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "5m")
+# Seconds between polls. Yahoo only publishes a new bar once per interval, so
+# polling much faster than the bar size just re-downloads the same data.
+INTRADAY_POLL_SECONDS = float(os.getenv("INTRADAY_POLL_SECONDS", "60"))
+# History used to warm the indicators on the first poll; later polls only ask
+# for the current session. Yahoo serves at most 7 days of 1m bars.
+INTRADAY_WARMUP_PERIOD = os.getenv("INTRADAY_WARMUP_PERIOD", "5d")
+# Events buffered per subscriber before the oldest are dropped.
+INTRADAY_SUBSCRIBER_QUEUE = int(os.getenv("INTRADAY_SUBSCRIBER_QUEUE", "1000"))
+# Seconds without events before a stream yields None so the caller can send a keep-alive.
+INTRADAY_KEEPALIVE_SECONDS = float(os.getenv("INTRADAY_KEEPALIVE_SECONDS", "15"))
+
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+
+def _finite(value: float) -> bool:
+    return value is not None and not math.isnan(value)
+
+
+def detect_signals(prev: Dict[str, float], curr: Dict[str, float]) -> List[str]:
+    """Signal changes between two consecutive indicator snapshots."""
+    signals = []
+    if not prev:
+        return signals
+
+    rsi_prev, rsi_curr = prev.get("RSI_14"), curr.get("RSI_14")
+    if _finite(rsi_prev) and _finite(rsi_curr):
+        if rsi_prev <= RSI_OVERBOUGHT < rsi_curr:
+            signals.append("RSI_OVERBOUGHT")
+        elif rsi_prev >= RSI_OVERSOLD > rsi_curr:
+            signals.append("RSI_OVERSOLD")
+
+    hist_prev, hist_curr = prev.get("MACD_Hist"), curr.get("MACD_Hist")
+    if _finite(hist_prev) and _finite(hist_curr):
+        if hist_prev <= 0 < hist_curr:
+            signals.append("MACD_BULLISH_CROSS")
+        elif hist_prev >= 0 > hist_curr:
+            signals.append("MACD_BEARISH_CROSS")
+
+    sma_prev, sma_curr = prev.get("SMA_20"), curr.get("SMA_20")
+    if _finite(sma_prev) and _finite(sma_curr):
+        if prev["Close"] <= sma_prev and curr["Close"] > sma_curr:
+            signals.append("PRICE_ABOVE_SMA_20")
+        elif prev["Close"] >= sma_prev and curr["Close"] < sma_curr:
+            signals.append("PRICE_BELOW_SMA_20")
+    return signals
+
+
+def _clean(values: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """Indicator values with NaN replaced by None so they serialize as JSON null."""
+    return {k: (round(v, 4) if _finite(v) else None) for k, v in values.items()}
+
+
+def _closes_by_time(df: pd.DataFrame) -> pd.Series:
+    """
+    Close prices indexed by bar timestamp. Fetched frames are normalized with a
+    RangeIndex and a Datetime (intraday) or Date column holding the bar time.
+    """
+    for column in ("Datetime", "Date"):
+        if column in df.columns:
+            return pd.Series(df["Close"].values, index=pd.DatetimeIndex(pd.to_datetime(df[column])))
+    return df["Close"]
+
+
+class IntradayMonitor:
+    """
+    Polls intraday bars for a watchlist and keeps incremental indicators per ticker.
+
+    Only completed bars are fed to the indicators: the newest bar of each
+    download is still forming and is picked up on a later poll. Every new bar
+    publishes an "indicator" event, and each crossing detected by
+    detect_signals() publishes a "signal" event, to all subscribers.
+    """
+
+    def __init__(
+        self,
+        tickers: List[str],
+        interval: Optional[str] = None,
+        poll_seconds: Optional[float] = None,
+        fetcher: Callable[..., Dict[str, pd.DataFrame]] = _fetch_stock_history_bulk,
+    ):
+        self.tickers = list(dict.fromkeys(tickers))
+        self.interval = interval or INTRADAY_INTERVAL
+        self.poll_seconds = poll_seconds or INTRADAY_POLL_SECONDS
+        self._fetcher = fetcher
+        self._states: Dict[str, IncrementalIndicators] = {}
+        self._last_bar: Dict[str, pd.Timestamp] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+        self.polls = 0
+        self.last_poll: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    # --- subscribers ---
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=INTRADAY_SUBSCRIBER_QUEUE)
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                # A slow consumer loses its oldest events rather than stalling the poller
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def events(self, signals_only: bool = False, keepalive: Optional[float] = None):
+        """
+        Async iterator over published events for one subscriber. Yields None after
+        `keepalive` idle seconds, and ends with a {"type": "stopped"} event once the
+        monitor is stopped or replaced.
+        """
+        keepalive = keepalive or INTRADAY_KEEPALIVE_SECONDS
+        queue = self.subscribe()
+        try:
+            while not self._stopped:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["type"] == "stopped":
+                    break
+                if signals_only and event["type"] != "signal":
+                    continue
+                yield event
+            yield {"type": "stopped"}
+        finally:
+            self.unsubscribe(queue)
+
+    # --- polling ---
+
+    def _ingest(self, ticker: str, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Feed the completed bars not seen yet. Returns the events they produced."""
+        if df is None or df.empty or "Close" not in df:
+            return []
+        completed = _closes_by_time(df).iloc[:-1].dropna()
+        last = self._last_bar.get(ticker)
+        if last is not None:
+            completed = completed[completed.index > last]
+        if completed.empty:
+            return []
+
+        state = self._states.get(ticker)
+        if state is None:
+            # First sight of this ticker: warm up silently on the history
+            self._states[ticker] = IncrementalIndicators.from_history(completed.values)
+            self._last_bar[ticker] = completed.index[-1]
+            return []
+
+        events = []
+        for ts, close in completed.items():
+            prev = dict(state.last)
+            values = state.update(close)
+            bar_time = pd.Timestamp(ts).isoformat()
+            events.append({
+                "type": "indicator", "ticker": ticker, "time": bar_time, "values": _clean(values),
+            })
+            for signal in detect_signals(prev, values):
+                events.append({
+                    "type": "signal", "ticker": ticker, "time": bar_time, "signal": signal,
+                    "values": _clean(values),
+                })
+        self._last_bar[ticker] = completed.index[-1]
+        return events
+
+    def poll_once(self) -> List[Dict[str, Any]]:
+        """Fetch the latest bars for every ticker and update indicators (blocking)."""
+        warm = [t for t in self.tickers if t not in self._states]
+        live = [t for t in self.tickers if t in self._states]
+        frames: Dict[str, pd.DataFrame] = {}
+        if warm:
+            frames.update(self._fetcher(warm, period=INTRADAY_WARMUP_PERIOD, interval=self.interval))
+        if live:
+            frames.update(self._fetcher(live, period="1d", interval=self.interval))
+
+        events = []
+        for ticker in self.tickers:
+            events.extend(self._ingest(ticker, frames.get(ticker)))
+        self.polls += 1
+        self.last_poll = datetime.now().isoformat(timespec="seconds")
+        return events
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                for event in await asyncio.to_thread(self.poll_once):
+                    self._publish(event)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Intraday poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self) -> None:
+        """Start polling on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop polling and end every subscriber's stream."""
+        self._stopped = True
+        self._publish({"type": "stopped"})
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest indicator values per ticker plus poller status."""
+        return {
+            "tickers": self.tickers,
+            "interval": self.interval,
+            "poll_seconds": self.poll_seconds,
+            "running": self.running,
+            "polls": self.polls,
+            "last_poll": self.last_poll,
+            "last_error": self.last_error,
+            "subscribers": len(self._subscribers),
+            "latest": {
+                ticker: {
+                    "time": self._last_bar[ticker].isoformat() if ticker in self._last_bar else None,
+                    "values": _clean(state.last),
+                }
+                for ticker, state in self._states.items()
+            },
+        }
@@ -0,0 +1,233 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from core.config import api_key_override
+from core.db import connect
+from core.rate_limit import BATCH, request_priority
+from core import router
+
+# Jobs executed at once. Each compare/portfolio crew makes several Gemini calls,
+# so this is effectively a cap on concurrent crews.
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "2"))
+# Each worker process refreshes its heartbeat this often. A process whose heartbeat
+# is older than JOB_OWNER_TIMEOUT_SECONDS is presumed dead and its jobs are failed.
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_OWNER_TIMEOUT_SECONDS = float(os.getenv("JOB_OWNER_TIMEOUT_SECONDS", "60"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATUSES = {SUCCEEDED, FAILED, CANCELLED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+
+CREATE TABLE IF NOT EXISTS job_workers (
+    owner TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+_COLUMNS = [
+    "id", "query", "status", "progress", "result", "error",
+    "cancel_requested", "created_at", "started_at", "finished_at", "owner",
+]
+
+# Identifies this process as the owner of the jobs it submits.
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_schema_ready = set()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# Futures of jobs submitted by this process, so queued jobs can be cancelled
+# before a worker picks them up.
+_futures: Dict[str, Future] = {}
+_heartbeat: Optional[threading.Thread] = None
+
+
+def _connect():
+    conn = connect()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        # Databases created before jobs had owners
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        _schema_ready.add(path)
+    return conn
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _heartbeat
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, JOB_MAX_WORKERS), thread_name_prefix="job")
+            _beat()
+            _recover_interrupted()
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+            _heartbeat.start()
+        return _executor
+
+
+def _beat() -> None:
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO job_workers (owner, heartbeat_at) VALUES (?, ?) "
+            "ON CONFLICT (owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+            (OWNER_ID, time.time()),
+        )
+
+
+def _heartbeat_loop() -> None:
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            _beat()
+            _recover_interrupted()
+        except Exception as e:
+            print(f"Job heartbeat failed: {e}")
+
+
+def _update(job_id: str, **fields) -> None:
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with closing(_connect()) as conn, conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _row_to_job(row) -> Dict[str, Any]:
+    job = dict(zip(_COLUMNS, row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def _recover_interrupted() -> int:
+    """
+    Jobs whose owning process has stopped heartbeating can't be resumed; mark them
+    failed. Jobs of other live worker processes are left alone.
+    """
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        recovered = conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+            "WHERE status IN (?, ?) AND (owner IS NULL OR owner NOT IN ("
+            "SELECT owner FROM job_workers WHERE heartbeat_at >= ?))",
+            (FAILED, "Interrupted by a server restart.", now, QUEUED, RUNNING, now - JOB_OWNER_TIMEOUT_SECONDS),
+        ).rowcount
+        conn.execute("DELETE FROM job_workers WHERE heartbeat_at < ?", (now - JOB_OWNER_TIMEOUT_SECONDS,))
+    return recovered
+
+
+def _cancel_requested(job_id: str) -> bool:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return bool(row and row[0])
+
+
+def _run_job(job_id: str, query: str, api_key: Optional[str]) -> None:
+    if _cancel_requested(job_id):
+        _update(job_id, status=CANCELLED, finished_at=time.time())
+        return
+
+    _update(job_id, status=RUNNING, progress="started", started_at=time.time())
+    try:
+        with api_key_override(api_key), request_priority(BATCH):
+            result = router.route_query(query, on_progress=lambda stage: _update(job_id, progress=stage))
+    except Exception as e:
+        _update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        return
+    finally:
+        _futures.pop(job_id, None)
+
+    # A running crew can't be interrupted; if cancel was requested meanwhile, drop its result
+    if _cancel_requested(job_id):
+        _update(job_id, status=CANCELLED, progress="cancelled", finished_at=time.time())
+        return
+    status = FAILED if result.get("error") else SUCCEEDED
+    _update(
+        job_id,
+        status=status,
+        progress="done",
+        result=json.dumps(result, default=str),
+        error=result.get("error"),
+        finished_at=time.time(),
+    )
+
+
+def submit_job(query: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Queue `query` for route_query() on the worker pool and return the job record.
+    The API key is only held in memory for the run; it is never persisted.
+    """
+    executor = _get_executor()
+    job_id = uuid.uuid4().hex
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, query, status, progress, created_at, owner) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, query, QUEUED, "queued", time.time(), OWNER_ID),
+        )
+    _futures[job_id] = executor.submit(_run_job, job_id, query, api_key)
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with closing(_connect()) as conn:
+        row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent jobs first, optionally filtered by status."""
+    query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+    params: List[Any] = []
+    if status:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    with closing(_connect()) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cancel a job. Queued jobs are cancelled immediately; a running job finishes
+    its current call but its result is discarded. Finished jobs are unchanged.
+    Returns the updated job, or None if it doesn't exist.
+    """
+    job = get_job(job_id)
+    if job is None or job["status"] in FINISHED_STATUSES:
+        return job
+
+    _update(job_id, cancel_requested=1)
+    future = _futures.get(job_id)
+    if job["status"] == QUEUED and future is not None and future.cancel():
+        _futures.pop(job_id, None)
+        _update(job_id, status=CANCELLED, progress="cancelled", finished_at=time.time())
+    return get_job(job_id)
+
+
+def get_job_stats() -> Dict[str, Any]:
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    return {"max_workers": JOB_MAX_WORKERS, "by_status": dict(rows)}
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from core.db import connect
+from core.rate_limit import acall_with_retry, call_with_retry
+from core.tracing import span
+
+# Seconds a cached response stays valid, per analyst node. Fundamentals barely
+# move within a day; news and intraday price action go stale much faster.
+# Override any of them with LLM_CACHE_TTL_<NODE>, e.g. LLM_CACHE_TTL_SENTIMENT=600.
+_DEFAULT_TTLS = {
+    "technical": 900,
+    "fundamental": 86400,
+    "risk": 86400,
+    "sentiment": 1800,
+    "judge": 1800,
+}
+LLM_CACHE_TTLS = {
+    node: float(os.getenv(f"LLM_CACHE_TTL_{node.upper()}", str(ttl)))
+    for node, ttl in _DEFAULT_TTLS.items()
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    node TEXT NOT NULL,
+    model TEXT,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires_at);
+"""
+
+_schema_ready = set()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0}
+
+
+def is_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+
+def _connect():
+    conn = connect()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_key(messages: List[Any], model: str, temperature: float) -> str:
+    """SHA-256 over the model, temperature and the exact rendered prompt (system + input)."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "messages": [[m.type, m.content] for m in messages],
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached(key: str) -> Optional[str]:
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"LLM cache read failed: {e}")
+        return None
+    _count("hits" if row else "misses")
+    return row[0] if row else None
+
+
+def put_cached(key: str, node: str, model: str, response: str) -> None:
+    now = time.time()
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, node, model, response, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, node, model, response, now, now + LLM_CACHE_TTLS.get(node, 0)),
+            )
+    except sqlite3.Error as e:
+        print(f"LLM cache write failed: {e}")
+        return
+    _count("writes")
+    # Expired rows are never read; sweep them now and then so the table stays small
+    if _stats["writes"] % 200 == 0:
+        try:
+            purge_expired()
+        except sqlite3.Error as e:
+            print(f"LLM cache purge failed: {e}")
+
+
+def purge_expired() -> int:
+    """Delete expired responses. Returns the number of rows removed."""
+    with closing(_connect()) as conn, conn:
+        return conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def _describe(llm) -> tuple:
+    return str(getattr(llm, "model", "")), getattr(llm, "temperature", None)
+
+
+def _cacheable(node: str, content: Any) -> bool:
+    return isinstance(content, str) and bool(content) and LLM_CACHE_TTLS.get(node, 0) > 0
+
+
+def invoke_cached(node: str, llm, messages: List[Any]) -> Any:
+    """
+    Call `llm.invoke(messages)` unless an identical prompt was answered for this
+    node within its TTL. Returns the response content.
+    """
+    if not is_enabled() or LLM_CACHE_TTLS.get(node, 0) <= 0:
+        return call_with_retry(lambda: llm.invoke(messages), acquire=False).content
+
+    model, temperature = _describe(llm)
+    key = cache_key(messages, model, temperature)
+    with span(f"llm_cache.{node}", kind="cache") as s:
+        cached = get_cached(key)
+        s.set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+
+    content = call_with_retry(lambda: llm.invoke(messages), acquire=False).content
+    if _cacheable(node, content):
+        put_cached(key, node, model, content)
+    return content
+
+
+async def ainvoke_cached(node: str, llm, messages: List[Any]) -> Any:
+    """Async variant of invoke_cached; SQLite access runs in a worker thread."""
+    if not is_enabled() or LLM_CACHE_TTLS.get(node, 0) <= 0:
+        return (await acall_with_retry(lambda: llm.ainvoke(messages), acquire=False)).content
+
+    model, temperature = _describe(llm)
+    key = cache_key(messages, model, temperature)
+    with span(f"llm_cache.{node}", kind="cache") as s:
+        cached = await asyncio.to_thread(get_cached, key)
+        s.set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+
+    content = (await acall_with_retry(lambda: llm.ainvoke(messages), acquire=False)).content
+    if _cacheable(node, content):
+        await asyncio.to_thread(put_cached, key, node, model, content)
+    return content
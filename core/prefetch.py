@@ -0,0 +1,69 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+from core.symbols import resolve_tickers
+from tools.market_data import get_financial_metrics, get_stock_history
+from tools.search import search_financial_news, stock_news_query
+
+# Start the analysts' data fetches from a local guess at the ticker while the
+# supervisor's LLM call is still running (set SPECULATIVE_PREFETCH=0 to disable).
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "1") != "0"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "6"))
+
+_executor = ThreadPoolExecutor(max_workers=max(1, PREFETCH_WORKERS), thread_name_prefix="prefetch")
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "hits": 0, "misses": 0}
+
+
+def candidate_ticker(query: str) -> str:
+    """Best local guess at the query's ticker, however low the resolver's confidence."""
+    tickers, _ = resolve_tickers(query)
+    return tickers[0] if tickers else ""
+
+
+def prefetch(ticker: str) -> List[Future]:
+    """
+    Warm the shared caches with exactly the fetches the analysts will make for
+    `ticker`: 3 months of history, fundamentals and the news search. The caches
+    are single-flight, so an analyst asking while a prefetch is in flight joins it.
+    """
+    calls = [
+        (get_stock_history, (ticker,), {"period": "3mo"}),
+        (get_financial_metrics, (ticker,), {}),
+        (search_financial_news, (stock_news_query(ticker),), {"max_results": 5}),
+    ]
+    with _stats_lock:
+        _stats["started"] += 1
+    return [
+        _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        for fn, args, kwargs in calls
+    ]
+
+
+def speculate(query: str) -> str:
+    """Kick off a prefetch for the query's likely ticker. Returns the candidate ('' if none)."""
+    if not SPECULATIVE_PREFETCH:
+        return ""
+    candidate = candidate_ticker(query)
+    if candidate:
+        prefetch(candidate)
+    return candidate
+
+
+def record_outcome(candidate: str, ticker: str) -> None:
+    """
+    Count whether the guess matched the supervisor's answer. A wrong guess is
+    simply never read: its data stays keyed under the other ticker and ages out.
+    """
+    if not candidate:
+        return
+    with _stats_lock:
+        _stats["hits" if candidate == ticker else "misses"] += 1
+
+
+def get_prefetch_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,312 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+# Process-wide Gemini budgets. Set either to 0 to disable that limit.
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+# Tokens reserved per call before the real usage is known; corrected afterwards
+# from the response's usage metadata.
+GEMINI_TOKENS_PER_CALL = int(os.getenv("GEMINI_TOKENS_PER_CALL", "2000"))
+# Retries after a 429/503, with full-jitter exponential backoff between attempts.
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30.0"))
+
+# Lower value is served first. Interactive requests (/analyze, /smart-analyze)
+# jump ahead of batch work (/watchlist-scan, background jobs) waiting for budget.
+INTERACTIVE = 0
+BATCH = 1
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_WINDOW_SECONDS = 60.0
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run LLM calls made inside this block (including spawned tasks/threads) at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+_RETRYABLE_CODES = (429, 503)
+_RETRYABLE_STATUSES = ("RESOURCE_EXHAUSTED", "UNAVAILABLE")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    True for Gemini quota (429) and overload (503) errors, judged by the status
+    code or status of the error or of an error it was raised from (LangChain
+    wraps the SDK's ClientError/ServerError).
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if code in _RETRYABLE_CODES or getattr(error, "status", None) in _RETRYABLE_STATUSES:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt)))
+
+
+class GeminiScheduler:
+    """
+    Sliding-window requests/tokens-per-minute limiter with a priority queue.
+
+    Callers take a ticket and wait until they are first in line (lowest
+    priority value, then arrival order) and the last minute's usage leaves room
+    for them. Works from threads (acquire) and coroutines (aacquire).
+    """
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM, window_seconds: float = _WINDOW_SECONDS):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_seconds = window_seconds
+        self._lock = threading.Condition()
+        self._calls: deque = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._waiting: list = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._stats = {
+            "acquired": 0, "throttled": 0,
+            "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+        }
+        self._acquired_by_priority = {name: 0 for name in _PRIORITY_NAMES.values()}
+
+    def _evict(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] >= self.window_seconds:
+            self._tokens_in_window -= self._calls.popleft()[1]
+
+    def _try_take(self, ticket: tuple, tokens: int) -> float:
+        """Take budget for `ticket` if it's first in line. Returns 0 on success, else seconds to wait."""
+        now = time.monotonic()
+        self._evict(now)
+        if self._waiting[0] != ticket:
+            return 0.05
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rpm and len(self._calls) >= self.rpm:
+            return self.window_seconds - (now - self._calls[0][0])
+        # A single call larger than the whole budget still goes through once the window is empty
+        if self.tpm and self._calls and self._tokens_in_window + tokens > self.tpm:
+            return self.window_seconds - (now - self._calls[0][0])
+        heapq.heappop(self._waiting)
+        self._calls.append((now, tokens))
+        self._tokens_in_window += tokens
+        return 0.0
+
+    def _enter(self, priority: int) -> tuple:
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _leave(self, ticket: tuple) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+
+    def _record_wait(self, priority: int, waited: float) -> None:
+        self._stats["acquired"] += 1
+        self._stats["wait_seconds_total"] += waited
+        self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+        name = _PRIORITY_NAMES.get(priority, str(priority))
+        self._acquired_by_priority[name] = self._acquired_by_priority.get(name, 0) + 1
+
+    def acquire(self, tokens: int = GEMINI_TOKENS_PER_CALL, priority: Optional[int] = None) -> float:
+        """Block until a call may be made. Returns the seconds spent waiting."""
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        with self._lock:
+            ticket = self._enter(priority)
+            try:
+                while True:
+                    wait = self._try_take(ticket, tokens)
+                    if wait <= 0:
+                        break
+                    self._lock.wait(timeout=min(wait, 1.0))
+            except BaseException:
+                self._leave(ticket)
+                raise
+            waited = time.monotonic() - start
+            self._record_wait(priority, waited)
+            self._lock.notify_all()
+        return waited
+
+    async def aacquire(self, tokens: int = GEMINI_TOKENS_PER_CALL, priority: Optional[int] = None) -> float:
+        """Async variant of acquire; waits with asyncio.sleep instead of blocking the loop."""
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        with self._lock:
+            ticket = self._enter(priority)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_take(ticket, tokens)
+                    if wait <= 0:
+                        waited = time.monotonic() - start
+                        self._record_wait(priority, waited)
+                        self._lock.notify_all()
+                        return waited
+                await asyncio.sleep(min(wait, 0.25))
+        except BaseException:
+            with self._lock:
+                self._leave(ticket)
+                self._lock.notify_all()
+            raise
+
+    def record_usage(self, reserved: int, actual: int) -> None:
+        """Replace a call's reserved token estimate with its actual usage."""
+        with self._lock:
+            for i in range(len(self._calls) - 1, -1, -1):
+                ts, tokens = self._calls[i]
+                if tokens == reserved:
+                    self._calls[i] = (ts, actual)
+                    self._tokens_in_window += actual - reserved
+                    break
+            self._lock.notify_all()
+
+    def throttled(self, delay: float) -> None:
+        """Gemini said slow down: hold every caller, not just the one that got the 429."""
+        with self._lock:
+            self._stats["throttled"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            queued = {name: 0 for name in _PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                name = _PRIORITY_NAMES.get(priority, str(priority))
+                queued[name] = queued.get(name, 0) + 1
+            acquired = self._stats["acquired"]
+            return {
+                "rpm_limit": self.rpm,
+                "tpm_limit": self.tpm,
+                "requests_last_minute": len(self._calls),
+                "tokens_last_minute": self._tokens_in_window,
+                "queue_depth": len(self._waiting),
+                "queue_depth_by_priority": queued,
+                "acquired_by_priority": dict(self._acquired_by_priority),
+                "wait_seconds_avg": round(self._stats["wait_seconds_total"] / acquired, 4) if acquired else 0.0,
+                "wait_seconds_max": round(self._stats["wait_seconds_max"], 4),
+                "paused_seconds_remaining": round(max(0.0, self._paused_until - now), 3),
+                **{k: self._stats[k] for k in ("acquired", "throttled")},
+            }
+
+
+_scheduler = GeminiScheduler()
+
+
+def get_scheduler() -> GeminiScheduler:
+    return _scheduler
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    return _scheduler.stats()
+
+
+def call_with_retry(fn: Callable[[], Any], tokens: int = GEMINI_TOKENS_PER_CALL, acquire: bool = True) -> Any:
+    """
+    Run `fn`, retrying Gemini 429/503 errors with jittered backoff. A retryable
+    error pauses the whole scheduler for the backoff delay, so every caller
+    slows down, not just this one.
+
+    With acquire=True each attempt first waits for budget. Pass acquire=False
+    for LangChain clients from get_llm(): their rate_limiter hook already
+    waits on the scheduler before every attempt.
+    """
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if acquire:
+            _scheduler.acquire(tokens)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= GEMINI_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            _scheduler.throttled(delay)
+            print(f"Gemini rate limited ({e.__class__.__name__}); retrying in {delay:.1f}s")
+            if not acquire:
+                time.sleep(delay)
+
+
+async def acall_with_retry(fn: Callable[[], Any], tokens: int = GEMINI_TOKENS_PER_CALL, acquire: bool = True) -> Any:
+    """Async variant of call_with_retry; `fn` returns an awaitable."""
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if acquire:
+            await _scheduler.aacquire(tokens)
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt >= GEMINI_MAX_RETRIES or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            _scheduler.throttled(delay)
+            print(f"Gemini rate limited ({e.__class__.__name__}); retrying in {delay:.1f}s")
+            if not acquire:
+                await asyncio.sleep(delay)
+
+
+class GeminiRateLimiter(BaseRateLimiter):
+    """LangChain rate_limiter hook: every chat-model call waits on the shared scheduler."""
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        _scheduler.acquire(GEMINI_TOKENS_PER_CALL)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await _scheduler.aacquire(GEMINI_TOKENS_PER_CALL)
+        return True
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Corrects the scheduler's token reservation with the usage Gemini reports."""
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage and usage.get("total_tokens"):
+                    _scheduler.record_usage(GEMINI_TOKENS_PER_CALL, int(usage["total_tokens"]))
+                    return
+
+
+def limit_crewai_llm(llm):
+    """Route a CrewAI LLM's call() through the shared scheduler with 429/503 retries."""
+    if getattr(llm, "_rate_limited", False):
+        return llm
+    original_call = llm.call
+
+    def call(*args, **kwargs):
+        return call_with_retry(lambda: original_call(*args, **kwargs))
+
+    llm.call = call
+    llm._rate_limited = True
+    return llm
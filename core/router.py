@@ -1,49 +1,29 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional
 
-from core.classifier import classify_intent, extract_tickers
-from graph.workflow import build_graph
+from core.classifier import classify_query, aclassify_query
+from core.state import initial_state
+from graph.workflow import get_graph
 from crew.portfolio_crew import run_compare_stocks_crew, run_portfolio_crew
 
 
-def route_query(query: str) -> Dict[str, Any]:
-    """
-    Classify the user query intent and route to the appropriate execution path.
+def _first(tickers: List[str]) -> str:
+    return tickers[0] if tickers else ""
 
-    Returns a dict with:
-      - intent: the classified intent
-      - For single_stock: ticker, technical/fundamental/sentiment/risk analysis, final_recommendation
-      - For multi-stock: tickers, crew_result
-      - On error: error message
-    """
-    intent = classify_intent(query)
-
-    if intent == "single_stock_analysis":
-        # Route to existing LangGraph pipeline (unchanged)
-        graph = build_graph()
-        final_state = graph.invoke(
-            {
-                "user_query": query,
-                "ticker": "",
-                "technical_analysis": "",
-                "fundamental_analysis": "",
-                "sentiment_analysis": "",
-                "risk_analysis": "",
-                "final_recommendation": "",
-                "messages": [],
-            }
-        )
-        return {
-            "intent": intent,
-            "ticker": final_state.get("ticker", ""),
-            "technical_analysis": final_state.get("technical_analysis", ""),
-            "fundamental_analysis": final_state.get("fundamental_analysis", ""),
-            "sentiment_analysis": final_state.get("sentiment_analysis", ""),
-            "risk_analysis": final_state.get("risk_analysis", ""),
-            "final_recommendation": final_state.get("final_recommendation", ""),
-        }
 
-    # Multi-stock intents — extract tickers first
-    tickers = extract_tickers(query)
+def _single_stock_result(intent: str, final_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "intent": intent,
+        "ticker": final_state.get("ticker", ""),
+        "technical_analysis": final_state.get("technical_analysis", ""),
+        "fundamental_analysis": final_state.get("fundamental_analysis", ""),
+        "sentiment_analysis": final_state.get("sentiment_analysis", ""),
+        "risk_analysis": final_state.get("risk_analysis", ""),
+        "final_recommendation": final_state.get("final_recommendation", ""),
+    }
+
+
+def _run_multi_stock(intent: str, query: str, tickers: List[str]) -> Dict[str, Any]:
     if not tickers:
         return {
             "intent": intent,
@@ -59,3 +39,98 @@ def route_query(query: str) -> Dict[str, Any]:
         return {"intent": intent, "tickers": tickers, "crew_result": result}
 
     return {"intent": intent, "error": "Unrecognized intent."}
+
+
+def route_query(query: str, on_progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Classify the user query intent and route to the appropriate execution path.
+    `on_progress`, if given, is called with a short stage label as the run advances.
+
+    Returns a dict with:
+      - intent: the classified intent
+      - For single_stock: ticker, technical/fundamental/sentiment/risk analysis, final_recommendation
+      - For multi-stock: tickers, crew_result
+      - On error: error message
+    """
+    report = on_progress or (lambda stage: None)
+
+    # One classifier pass yields both the intent and the tickers
+    report("classifying")
+    route = classify_query(query)
+
+    if route.intent == "single_stock_analysis":
+        report(f"running swarm for {_first(route.tickers) or 'query'}")
+        # Pass the resolved ticker so the supervisor skips its own extraction call
+        graph = get_graph()
+        final_state = graph.invoke(initial_state(query, ticker=_first(route.tickers)))
+        return _single_stock_result(route.intent, final_state)
+
+    report(f"running {route.intent} crew for {', '.join(route.tickers)}")
+    return _run_multi_stock(route.intent, query, route.tickers)
+
+
+async def aroute_query(query: str, graph=None) -> Dict[str, Any]:
+    """
+    Async variant of route_query for use inside async request handlers.
+    The single-stock path awaits the async LangGraph pipeline (pass a compiled
+    async graph to reuse it); the CrewAI path is a blocking
+    library and runs in a worker thread so the event loop stays free.
+    """
+    route = await aclassify_query(query)
+
+    if route.intent == "single_stock_analysis":
+        graph = graph or get_graph(async_mode=True)
+        final_state = await graph.ainvoke(initial_state(query, ticker=_first(route.tickers)))
+        return _single_stock_result(route.intent, final_state)
+
+    return await asyncio.to_thread(_run_multi_stock, route.intent, query, route.tickers)
+
+
+async def astream_analysis(state: Dict[str, Any], graph=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the async LangGraph pipeline and yield events as soon as each node finishes.
+
+    Events:
+      - {"event": "node", "node": <name>, "data": <state update>} per finished node
+      - {"event": "token", "node": "judge", "content": <text>} while the judge is
+        generating (not emitted when its answer comes from the LLM cache)
+      - {"event": "done", "state": <final state>} at the end
+    """
+    graph = graph or get_graph(async_mode=True)
+    final_state = dict(state)
+    async for mode, chunk in graph.astream(state, stream_mode=["updates", "messages"]):
+        if mode == "messages":
+            message, metadata = chunk
+            text = getattr(message, "text", "")
+            if metadata.get("langgraph_node") == "judge" and isinstance(text, str) and text:
+                yield {"event": "token", "node": "judge", "content": text}
+            continue
+        for node, update in chunk.items():
+            if not update:
+                continue
+            final_state.update(update)
+            yield {"event": "node", "node": node, "data": update}
+    yield {"event": "done", "state": final_state}
+
+
+async def astream_query(query: str, graph=None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of aroute_query. Yields a "route" event with the intent and
+    tickers, then for single-stock queries the astream_analysis() node/token events,
+    and finally a "result" event carrying the same dict aroute_query returns.
+    """
+    route = await aclassify_query(query)
+    yield {"event": "route", "intent": route.intent, "tickers": route.tickers}
+
+    if route.intent == "single_stock_analysis":
+        final_state: Optional[Dict[str, Any]] = None
+        async for event in astream_analysis(initial_state(query, ticker=_first(route.tickers)), graph=graph):
+            if event["event"] == "done":
+                final_state = event["state"]
+                continue
+            yield event
+        yield {"event": "result", "result": _single_stock_result(route.intent, final_state or {})}
+        return
+
+    result = await asyncio.to_thread(_run_multi_stock, route.intent, query, route.tickers)
+    yield {"event": "result", "result": result}
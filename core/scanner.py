@@ -0,0 +1,66 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from agents.technical import technical_prescoring
+from core.state import initial_state
+
+# Upper bound on tickers analyzed at once. Each ticker fans out to 4 analyst
+# LLM calls, so keep this modest to stay inside the Gemini quota.
+SCAN_MAX_CONCURRENCY = int(os.getenv("SCAN_MAX_CONCURRENCY", "4"))
+# Per-ticker wall-clock budget in seconds; a slow ticker is reported as an error
+# instead of holding up the rest of the batch.
+SCAN_TICKER_TIMEOUT = float(os.getenv("SCAN_TICKER_TIMEOUT", "120"))
+
+
+async def _analyze_ticker(
+    graph,
+    ticker: str,
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+    prescore: bool = False,
+) -> Dict[str, Any]:
+    async with semaphore:
+        with technical_prescoring(prescore):
+            try:
+                final_state = await asyncio.wait_for(
+                    graph.ainvoke(initial_state(f"Analyze {ticker}", ticker=ticker)),
+                    timeout=timeout,
+                )
+                return {"ticker": ticker, "state": final_state, "error": None}
+            except asyncio.TimeoutError:
+                return {"ticker": ticker, "state": None, "error": f"timed out after {timeout:g}s"}
+            except Exception as e:
+                return {"ticker": ticker, "state": None, "error": str(e)}
+
+
+async def scan_tickers(
+    tickers: List[str],
+    graph=None,
+    max_concurrency: Optional[int] = None,
+    ticker_timeout: Optional[float] = None,
+    prescore: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Run the LangGraph pipeline for many tickers concurrently.
+
+    At most `max_concurrency` tickers are in flight at a time and each one is
+    bounded by `ticker_timeout` seconds. Failures are captured per ticker, so one
+    bad symbol never sinks the batch. With `prescore`, clear-cut technical
+    setups are answered by the rule engine instead of a Gemini call.
+
+    Returns one dict per ticker, in input order, with keys:
+      - ticker: the ticker analyzed
+      - state: the final graph state, or None on failure
+      - error: error message, or None on success
+    """
+    if graph is None:
+        from graph.workflow import get_graph
+        graph = get_graph(async_mode=True)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or SCAN_MAX_CONCURRENCY))
+    timeout = ticker_timeout or SCAN_TICKER_TIMEOUT
+
+    return await asyncio.gather(
+        *(_analyze_ticker(graph, ticker, semaphore, timeout, prescore) for ticker in tickers)
+    )
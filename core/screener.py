@@ -0,0 +1,204 @@
+import operator
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.symbols import known_tickers
+from tools.market_data import get_financial_metrics_bulk
+from tools.technical_ind import scan_indicator_universe
+
+# Candidates passed from the numeric first stage to the LLM pipeline by default.
+SCREEN_TOP_K = int(os.getenv("SCREEN_TOP_K", "5"))
+# Tickers per batched price download / panel computation in the first stage.
+SCREEN_CHUNK_SIZE = int(os.getenv("SCREEN_CHUNK_SIZE", "100"))
+
+# Screenable fields -> snapshot column (from latest_indicator_snapshot). Returns,
+# volatility and distances are fractions (0.05 = 5%).
+PRICE_FIELDS = {
+    "close": "Close",
+    "sma_20": "SMA_20",
+    "sma_50": "SMA_50",
+    "ema_20": "EMA_20",
+    "rsi_14": "RSI_14",
+    "macd_hist": "MACD_Hist",
+    "return_1m": "Return_1M",
+    "return_3m": "Return_3M",
+    "volatility": "Volatility_20",
+}
+DERIVED_FIELDS = {"dist_sma_20", "dist_sma_50"}  # close / SMA - 1
+# Screenable fields -> get_financial_metrics() key. Margins, growth and returns are fractions.
+FUNDAMENTAL_FIELDS = {
+    "market_cap": "marketCap",
+    "pe": "peRatio",
+    "forward_pe": "forwardPE",
+    "eps": "eps",
+    "roe": "returnOnEquity",
+    "roa": "returnOnAssets",
+    "debt_to_equity": "debtToEquity",
+    "profit_margins": "profitMargins",
+    "operating_margins": "operatingMargins",
+    "revenue_growth": "revenueGrowth",
+    "dividend_yield": "dividendYield",
+    "beta": "beta",
+    "sector": "sector",
+}
+FIELDS = set(PRICE_FIELDS) | DERIVED_FIELDS | set(FUNDAMENTAL_FIELDS)
+
+_COMPARISONS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+OPERATORS = set(_COMPARISONS) | {"between", "in"}
+# Non-numeric fields and the operators that make sense on them.
+TEXT_FIELDS = {"sector"}
+TEXT_OPERATORS = {"==", "!=", "in"}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_spec(filters: List[Dict[str, Any]], sort_by: Optional[str] = None) -> None:
+    """
+    Raise ValueError for unknown fields/operators or malformed values: numeric
+    fields need numbers (a [low, high] pair for between, a list for in), and
+    text fields only take ==, != and in with strings.
+    """
+    for f in filters:
+        field, op, value = f.get("field"), f.get("op"), f.get("value")
+        if field not in FIELDS:
+            raise ValueError(f"Unknown screen field '{field}'. Valid fields: {', '.join(sorted(FIELDS))}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator '{op}'. Valid operators: {', '.join(sorted(OPERATORS))}")
+        if op == "between" and not (isinstance(value, (list, tuple)) and len(value) == 2):
+            raise ValueError(f"'between' on '{field}' needs a [low, high] value")
+        if op == "in" and not isinstance(value, (list, tuple)):
+            raise ValueError(f"'in' on '{field}' needs a list value")
+        values = list(value) if op in ("between", "in") else [value]
+        if field in TEXT_FIELDS:
+            if op not in TEXT_OPERATORS:
+                raise ValueError(f"'{field}' only supports {', '.join(sorted(TEXT_OPERATORS))}")
+            if not all(isinstance(v, str) for v in values):
+                raise ValueError(f"'{field}' needs text values")
+        elif not all(_is_number(v) for v in values):
+            raise ValueError(f"'{op}' on '{field}' needs numeric values")
+    if sort_by and sort_by not in FIELDS:
+        raise ValueError(f"Unknown sort field '{sort_by}'. Valid fields: {', '.join(sorted(FIELDS))}")
+
+
+def build_features(
+    tickers: List[str],
+    period: str = "6mo",
+    fundamentals: bool = True,
+    fetch_missing: bool = True,
+) -> pd.DataFrame:
+    """
+    One row per ticker with every screenable field. Prices come from the local
+    store/cache (missing tickers are downloaded in batched chunks when
+    fetch_missing) and indicators are computed as one vectorized panel per chunk.
+    Fundamental columns are only added when `fundamentals` is set.
+    """
+    snapshots = list(scan_indicator_universe(
+        tickers, period=period, chunk_size=SCREEN_CHUNK_SIZE, fetch_missing=fetch_missing
+    ))
+    snapshot = pd.concat(snapshots) if snapshots else pd.DataFrame(columns=list(PRICE_FIELDS.values()))
+    features = pd.DataFrame(
+        {field: snapshot[column] for field, column in PRICE_FIELDS.items()}, index=snapshot.index
+    ).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        features["dist_sma_20"] = features["close"] / features["sma_20"] - 1
+        features["dist_sma_50"] = features["close"] / features["sma_50"] - 1
+
+    if fundamentals:
+        metrics = get_financial_metrics_bulk(list(features.index), fetch_missing=fetch_missing) if len(features) else {}
+        for field, key in FUNDAMENTAL_FIELDS.items():
+            values = pd.Series({t: m.get(key) for t, m in metrics.items()}, dtype=object)
+            column = values.reindex(features.index)
+            features[field] = column if field == "sector" else pd.to_numeric(column, errors="coerce")
+    features.index.name = "ticker"
+    return features
+
+
+def apply_filters(features: pd.DataFrame, filters: List[Dict[str, Any]]) -> pd.Series:
+    """Boolean mask of rows passing every filter (vectorized; missing values never pass)."""
+    mask = pd.Series(True, index=features.index)
+    for f in filters:
+        column, op, value = features[f["field"]], f["op"], f["value"]
+        if op == "between":
+            passed = column.between(value[0], value[1])
+        elif op == "in":
+            passed = column.isin(list(value))
+        else:
+            passed = _COMPARISONS[op](column, value)
+        mask &= passed.fillna(False).astype(bool) & column.notna()
+    return mask
+
+
+def _uses_fundamentals(filters: List[Dict[str, Any]], sort_by: Optional[str]) -> bool:
+    return any(f["field"] in FUNDAMENTAL_FIELDS for f in filters) or sort_by in FUNDAMENTAL_FIELDS
+
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    rows = []
+    for ticker, row in frame.iterrows():
+        record = {"ticker": ticker}
+        for field, value in row.items():
+            if isinstance(value, (float, np.floating)):
+                record[field] = None if np.isnan(value) else round(float(value), 4)
+            else:
+                record[field] = value
+        rows.append(record)
+    return rows
+
+
+def screen_universe(
+    filters: List[Dict[str, Any]],
+    tickers: Optional[List[str]] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = True,
+    top_k: Optional[int] = None,
+    period: str = "6mo",
+    fetch_missing: bool = True,
+) -> Dict[str, Any]:
+    """
+    First stage of the screening funnel: a numeric filter over the whole universe.
+
+    Args:
+        filters: [{"field": "rsi_14", "op": "<", "value": 40}, ...], all must pass.
+            Operators: <, <=, >, >=, ==, !=, between ([low, high]), in (list).
+        tickers: Universe to screen (default: every symbol known to core.symbols,
+            i.e. the built-in list plus SYMBOL_MASTER_CSV).
+        sort_by / descending: Ranking of the survivors (default: input order).
+        top_k: Survivors returned as candidates (default SCREEN_TOP_K).
+        fetch_missing: Download prices/fundamentals not in the local store.
+            False screens strictly from stored data.
+
+    Returns universe_size, screened (tickers with price data), passed, the top-K
+    `candidates` rows and `seconds` for the stage.
+    """
+    validate_spec(filters, sort_by)
+    universe = list(dict.fromkeys(tickers or known_tickers()))
+    start = time.perf_counter()
+    features = build_features(
+        universe, period=period,
+        fundamentals=_uses_fundamentals(filters, sort_by),
+        fetch_missing=fetch_missing,
+    )
+    survivors = features[apply_filters(features, filters)]
+    if sort_by:
+        survivors = survivors.sort_values(sort_by, ascending=not descending, na_position="last")
+    top_k = SCREEN_TOP_K if top_k is None else top_k
+    return {
+        "universe_size": len(universe),
+        "screened": len(features),
+        "passed": len(survivors),
+        "candidates": _records(survivors.head(top_k)),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
@@ -9,7 +9,23 @@ class TradingState(TypedDict):
     ticker: str
     fundamental_analysis: str
     technical_analysis: str
+    technical_signal: dict  # score_technicals() output when the rule engine answered instead of the LLM
     sentiment_analysis: str
     risk_analysis: str
     final_recommendation: str
     messages: Annotated[list, add] # To keep track of the conversation/agent thoughts
+
+
+def initial_state(user_query: str, ticker: str = "") -> TradingState:
+    """Returns a fresh TradingState for a graph run. Pass `ticker` to skip supervisor extraction."""
+    return {
+        "user_query": user_query,
+        "ticker": ticker,
+        "technical_analysis": "",
+        "technical_signal": {},
+        "fundamental_analysis": "",
+        "sentiment_analysis": "",
+        "risk_analysis": "",
+        "final_recommendation": "",
+        "messages": [],
+    }
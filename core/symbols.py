@@ -0,0 +1,245 @@
+import csv
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# NSE symbol -> common names/aliases people type in queries. Covers the NIFTY 50
+# plus frequently asked-about large and mid caps. Set SYMBOL_MASTER_CSV to NSE's
+# EQUITY_L.csv (columns SYMBOL, NAME OF COMPANY) to index the full exchange list.
+_BUILTIN_SYMBOLS: Dict[str, List[str]] = {
+    "ADANIENT": ["adani enterprises", "adani ent"],
+    "ADANIPORTS": ["adani ports", "adani ports and sez"],
+    "ADANIGREEN": ["adani green", "adani green energy"],
+    "ADANIPOWER": ["adani power"],
+    "APOLLOHOSP": ["apollo hospitals", "apollo hospital"],
+    "ASIANPAINT": ["asian paints", "asian paint"],
+    "AXISBANK": ["axis bank"],
+    "BAJAJ-AUTO": ["bajaj auto"],
+    "BAJFINANCE": ["bajaj finance"],
+    "BAJAJFINSV": ["bajaj finserv"],
+    "BEL": ["bharat electronics"],
+    "BHEL": ["bharat heavy electricals"],
+    "BPCL": ["bharat petroleum"],
+    "BHARTIARTL": ["bharti airtel", "airtel"],
+    "BRITANNIA": ["britannia", "britannia industries"],
+    "CIPLA": ["cipla"],
+    "COALINDIA": ["coal india"],
+    "DIVISLAB": ["divis labs", "divi's laboratories", "divis laboratories"],
+    "DRREDDY": ["dr reddy", "dr reddys", "dr reddy's", "dr. reddy's laboratories"],
+    "EICHERMOT": ["eicher motors", "eicher", "royal enfield"],
+    "GRASIM": ["grasim", "grasim industries"],
+    "HCLTECH": ["hcl tech", "hcl technologies", "hcl"],
+    "HDFCBANK": ["hdfc bank", "hdfc"],
+    "HDFCLIFE": ["hdfc life"],
+    "HEROMOTOCO": ["hero motocorp", "hero moto"],
+    "HINDALCO": ["hindalco", "hindalco industries"],
+    "HINDUNILVR": ["hindustan unilever", "hul"],
+    "ICICIBANK": ["icici bank", "icici"],
+    "INDUSINDBK": ["indusind bank", "indusind"],
+    "INFY": ["infosys"],
+    "ITC": ["itc"],
+    "JSWSTEEL": ["jsw steel"],
+    "KOTAKBANK": ["kotak mahindra bank", "kotak bank", "kotak"],
+    "LT": ["larsen & toubro", "larsen and toubro", "l&t", "larsen"],
+    "LTIM": ["ltimindtree", "lti mindtree"],
+    "M&M": ["mahindra & mahindra", "mahindra and mahindra", "m&m", "mahindra"],
+    "MARUTI": ["maruti suzuki", "maruti"],
+    "NESTLEIND": ["nestle india", "nestle"],
+    "NTPC": ["ntpc"],
+    "ONGC": ["ongc", "oil and natural gas corporation"],
+    "POWERGRID": ["power grid", "power grid corporation"],
+    "RELIANCE": ["reliance industries", "reliance", "ril"],
+    "SBILIFE": ["sbi life"],
+    "SBIN": ["state bank of india", "sbi"],
+    "SHRIRAMFIN": ["shriram finance"],
+    "SUNPHARMA": ["sun pharma", "sun pharmaceutical"],
+    "TATACONSUM": ["tata consumer", "tata consumer products"],
+    "TATAMOTORS": ["tata motors"],
+    "TATAPOWER": ["tata power"],
+    "TATASTEEL": ["tata steel"],
+    "TCS": ["tata consultancy services", "tata consultancy"],
+    "TECHM": ["tech mahindra"],
+    "TITAN": ["titan", "titan company"],
+    "TRENT": ["trent"],
+    "ULTRACEMCO": ["ultratech cement", "ultratech"],
+    "WIPRO": ["wipro"],
+    "ASHOKLEY": ["ashok leyland"],
+    "BANKBARODA": ["bank of baroda"],
+    "DLF": ["dlf"],
+    "DMART": ["avenue supermarts", "dmart", "d-mart"],
+    "GAIL": ["gail"],
+    "HAL": ["hindustan aeronautics"],
+    "HAVELLS": ["havells"],
+    "INDIGO": ["interglobe aviation", "indigo"],
+    "IOC": ["indian oil", "indian oil corporation"],
+    "IRCTC": ["irctc"],
+    "JIOFIN": ["jio financial", "jio financial services"],
+    "LICI": ["life insurance corporation", "lic"],
+    "LUPIN": ["lupin"],
+    "NAUKRI": ["info edge", "naukri"],
+    "PIDILITIND": ["pidilite", "pidilite industries"],
+    "PNB": ["punjab national bank"],
+    "SIEMENS": ["siemens"],
+    "TVSMOTOR": ["tvs motor", "tvs motors"],
+    "VEDL": ["vedanta"],
+    "ZOMATO": ["zomato"],
+    "PAYTM": ["paytm", "one97 communications"],
+    "NYKAA": ["nykaa", "fsn e-commerce"],
+    "YESBANK": ["yes bank"],
+    "IDFCFIRSTB": ["idfc first bank", "idfc first"],
+    "PERSISTENT": ["persistent systems"],
+    "COFORGE": ["coforge"],
+    "MPHASIS": ["mphasis"],
+    "DABUR": ["dabur"],
+    "MARICO": ["marico"],
+    "GODREJCP": ["godrej consumer", "godrej consumer products"],
+    "SAIL": ["steel authority of india"],
+    "IRFC": ["indian railway finance corporation"],
+    "POLYCAB": ["polycab"],
+    "DIXON": ["dixon technologies", "dixon"],
+}
+
+# Short symbols that are also ordinary words; only matched when typed in capitals.
+_CASE_SENSITIVE_SYMBOLS = {"LT", "HAL", "BEL", "IOC", "SAIL"}
+
+_index_lock = threading.Lock()
+_symbols: Optional[set] = None
+_aliases: Optional[Dict[str, str]] = None
+_max_alias_words = 1
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[^a-z0-9&'\-\. ]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _load_index() -> Tuple[set, Dict[str, str]]:
+    global _symbols, _aliases, _max_alias_words
+    with _index_lock:
+        if _symbols is not None:
+            return _symbols, _aliases
+
+        symbols = set(_BUILTIN_SYMBOLS)
+        aliases: Dict[str, str] = {}
+        for symbol, names in _BUILTIN_SYMBOLS.items():
+            for name in names:
+                aliases[_normalize(name)] = symbol
+
+        csv_path = os.getenv("SYMBOL_MASTER_CSV")
+        if csv_path and os.path.exists(csv_path):
+            try:
+                with open(csv_path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        row = {k.strip().upper(): (v or "").strip() for k, v in row.items() if k}
+                        symbol = row.get("SYMBOL", "").upper()
+                        if not symbol:
+                            continue
+                        symbols.add(symbol)
+                        name = _normalize(row.get("NAME OF COMPANY", ""))
+                        if name:
+                            aliases.setdefault(name, symbol)
+                            # "Infosys Limited" -> also "infosys"
+                            short = re.sub(r"\b(limited|ltd\.?)$", "", name).strip()
+                            if short:
+                                aliases.setdefault(short, symbol)
+            except (OSError, csv.Error) as e:
+                print(f"Could not load symbol master {csv_path}: {e}")
+
+        _max_alias_words = max(len(a.split()) for a in aliases)
+        _symbols, _aliases = symbols, aliases
+        return _symbols, _aliases
+
+
+def reload_index() -> None:
+    """Drop the in-memory index so the next lookup rebuilds it (e.g. after updating the CSV)."""
+    global _symbols, _aliases
+    with _index_lock:
+        _symbols, _aliases = None, None
+
+
+def known_tickers(suffix: str = ".NS") -> List[str]:
+    """Every symbol in the index (built-ins plus SYMBOL_MASTER_CSV) as sorted Yahoo tickers."""
+    symbols, _ = _load_index()
+    return sorted(symbol + suffix for symbol in symbols)
+
+
+# Capitalised words that are finance jargon, not tickers
+_NON_TICKER_WORDS = {
+    "BUY", "SELL", "HOLD", "NSE", "BSE", "IT", "AI", "PE", "ROE", "ROCE", "EPS", "RSI",
+    "MACD", "SMA", "EMA", "IPO", "CEO", "FY", "Q1", "Q2", "Q3", "Q4", "L", "CR", "INR",
+    "RS", "USD", "VS", "OK", "I", "A", "MY", "ETF", "SIP", "FD", "GDP", "RBI", "SEBI",
+    "NIFTY", "SENSEX", "PSU", "FMCG", "EV", "YOY", "QOQ", "TTM", "DCF", "NAV",
+}
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9&\-]*(?:\.(?:NS|BO|ns|bo))?")
+
+
+def resolve_tickers(query: str) -> Tuple[List[str], float]:
+    """
+    Resolve the stocks mentioned in a query to Yahoo Finance tickers without an LLM.
+
+    Explicit 'SYMBOL.NS'/'SYMBOL.BO' tokens are kept as-is; known symbols and
+    company names get '.NS' (or '.BO' when the query mentions BSE).
+
+    Returns (tickers in order of appearance, confidence in [0, 1]). Confidence
+    drops when the query has capitalised words that look like tickers but are
+    not in the index, since those are likely stocks the index doesn't know.
+    """
+    symbols, aliases = _load_index()
+    suffix = ".BO" if re.search(r"\bbse\b", query, re.IGNORECASE) else ".NS"
+
+    found: List[Tuple[int, str]] = []
+    unresolved = 0
+
+    # 1. Explicit tickers and bare symbols, token by token
+    tokens = [(m.start(), m.group(0)) for m in _TOKEN_RE.finditer(query)]
+    consumed = set()
+    for pos, token in tokens:
+        upper = token.upper()
+        if upper.endswith((".NS", ".BO")):
+            found.append((pos, upper))
+            consumed.add(pos)
+        elif upper in symbols and upper not in _NON_TICKER_WORDS and (
+            token == upper or upper not in _CASE_SENSITIVE_SYMBOLS
+        ):
+            found.append((pos, upper + suffix))
+            consumed.add(pos)
+
+    # 2. Company names / aliases, longest phrase first
+    words = [(m.start(), _normalize(m.group(0))) for m in re.finditer(r"\S+", query)]
+    i = 0
+    while i < len(words):
+        matched = False
+        for n in range(min(_max_alias_words, len(words) - i), 0, -1):
+            phrase = _normalize(" ".join(w for _, w in words[i:i + n])).strip(".'")
+            symbol = aliases.get(phrase)
+            if symbol is None:
+                continue
+            start = words[i][0]
+            end = words[i + n - 1][0]
+            if any(start <= p <= end for p in consumed):
+                break
+            if symbol in _CASE_SENSITIVE_SYMBOLS and n == 1 and not query[start:start + len(symbol)].isupper():
+                break
+            found.append((start, symbol + suffix))
+            consumed.update(p for p, _ in tokens if start <= p <= end)
+            i += n
+            matched = True
+            break
+        if not matched:
+            i += 1
+
+    # 3. Capitalised leftovers that look like tickers we couldn't resolve
+    for pos, token in tokens:
+        if pos in consumed:
+            continue
+        if token.isupper() and len(token) >= 2 and token not in _NON_TICKER_WORDS and not token[0].isdigit():
+            unresolved += 1
+
+    tickers = list(dict.fromkeys(t for _, t in sorted(found)))
+    if not tickers:
+        return [], 0.0 if unresolved else 0.5
+    confidence = 1.0 if unresolved == 0 else max(0.0, 0.6 - 0.2 * (unresolved - 1))
+    return tickers, confidence
@@ -0,0 +1,318 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Finished traces kept in memory for GET /traces/{request_id}.
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "200"))
+# When set, every finished trace is also written to <dir>/<request_id>.json.
+TRACE_DUMP_DIR = os.getenv("TRACE_DUMP_DIR", "")
+
+# Prometheus histogram buckets (seconds) for span durations.
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Span:
+    """One timed operation: a graph node, a data fetch or an LLM call."""
+
+    __slots__ = ("span_id", "parent_id", "name", "kind", "start", "wall_ms", "cpu_ms", "attrs", "error",
+                 "_t0", "_cpu0")
+
+    def __init__(self, name: str, kind: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.wall_ms: Optional[float] = None
+        self.cpu_ms: Optional[float] = None
+        self.attrs = dict(attrs)
+        self.error: Optional[str] = None
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def finish(self, error: Optional[BaseException] = None, same_thread: bool = True) -> None:
+        self.wall_ms = (time.perf_counter() - self._t0) * 1000
+        # CPU time is per thread; spans closed on another thread (LLM callbacks) only get wall time
+        if same_thread:
+            self.cpu_ms = min(self.wall_ms, (time.thread_time() - self._cpu0) * 1000)
+        if error is not None:
+            self.error = f"{error.__class__.__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        wait = None if self.cpu_ms is None or self.wall_ms is None else self.wall_ms - self.cpu_ms
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "wall_ms": None if self.wall_ms is None else round(self.wall_ms, 3),
+            "cpu_ms": None if self.cpu_ms is None else round(self.cpu_ms, 3),
+            # Time not spent on this thread's CPU: network/disk I/O and waiting on other tasks
+            "wait_ms": None if wait is None else round(wait, 3),
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class Trace:
+    """All spans recorded while handling one request."""
+
+    def __init__(self, request_id: str, name: str = ""):
+        self.request_id = request_id
+        self.name = name
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [s.to_dict() for s in self.spans]
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 3),
+            "spans": sorted(spans, key=lambda s: s["start"]),
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+_traces: "OrderedDict[str, Trace]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+# ============================================================
+# Metrics
+# ============================================================
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.count = defaultdict(int)
+            self.errors = defaultdict(int)
+            self.seconds = defaultdict(float)
+            self.buckets = defaultdict(lambda: [0] * len(_BUCKETS))
+            self.cache = defaultdict(int)  # (name, "hit"|"miss")
+            self.tokens = defaultdict(int)  # (name, "input"|"output")
+
+    def observe(self, span: Span) -> None:
+        key = (span.kind, span.name)
+        seconds = (span.wall_ms or 0.0) / 1000
+        with self._lock:
+            self.count[key] += 1
+            self.seconds[key] += seconds
+            buckets = self.buckets[key]
+            for i, bound in enumerate(_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            if span.error:
+                self.errors[key] += 1
+            if "cache_hit" in span.attrs:
+                self.cache[(span.name, "hit" if span.attrs["cache_hit"] else "miss")] += 1
+            for direction in ("input", "output"):
+                tokens = span.attrs.get(f"{direction}_tokens")
+                if tokens:
+                    self.tokens[(span.name, direction)] += int(tokens)
+
+
+_metrics = _Metrics()
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus(extra_gauges: Optional[Dict[str, float]] = None) -> str:
+    """All span metrics in Prometheus text exposition format."""
+    lines = [
+        "# HELP trade_today_span_duration_seconds Wall time of instrumented operations.",
+        "# TYPE trade_today_span_duration_seconds histogram",
+    ]
+    with _metrics._lock:
+        for (kind, name), count in sorted(_metrics.count.items()):
+            labels = f'kind="{_label(kind)}",name="{_label(name)}"'
+            for bound, value in zip(_BUCKETS, _metrics.buckets[(kind, name)]):
+                lines.append(f'trade_today_span_duration_seconds_bucket{{{labels},le="{bound}"}} {value}')
+            lines.append(f'trade_today_span_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"trade_today_span_duration_seconds_sum{{{labels}}} {_metrics.seconds[(kind, name)]:.6f}")
+            lines.append(f"trade_today_span_duration_seconds_count{{{labels}}} {count}")
+
+        lines += ["# HELP trade_today_span_errors_total Instrumented operations that raised.",
+                  "# TYPE trade_today_span_errors_total counter"]
+        for (kind, name), value in sorted(_metrics.errors.items()):
+            lines.append(f'trade_today_span_errors_total{{kind="{_label(kind)}",name="{_label(name)}"}} {value}')
+
+        lines += ["# HELP trade_today_cache_lookups_total Cache lookups by operation and result.",
+                  "# TYPE trade_today_cache_lookups_total counter"]
+        for (name, result), value in sorted(_metrics.cache.items()):
+            lines.append(f'trade_today_cache_lookups_total{{name="{_label(name)}",result="{result}"}} {value}')
+
+        lines += ["# HELP trade_today_llm_tokens_total Gemini tokens by call site and direction.",
+                  "# TYPE trade_today_llm_tokens_total counter"]
+        for (name, direction), value in sorted(_metrics.tokens.items()):
+            lines.append(f'trade_today_llm_tokens_total{{name="{_label(name)}",direction="{direction}"}} {value}')
+
+    for name, value in sorted((extra_gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics() -> None:
+    _metrics.reset()
+
+
+# ============================================================
+# Traces and spans
+# ============================================================
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def _store(trace: Trace) -> None:
+    with _traces_lock:
+        _traces[trace.request_id] = trace
+        _traces.move_to_end(trace.request_id)
+        while len(_traces) > TRACE_HISTORY:
+            _traces.popitem(last=False)
+
+
+def get_trace(request_id: str) -> Optional[Dict[str, Any]]:
+    with _traces_lock:
+        trace = _traces.get(request_id)
+    return trace.to_dict() if trace else None
+
+
+def _dump(trace: Trace) -> None:
+    try:
+        os.makedirs(TRACE_DUMP_DIR, exist_ok=True)
+        with open(os.path.join(TRACE_DUMP_DIR, f"{trace.request_id}.json"), "w") as f:
+            json.dump(trace.to_dict(), f, indent=2, default=str)
+    except OSError as e:
+        print(f"Could not write trace {trace.request_id}: {e}")
+
+
+@contextmanager
+def start_trace(name: str = "", request_id: Optional[str] = None):
+    """Collect every span recorded inside this block (and its tasks/threads) under one request id."""
+    trace = Trace(request_id or uuid.uuid4().hex, name)
+    _store(trace)
+    token = _current_trace.set(trace)
+    t0 = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.duration_ms = (time.perf_counter() - t0) * 1000
+        _current_trace.reset(token)
+        if TRACE_DUMP_DIR:
+            _dump(trace)
+
+
+def _open_span(name: str, kind: str, attrs: Dict[str, Any]) -> Span:
+    parent = _current_span.get()
+    span = Span(name, kind, parent.span_id if parent else None, attrs)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(span)
+    return span
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    """
+    Time a block. Yields the Span so the block can attach attributes
+    (cache_hit, input_tokens, ...). Recorded in the current trace, if any,
+    and always in the process metrics.
+    """
+    s = _open_span(name, kind, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.finish(error=e)
+        raise
+    else:
+        s.finish()
+    finally:
+        _current_span.reset(token)
+        _metrics.observe(s)
+
+
+def traced(name: str, kind: str = "internal") -> Callable:
+    """Decorator form of span() for sync and async functions."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingCallback(BaseCallbackHandler):
+    """Records a span per LangChain chat-model call, with token counts from the response."""
+
+    def __init__(self):
+        self._open: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs) -> None:
+        node = (metadata or {}).get("langgraph_node", "")
+        s = _open_span(f"llm.{node}" if node else "llm", "llm", {"model": (serialized or {}).get("name", "")})
+        with self._lock:
+            self._open[run_id] = s
+
+    def _close(self, run_id: UUID, error: Optional[BaseException] = None, usage: Optional[dict] = None) -> None:
+        with self._lock:
+            s = self._open.pop(run_id, None)
+        if s is None:
+            return
+        if usage:
+            s.set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+        s.finish(error=error, same_thread=False)
+        _metrics.observe(s)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        self._close(run_id, usage=usage)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._close(run_id, error=error)
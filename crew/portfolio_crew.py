@@ -1,18 +1,31 @@
+import contextvars
 import json
 import os
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 
 from crewai import Agent, Task, Crew, Process, LLM
 from crewai.tools import tool
 
-from core.config import get_llm
-from graph.workflow import build_graph
+from core.config import GEMINI_MODEL, get_api_key, get_pooled_client
+from core.rate_limit import limit_crewai_llm
+from core.tracing import span
+from core.scanner import SCAN_MAX_CONCURRENCY
+from core.state import initial_state
+from graph.workflow import get_graph
 from tools.market_data import get_financial_metrics
 from tools.correlation import (
     calculate_correlation_matrix,
     calculate_portfolio_metrics,
     get_sector_diversity,
 )
+from tools.optimizer import optimize_portfolio
+
+
+# "hybrid": per-ticker analyses and quant metrics are computed directly in
+# parallel and handed to a single strategist agent. "agentic": the original
+# three-agent crew that discovers and calls every tool itself.
+CREW_EXECUTION_MODE = os.getenv("CREW_EXECUTION_MODE", "hybrid")
 
 
 # ============================================================
@@ -20,25 +33,11 @@ from tools.correlation import (
 # ============================================================
 
 
-@tool("Analyze Single Stock")
-def analyze_single_stock(ticker: str) -> str:
-    """Run the full LangGraph multi-agent analysis pipeline on a single stock ticker.
-    Returns the complete analysis including technical, fundamental, sentiment,
-    risk analysis and final BUY/HOLD/SELL recommendation."""
+def _analyze_stock(ticker: str) -> str:
+    """Runs the LangGraph pipeline for one ticker and returns its reports as JSON."""
     try:
-        graph = build_graph()
-        result = graph.invoke(
-            {
-                "user_query": f"Analyze {ticker}",
-                "ticker": ticker,
-                "technical_analysis": "",
-                "fundamental_analysis": "",
-                "sentiment_analysis": "",
-                "risk_analysis": "",
-                "final_recommendation": "",
-                "messages": [],
-            }
-        )
+        graph = get_graph()
+        result = graph.invoke(initial_state(f"Analyze {ticker}", ticker=ticker))
         return json.dumps(
             {
                 "ticker": result.get("ticker", ""),
@@ -54,13 +53,8 @@ def analyze_single_stock(ticker: str) -> str:
         return f"Error analyzing {ticker}: {str(e)}"
 
 
-@tool("Get Correlation Matrix")
-def get_correlation_matrix(tickers_csv: str) -> str:
-    """Calculate the price correlation matrix for multiple stocks.
-    Input: comma-separated tickers, e.g. 'RELIANCE.NS,TCS.NS,INFY.NS'
-    Returns the correlation matrix showing how closely stocks move together."""
+def _correlation_matrix(tickers: List[str]) -> str:
     try:
-        tickers = [t.strip() for t in tickers_csv.split(",")]
         corr = calculate_correlation_matrix(tickers)
         if corr.empty:
             return "Could not calculate correlations — insufficient data."
@@ -69,6 +63,50 @@ def get_correlation_matrix(tickers_csv: str) -> str:
         return f"Error calculating correlation: {str(e)}"
 
 
+def _portfolio_metrics(holdings: Dict[str, float]) -> str:
+    try:
+        metrics = calculate_portfolio_metrics(holdings)
+        if not metrics:
+            return "Could not calculate portfolio metrics — insufficient data."
+        return json.dumps(metrics, indent=2, default=str)
+    except Exception as e:
+        return f"Error calculating portfolio metrics: {str(e)}"
+
+
+def _sector_diversity(tickers: List[str]) -> str:
+    try:
+        diversity = get_sector_diversity(tickers)
+        return json.dumps(diversity, indent=2)
+    except Exception as e:
+        return f"Error checking sector diversity: {str(e)}"
+
+
+def _optimized_allocation(tickers: List[str]) -> Optional[str]:
+    """Optimizer output as JSON, or None when there is too little data."""
+    try:
+        result = optimize_portfolio(tickers)
+    except Exception as e:
+        print(f"Error optimizing portfolio for {tickers}: {e}")
+        return None
+    return json.dumps(result, indent=2) if result else None
+
+
+@tool("Analyze Single Stock")
+def analyze_single_stock(ticker: str) -> str:
+    """Run the full LangGraph multi-agent analysis pipeline on a single stock ticker.
+    Returns the complete analysis including technical, fundamental, sentiment,
+    risk analysis and final BUY/HOLD/SELL recommendation."""
+    return _analyze_stock(ticker)
+
+
+@tool("Get Correlation Matrix")
+def get_correlation_matrix(tickers_csv: str) -> str:
+    """Calculate the price correlation matrix for multiple stocks.
+    Input: comma-separated tickers, e.g. 'RELIANCE.NS,TCS.NS,INFY.NS'
+    Returns the correlation matrix showing how closely stocks move together."""
+    return _correlation_matrix([t.strip() for t in tickers_csv.split(",")])
+
+
 @tool("Calculate Portfolio Metrics")
 def get_portfolio_metrics(holdings_json: str) -> str:
     """Calculate portfolio risk-return metrics.
@@ -76,12 +114,9 @@ def get_portfolio_metrics(holdings_json: str) -> str:
     Returns annualized return, volatility, Sharpe ratio, and correlation matrix."""
     try:
         holdings = json.loads(holdings_json)
-        metrics = calculate_portfolio_metrics(holdings)
-        if not metrics:
-            return "Could not calculate portfolio metrics — insufficient data."
-        return json.dumps(metrics, indent=2, default=str)
     except Exception as e:
         return f"Error calculating portfolio metrics: {str(e)}"
+    return _portfolio_metrics(holdings)
 
 
 @tool("Get Stock Fundamentals")
@@ -100,12 +135,17 @@ def get_sector_diversity_tool(tickers_csv: str) -> str:
     """Check sector diversity for a list of stocks.
     Input: comma-separated tickers, e.g. 'RELIANCE.NS,TCS.NS'.
     Returns stocks grouped by sector to assess diversification."""
-    try:
-        tickers = [t.strip() for t in tickers_csv.split(",")]
-        diversity = get_sector_diversity(tickers)
-        return json.dumps(diversity, indent=2)
-    except Exception as e:
-        return f"Error checking sector diversity: {str(e)}"
+    return _sector_diversity([t.strip() for t in tickers_csv.split(",")])
+
+
+@tool("Optimize Portfolio Weights")
+def get_optimized_weights(tickers_csv: str) -> str:
+    """Compute optimized long-only weights for a list of stocks.
+    Input: comma-separated tickers, e.g. 'RELIANCE.NS,TCS.NS,INFY.NS'.
+    Returns min-variance, max-Sharpe, risk-parity and mean-variance portfolios
+    (with per-stock and sector caps) and each one's return, volatility and Sharpe."""
+    result = _optimized_allocation([t.strip() for t in tickers_csv.split(",")])
+    return result or "Could not optimize the portfolio — insufficient data."
 
 
 # ============================================================
@@ -114,12 +154,15 @@ def get_sector_diversity_tool(tickers_csv: str) -> str:
 
 
 def _get_crewai_llm(temperature: float = 0.2):
-    """Returns a CrewAI-native LLM instance using Google Gemini."""
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    return LLM(
-        model="gemini/gemini-2.5-flash",
-        api_key=api_key,
-        temperature=temperature,
+    """Returns a CrewAI-native LLM instance using Google Gemini, pooled like get_llm()."""
+    api_key = get_api_key() or ""
+    return get_pooled_client(
+        ("crewai", GEMINI_MODEL, temperature, api_key),
+        lambda: limit_crewai_llm(LLM(
+            model=f"gemini/{GEMINI_MODEL}",
+            api_key=api_key,
+            temperature=temperature,
+        )),
     )
 
 
@@ -152,6 +195,7 @@ def create_correlation_analyst_agent() -> Agent:
             get_correlation_matrix,
             get_portfolio_metrics,
             get_sector_diversity_tool,
+            get_optimized_weights,
         ],
         llm=_get_crewai_llm(),
         verbose=True,
@@ -179,12 +223,8 @@ def create_portfolio_strategist_agent() -> Agent:
 # ============================================================
 
 
-def run_compare_stocks_crew(tickers: List[str], user_query: str) -> str:
-    """
-    Compare multiple stocks side-by-side.
-    Runs the full analysis on each stock, calculates correlation,
-    and provides a comparative recommendation.
-    """
+def _run_compare_stocks_agentic(tickers: List[str], user_query: str) -> str:
+    """Original flow: CrewAI agents call every tool themselves, one task after another."""
     scorer = create_stock_scorer_agent()
     correlation_analyst = create_correlation_analyst_agent()
     strategist = create_portfolio_strategist_agent()
@@ -234,16 +274,12 @@ def run_compare_stocks_crew(tickers: List[str], user_query: str) -> str:
     return str(result)
 
 
-def run_portfolio_crew(
+def _run_portfolio_agentic(
     tickers: List[str],
     user_query: str,
     weights: Dict[str, float] = None,
 ) -> str:
-    """
-    Run portfolio analysis or allocation crew.
-    Analyzes individual stocks, calculates portfolio metrics,
-    and suggests optimal allocation.
-    """
+    """Original flow: CrewAI agents call every tool themselves, one task after another."""
     scorer = create_stock_scorer_agent()
     correlation_analyst = create_correlation_analyst_agent()
     strategist = create_portfolio_strategist_agent()
@@ -278,10 +314,10 @@ def run_portfolio_crew(
             description=(
                 f"Calculate the correlation matrix for: {tickers_csv}. "
                 f"Check sector diversity for: {tickers_csv}. "
-                f"Based on the correlations, suggest an optimal weight allocation "
-                f"that maximizes diversification. Assume equal weights as starting point."
+                f"Use the portfolio optimization tool with: {tickers_csv} and report its "
+                f"portfolios. Explain what drives each set of weights; do not invent other weights."
             ),
-            expected_output="Correlation matrix, sector diversity, and suggested weight allocation.",
+            expected_output="Correlation matrix, sector diversity, and the optimized weight allocations.",
             agent=correlation_analyst,
         )
 
@@ -304,3 +340,143 @@ def run_portfolio_crew(
 
     result = crew.kickoff()
     return str(result)
+
+
+def _precompute_context(
+    tickers: List[str], holdings: Optional[Dict[str, float]] = None, optimize: bool = False
+) -> Dict[str, object]:
+    """
+    Runs the deterministic steps concurrently outside the crew: one LangGraph
+    analysis per ticker, the correlation matrix, portfolio metrics (when
+    holdings are given), sector diversity and optimized weights (when optimize).
+    """
+    # Quant and sector jobs are submitted first so they never queue behind the
+    # slower per-ticker graph runs.
+    with ThreadPoolExecutor(max_workers=SCAN_MAX_CONCURRENCY + 2) as pool:
+        def submit(fn, *args):
+            # Carry the caller's API key override and LLM priority into the worker
+            return pool.submit(contextvars.copy_context().run, fn, *args)
+
+        correlation = submit(_correlation_matrix, tickers)
+        sectors = submit(_sector_diversity, tickers)
+        metrics = submit(_portfolio_metrics, holdings) if holdings else None
+        optimized = submit(_optimized_allocation, tickers) if optimize else None
+        analyses = [submit(_analyze_stock, ticker) for ticker in tickers]
+
+        return {
+            "stock_analyses": [f.result() for f in analyses],
+            "correlation_matrix": correlation.result(),
+            "sector_diversity": sectors.result(),
+            "portfolio_metrics": metrics.result() if metrics else None,
+            "optimized_allocation": optimized.result() if optimized else None,
+        }
+
+
+def _format_context(context: Dict[str, object]) -> str:
+    sections = ["[INDIVIDUAL STOCK ANALYSES]", *context["stock_analyses"]]
+    sections += ["[CORRELATION MATRIX]", context["correlation_matrix"]]
+    sections += ["[SECTOR DIVERSITY]", context["sector_diversity"]]
+    if context.get("portfolio_metrics"):
+        sections += ["[PORTFOLIO METRICS]", context["portfolio_metrics"]]
+    if context.get("optimized_allocation"):
+        sections += ["[OPTIMIZED ALLOCATIONS]", context["optimized_allocation"]]
+    return "\n\n".join(sections)
+
+
+def _run_strategist(description: str, expected_output: str) -> str:
+    strategist = create_portfolio_strategist_agent()
+    task = Task(description=description, expected_output=expected_output, agent=strategist)
+    crew = Crew(
+        agents=[strategist],
+        tasks=[task],
+        process=Process.sequential,
+        verbose=True,
+    )
+    with span("crew.strategist", kind="llm"):
+        return str(crew.kickoff())
+
+
+def _run_compare_stocks_hybrid(tickers: List[str], user_query: str) -> str:
+    context = _precompute_context(tickers)
+    return _run_strategist(
+        description=(
+            f"The following analyses were already computed for: {', '.join(tickers)}.\n\n"
+            f"{_format_context(context)}\n\n"
+            f"Based on these individual stock scores and the correlation analysis, "
+            f"answer the user's original question: '{user_query}'. "
+            f"Provide a clear head-to-head comparison and a final recommendation on which stock(s) "
+            f"are the better pick and why. Include specific reasons."
+        ),
+        expected_output="A clear comparison of all stocks with a final recommendation and reasoning.",
+    )
+
+
+def _run_portfolio_hybrid(
+    tickers: List[str],
+    user_query: str,
+    weights: Dict[str, float] = None,
+) -> str:
+    # Without user weights, evaluate the equal-weight portfolio as the starting point
+    holdings = weights or {t: 1.0 / len(tickers) for t in tickers}
+    context = _precompute_context(tickers, holdings, optimize=True)
+    weights_note = (
+        f"The user's current weights are {json.dumps(weights)}."
+        if weights
+        else "Portfolio metrics assume equal weights as the starting point."
+    )
+    if context["optimized_allocation"]:
+        allocation_instructions = (
+            "The allocation percentages come from the numerical optimizer in [OPTIMIZED ALLOCATIONS]. "
+            "Recommend the optimized portfolio that fits the user's goal (max_sharpe by default, "
+            "min_variance or risk_parity for a cautious investor) and quote its weights exactly; "
+            "do not invent different percentages. "
+            + ("Compare it with the user's current weights. " if weights else "")
+            + "Explain why the optimizer weighted each stock as it did, using the analyses, "
+            "correlations, sector caps and risk contributions."
+        )
+    else:
+        allocation_instructions = "Provide specific allocation percentages for each stock with clear rationale."
+    return _run_strategist(
+        description=(
+            f"The following analyses were already computed for: {', '.join(tickers)}.\n\n"
+            f"{_format_context(context)}\n\n"
+            f"{weights_note} "
+            f"Synthesize the individual stock analyses and portfolio metrics to answer: '{user_query}'. "
+            f"{allocation_instructions} "
+            f"Include a risk assessment and any warnings about concentration or correlation risks."
+        ),
+        expected_output="Final portfolio recommendation with specific allocation percentages, risk assessment, and rationale.",
+    )
+
+
+def run_compare_stocks_crew(
+    tickers: List[str], user_query: str, mode: Optional[str] = None
+) -> str:
+    """
+    Compare multiple stocks side-by-side.
+    Runs the full analysis on each stock, calculates correlation,
+    and provides a comparative recommendation.
+
+    mode: "hybrid" (default, see CREW_EXECUTION_MODE) or "agentic".
+    """
+    if (mode or CREW_EXECUTION_MODE) == "agentic":
+        return _run_compare_stocks_agentic(tickers, user_query)
+    return _run_compare_stocks_hybrid(tickers, user_query)
+
+
+def run_portfolio_crew(
+    tickers: List[str],
+    user_query: str,
+    weights: Dict[str, float] = None,
+    mode: Optional[str] = None,
+) -> str:
+    """
+    Run portfolio analysis or allocation crew.
+    Analyzes individual stocks, calculates portfolio metrics, and computes
+    optimized allocations (tools.optimizer) that the strategist explains.
+
+    mode: "hybrid" (default, see CREW_EXECUTION_MODE) or "agentic".
+    """
+    if (mode or CREW_EXECUTION_MODE) == "agentic":
+        return _run_portfolio_agentic(tickers, user_query, weights)
+    return _run_portfolio_hybrid(tickers, user_query, weights)
@@ -1,13 +1,19 @@
+import threading
 from langgraph.graph import StateGraph, START, END
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from core.state import TradingState
 from core.config import get_llm
-from agents.technical import technical_analyst_node
-from agents.fundamental import fundamental_analyst_node
-from agents.sentiment import sentiment_analyst_node
-from agents.risk import risk_analyst_node
-from agents.judge import judge_node
+from core.rate_limit import acall_with_retry, call_with_retry
+from core.tracing import traced
+from core.classifier import FAST_PATH_MIN_CONFIDENCE
+from core.symbols import resolve_tickers
+from core.prefetch import record_outcome, speculate
+from agents.technical import technical_analyst_node, atechnical_analyst_node
+from agents.fundamental import fundamental_analyst_node, afundamental_analyst_node
+from agents.sentiment import sentiment_analyst_node, asentiment_analyst_node
+from agents.risk import risk_analyst_node, arisk_analyst_node
+from agents.judge import judge_node, ajudge_node
 
 SUPERVISOR_SYSTEM_PROMPT = """You are the Supervisor of a Trading Analysis Swarm.
 Your ONLY job is to extract the stock ticker from the user query.
@@ -16,6 +22,12 @@ Respond ONLY with the exact ticker string (e.g. 'RELIANCE.NS'). Do not include a
 If you cannot determine a ticker, output 'UNKNOWN'.
 """
 
+def _resolve_locally(query: str) -> str:
+    tickers, confidence = resolve_tickers(query)
+    if len(tickers) == 1 and confidence >= FAST_PATH_MIN_CONFIDENCE:
+        return tickers[0]
+    return ""
+
 def supervisor_node(state: TradingState) -> dict:
     """Supervisory node that parses the user query and populates the target ticker."""
     query = state.get("user_query", "")
@@ -23,21 +35,60 @@ def supervisor_node(state: TradingState) -> dict:
     # Bypass LLM if ticker is already perfectly defined
     if state.get("ticker"):
         return {"ticker": state["ticker"]}
+
+    # ...or if the local symbol index resolves exactly one ticker with confidence
+    ticker = _resolve_locally(query)
+    if ticker:
+        return {"ticker": ticker}
         
+    # Start fetching data for the likely ticker while the LLM decides
+    candidate = speculate(query)
+
     llm = get_llm(temperature=0.0) # Zero temp for strict string extraction
     messages = [
         SystemMessage(content=SUPERVISOR_SYSTEM_PROMPT),
         HumanMessage(content=query)
     ]
     
-    response = llm.invoke(messages)
+    response = call_with_retry(lambda: llm.invoke(messages), acquire=False)
     ticker = response.content.strip()
+    record_outcome(candidate, ticker)
     
     # Store the parsed ticker in the state
     return {"ticker": ticker}
 
-def build_graph() -> StateGraph:
-    """Constructs and returns the compiled LangGraph execution graph."""
+async def asupervisor_node(state: TradingState) -> dict:
+    """Async variant of supervisor_node; awaits the LLM instead of blocking a thread."""
+    query = state.get("user_query", "")
+
+    if state.get("ticker"):
+        return {"ticker": state["ticker"]}
+
+    ticker = _resolve_locally(query)
+    if ticker:
+        return {"ticker": ticker}
+
+    candidate = speculate(query)
+
+    llm = get_llm(temperature=0.0)
+    messages = [
+        SystemMessage(content=SUPERVISOR_SYSTEM_PROMPT),
+        HumanMessage(content=query)
+    ]
+
+    response = await acall_with_retry(lambda: llm.ainvoke(messages), acquire=False)
+    ticker = response.content.strip()
+    record_outcome(candidate, ticker)
+    return {"ticker": ticker}
+
+def build_graph(async_mode: bool = False) -> StateGraph:
+    """
+    Constructs and returns the compiled LangGraph execution graph.
+
+    With async_mode=True the nodes are the native async variants, so the graph
+    must be run with ainvoke()/astream(). Use it from async code (the API) so
+    LLM calls don't tie up worker threads while waiting on Gemini.
+    """
     
     # Initialize the graph with our state schema
     workflow = StateGraph(TradingState)
@@ -45,12 +96,16 @@ def build_graph() -> StateGraph:
     # ==========================
     # 1. Add Nodes
     # ==========================
-    workflow.add_node("supervisor", supervisor_node)
-    workflow.add_node("technical_analyst", technical_analyst_node)
-    workflow.add_node("fundamental_analyst", fundamental_analyst_node)
-    workflow.add_node("sentiment_analyst", sentiment_analyst_node)
-    workflow.add_node("risk_analyst", risk_analyst_node)
-    workflow.add_node("judge", judge_node)
+    def add_node(name, sync_fn, async_fn):
+        # Every node is timed as a span so slow requests can be attributed per node
+        workflow.add_node(name, traced(f"node.{name}", kind="node")(async_fn if async_mode else sync_fn))
+
+    add_node("supervisor", supervisor_node, asupervisor_node)
+    add_node("technical_analyst", technical_analyst_node, atechnical_analyst_node)
+    add_node("fundamental_analyst", fundamental_analyst_node, afundamental_analyst_node)
+    add_node("sentiment_analyst", sentiment_analyst_node, asentiment_analyst_node)
+    add_node("risk_analyst", risk_analyst_node, arisk_analyst_node)
+    add_node("judge", judge_node, ajudge_node)
     
     # ==========================
     # 2. Define Edges & Routing
@@ -78,3 +133,25 @@ def build_graph() -> StateGraph:
     # ==========================
     app = workflow.compile()
     return app
+
+
+# Compiled graphs are immutable and safe to share, so compile each variant once
+# per process instead of on every request.
+_compiled_graphs = {}
+_compiled_graphs_lock = threading.Lock()
+
+def get_graph(async_mode: bool = False):
+    """Returns the shared compiled graph, compiling it on first use (thread-safe)."""
+    graph = _compiled_graphs.get(async_mode)
+    if graph is None:
+        with _compiled_graphs_lock:
+            graph = _compiled_graphs.get(async_mode)
+            if graph is None:
+                graph = build_graph(async_mode=async_mode)
+                _compiled_graphs[async_mode] = graph
+    return graph
+
+def invalidate_graph() -> None:
+    """Drops the shared compiled graphs so the next get_graph() rebuilds them (e.g. after a config change)."""
+    with _compiled_graphs_lock:
+        _compiled_graphs.clear()
@@ -3,7 +3,7 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, List
 
-from graph.workflow import build_graph
+from graph.workflow import get_graph
 
 app = FastAPI(
     title="Trade Today API",
@@ -11,11 +11,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Initialize the LangGraph app once globally (or per request if needed)
-# Depending on how the state depends on instantiation, we can also instantiate inside the endpoint.
-# But build_graph() likely returns a standard compiled StateGraph which can be shared.
+# Share the process-wide compiled LangGraph app with every other entry point
 try:
-    swarm_app = build_graph()
+    swarm_app = get_graph()
 except Exception as e:
     swarm_app = None
     print(f"Error initializing swarm graph: {e}")
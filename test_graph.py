@@ -1,9 +1,9 @@
-from graph.workflow import build_graph
+from graph.workflow import get_graph
 import pprint
 
 def main():
     print("Initializing Multi-Agent Trading Swarm...")
-    app = build_graph()
+    app = get_graph()
     
     print("\n" + "="*50)
     print("Welcome to Trade Today CLI")
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    """Point the local SQLite database at a temp file so tests never touch data/trade_today.db."""
+    monkeypatch.setenv("TRADE_TODAY_DB", str(tmp_path / "trade_today.db"))
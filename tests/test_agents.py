@@ -124,3 +124,190 @@ def test_judge_node(mock_get_llm):
     human_msg_content = messages[1].content
     assert "[TECHNICAL ANALYSIS]" in human_msg_content
     assert "Bullish" in human_msg_content
+
+@patch("agents.fundamental.get_llm")
+@patch("agents.fundamental.get_financial_metrics")
+def test_async_fundamental_analyst_node(mock_get_metrics, mock_get_llm):
+    """
+    The async variant should await ainvoke instead of calling the blocking invoke.
+    """
+    import asyncio
+    from unittest.mock import AsyncMock
+    from agents.fundamental import afundamental_analyst_node
+
+    mock_llm = MagicMock()
+    mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content="Fairly Valued"))
+    mock_get_llm.return_value = mock_llm
+    mock_get_metrics.return_value = {"marketCap": 1000000, "peRatio": 15.0}
+
+    res = asyncio.run(afundamental_analyst_node({"ticker": "RELIANCE.NS"}))
+
+    assert res["fundamental_analysis"] == "Fairly Valued"
+    mock_llm.ainvoke.assert_awaited_once()
+    mock_llm.invoke.assert_not_called()
+
+def test_async_graph_runs_with_ainvoke():
+    """
+    build_graph(async_mode=True) should compile and run end-to-end through ainvoke.
+    """
+    import asyncio
+    from unittest.mock import AsyncMock
+    from graph.workflow import build_graph
+    from core.state import initial_state
+    from core.config import clear_llm_clients
+
+    mock_llm = MagicMock()
+    mock_llm.ainvoke = AsyncMock(return_value=MagicMock(content="FINAL RECOMMENDATION: HOLD"))
+
+    clear_llm_clients()
+    with patch("core.config.ChatGoogleGenerativeAI", return_value=mock_llm), \
+            patch("agents.technical.get_stock_history", return_value=pd.DataFrame()), \
+            patch("agents.fundamental.get_financial_metrics", return_value={}), \
+            patch("agents.risk.get_financial_metrics", return_value={}), \
+            patch("agents.sentiment.search_financial_news", return_value=[]):
+        graph = build_graph(async_mode=True)
+        final_state = asyncio.run(graph.ainvoke(initial_state("Analyze TCS", ticker="TCS.NS")))
+
+    assert final_state["ticker"] == "TCS.NS"
+    assert final_state["final_recommendation"] == "FINAL RECOMMENDATION: HOLD"
+    assert final_state["risk_analysis"] == "FINAL RECOMMENDATION: HOLD"
+    mock_llm.invoke.assert_not_called()
+    clear_llm_clients()
+
+def test_get_llm_reuses_pooled_clients_per_key():
+    """
+    get_llm should return the same client for the same settings, a separate one for
+    a per-request API key override, and drop old-key clients on rotation.
+    """
+    from core.config import get_llm, api_key_override, rotate_api_key, clear_llm_clients
+
+    clear_llm_clients()
+    with patch.dict("os.environ", {"GEMINI_API_KEY": "key-a"}), \
+            patch("core.config.ChatGoogleGenerativeAI", side_effect=lambda **kw: MagicMock(**kw)) as mock_cls:
+        first = get_llm(temperature=0.1)
+        assert get_llm(temperature=0.1) is first
+        assert get_llm(temperature=0.3) is not first
+
+        with api_key_override("key-b"):
+            override = get_llm(temperature=0.1)
+        assert override is not first
+        assert mock_cls.call_args.kwargs["google_api_key"] == "key-b"
+
+        rotate_api_key("key-c")
+        rotated = get_llm(temperature=0.1)
+        assert rotated is not first
+        assert mock_cls.call_args.kwargs["google_api_key"] == "key-c"
+        assert mock_cls.call_count == 4
+    clear_llm_clients()
+
+@patch("agents.fundamental.get_llm")
+@patch("agents.fundamental.get_financial_metrics")
+def test_fundamental_response_is_cached_for_identical_inputs(mock_get_metrics, mock_get_llm):
+    """
+    A second run with byte-identical metrics should be served from the LLM response
+    cache; changed metrics must miss it.
+    """
+    setup_mock_llm(mock_get_llm, "Undervalued")
+    mock_llm = mock_get_llm.return_value
+    mock_llm.model = "gemini-2.5-flash"
+    mock_llm.temperature = 0.1
+    mock_get_metrics.return_value = {"marketCap": 1000000, "peRatio": 15.0}
+
+    first = fundamental_analyst_node({"ticker": "RELIANCE.NS"})
+    second = fundamental_analyst_node({"ticker": "RELIANCE.NS"})
+    assert first == second == {"fundamental_analysis": "Undervalued"}
+    assert mock_llm.invoke.call_count == 1
+
+    mock_get_metrics.return_value = {"marketCap": 1000000, "peRatio": 16.0}
+    fundamental_analyst_node({"ticker": "RELIANCE.NS"})
+    assert mock_llm.invoke.call_count == 2
+
+def test_get_graph_compiles_once_until_invalidated():
+    """
+    get_graph should hand every caller the same compiled graph until invalidate_graph() is called.
+    """
+    from graph import workflow
+
+    workflow.invalidate_graph()
+    with patch("graph.workflow.build_graph", side_effect=lambda async_mode=False: MagicMock()) as mock_build:
+        first = workflow.get_graph()
+        assert workflow.get_graph() is first
+        assert workflow.get_graph(async_mode=True) is not first
+        assert mock_build.call_count == 2
+
+        workflow.invalidate_graph()
+        assert workflow.get_graph() is not first
+        assert mock_build.call_count == 3
+    workflow.invalidate_graph()
+
+
+def test_tracing_records_node_and_llm_spans_under_one_request():
+    """
+    A traced graph run should record one span per node plus LLM spans with
+    token counts, all under the same request id, and export them as metrics.
+    """
+    import asyncio
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from core import tracing
+    from core.config import clear_llm_clients
+    from graph.workflow import build_graph
+    from core.state import initial_state
+
+    def fake_llm(**kwargs):
+        message = AIMessage(content="FINAL RECOMMENDATION: HOLD",
+                            usage_metadata={"input_tokens": 120, "output_tokens": 8, "total_tokens": 128})
+        return GenericFakeChatModel(messages=iter([message] * 10), callbacks=kwargs.get("callbacks"))
+
+    clear_llm_clients()
+    tracing.reset_metrics()
+    with patch("core.config.ChatGoogleGenerativeAI", side_effect=fake_llm), \
+            patch("core.llm_cache.is_enabled", return_value=False), \
+            patch("agents.technical.get_stock_history", return_value=pd.DataFrame()), \
+            patch("agents.fundamental.get_financial_metrics", return_value={}), \
+            patch("agents.risk.get_financial_metrics", return_value={}), \
+            patch("agents.sentiment.search_financial_news", return_value=[]):
+        graph = build_graph(async_mode=True)
+        with tracing.start_trace("test", request_id="req-1"):
+            asyncio.run(graph.ainvoke(initial_state("Analyze TCS", ticker="TCS.NS")))
+    clear_llm_clients()
+
+    trace = tracing.get_trace("req-1")
+    names = [s["name"] for s in trace["spans"]]
+    for node in ("supervisor", "technical_analyst", "fundamental_analyst", "sentiment_analyst", "risk_analyst", "judge"):
+        assert f"node.{node}" in names
+    judge_llm = next(s for s in trace["spans"] if s["name"] == "llm.judge")
+    assert judge_llm["input_tokens"] == 120
+    judge_node = next(s for s in trace["spans"] if s["name"] == "node.judge")
+    assert judge_llm["parent_id"] == judge_node["span_id"]
+
+    text = tracing.render_prometheus()
+    assert 'trade_today_span_duration_seconds_count{kind="node",name="node.judge"} 1' in text
+    assert 'trade_today_llm_tokens_total{name="llm.judge",direction="input"} 120' in text
+
+
+@patch("agents.technical.get_llm")
+@patch("agents.technical.get_stock_history")
+@patch("agents.technical.score_technicals")
+def test_technical_prescoring_skips_llm_for_clear_setups(mock_score, mock_get_stock, mock_get_llm):
+    """With pre-scoring on, a clear-cut setup is answered by the rule engine; otherwise the LLM runs."""
+    from agents.technical import technical_prescoring
+
+    setup_mock_llm(mock_get_llm, "Neutral")
+    mock_get_stock.return_value = pd.DataFrame({"Close": [100.0] * 30})
+    mock_score.return_value = {"signal": "Bullish", "confidence": 0.9, "score": 0.9,
+                               "reasons": ["price 12.0% above SMA50"]}
+    state: TradingState = {"user_query": "Analyze TCS", "ticker": "TCS.NS"}
+
+    with technical_prescoring():
+        res = technical_analyst_node(state)
+    assert res["technical_signal"]["signal"] == "Bullish"
+    assert res["technical_analysis"].endswith("Technical signal: Bullish")
+    mock_get_llm.assert_not_called()
+
+    # Ambiguous setups still go to the LLM
+    mock_score.return_value = {**mock_score.return_value, "confidence": 0.5}
+    with technical_prescoring():
+        res = technical_analyst_node(state)
+    assert res == {"technical_analysis": "Neutral"}
+    mock_get_llm.assert_called_once()
@@ -0,0 +1,23 @@
+from benchmarks.run import run_benchmarks
+
+
+def test_benchmark_harness_runs_offline():
+    """
+    A tiny run of the pipeline and scan suites should complete against the
+    replayed fixtures with no errors and report per-node spans.
+    """
+    report = run_benchmarks(
+        suites=("pipeline", "scan", "prompts"),
+        llm_latency=0.0,
+        data_latency=0.0,
+        search_latency=0.0,
+        iterations=1,
+        scan_sizes=[3],
+    )
+
+    pipeline = report["results"]["pipeline"]
+    assert pipeline["end_to_end"]["n"] == 1
+    assert "node.judge" in pipeline["spans"]
+    assert "yfinance.history" in pipeline["spans"]
+    assert report["results"]["scan"]["3"]["errors"] == 0
+    assert report["results"]["prompts"]["technical"]["token_reduction"] > 0
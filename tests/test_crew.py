@@ -0,0 +1,69 @@
+import time
+from unittest.mock import patch
+
+from crew import portfolio_crew
+
+
+def _slow_analysis(ticker):
+    time.sleep(0.2)
+    return f'{{"ticker": "{ticker}", "recommendation": "FINAL RECOMMENDATION: BUY"}}'
+
+
+@patch("crew.portfolio_crew._run_strategist", return_value="Pick TCS")
+@patch("crew.portfolio_crew._sector_diversity", return_value='{"Technology": ["TCS.NS", "INFY.NS"]}')
+@patch("crew.portfolio_crew._correlation_matrix", return_value="corr-table")
+@patch("crew.portfolio_crew._analyze_stock", side_effect=_slow_analysis)
+def test_hybrid_compare_precomputes_in_parallel(mock_analyze, mock_corr, mock_sector, mock_strategist):
+    """
+    Hybrid mode runs per-ticker analyses concurrently and passes every result
+    to the strategist as context, without the scorer/correlation agents.
+    """
+    tickers = ["TCS.NS", "INFY.NS", "WIPRO.NS"]
+
+    start = time.perf_counter()
+    result = portfolio_crew.run_compare_stocks_crew(tickers, "Which is best?", mode="hybrid")
+    elapsed = time.perf_counter() - start
+
+    assert result == "Pick TCS"
+    assert elapsed < 0.5  # three 0.2s analyses overlapped
+    assert mock_analyze.call_count == 3
+    description = mock_strategist.call_args.kwargs["description"]
+    for ticker in tickers:
+        assert ticker in description
+    assert "corr-table" in description
+    assert "Technology" in description
+    assert "Which is best?" in description
+
+
+@patch("crew.portfolio_crew._run_strategist", return_value="Allocation")
+@patch("crew.portfolio_crew._optimized_allocation", return_value=None)
+@patch("crew.portfolio_crew._sector_diversity", return_value="{}")
+@patch("crew.portfolio_crew._correlation_matrix", return_value="corr")
+@patch("crew.portfolio_crew._portfolio_metrics", return_value="metrics")
+@patch("crew.portfolio_crew._analyze_stock", return_value="analysis")
+def test_hybrid_portfolio_uses_equal_weights_without_holdings(
+    mock_analyze, mock_metrics, mock_corr, mock_sector, mock_optimized, mock_strategist
+):
+    portfolio_crew.run_portfolio_crew(["TCS.NS", "INFY.NS"], "Allocate 5L", mode="hybrid")
+
+    mock_metrics.assert_called_once_with({"TCS.NS": 0.5, "INFY.NS": 0.5})
+    assert "[PORTFOLIO METRICS]" in mock_strategist.call_args.kwargs["description"]
+
+
+@patch("crew.portfolio_crew._run_strategist", return_value="Allocation")
+@patch("crew.portfolio_crew._optimized_allocation", return_value='{"portfolios": {"max_sharpe": {"weights": {"TCS.NS": 0.65}}}}')
+@patch("crew.portfolio_crew._sector_diversity", return_value="{}")
+@patch("crew.portfolio_crew._correlation_matrix", return_value="corr")
+@patch("crew.portfolio_crew._portfolio_metrics", return_value="metrics")
+@patch("crew.portfolio_crew._analyze_stock", return_value="analysis")
+def test_hybrid_portfolio_passes_optimized_weights_to_strategist(
+    mock_analyze, mock_metrics, mock_corr, mock_sector, mock_optimized, mock_strategist
+):
+    """The strategist gets the optimizer's weights and is told to explain them, not invent new ones."""
+    portfolio_crew.run_portfolio_crew(["TCS.NS", "INFY.NS"], "Allocate 5L", mode="hybrid")
+
+    mock_optimized.assert_called_once_with(["TCS.NS", "INFY.NS"])
+    description = mock_strategist.call_args.kwargs["description"]
+    assert "[OPTIMIZED ALLOCATIONS]" in description
+    assert '"TCS.NS": 0.65' in description
+    assert "do not invent different percentages" in description
@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from core.intraday import IntradayMonitor, detect_signals
+from tools.technical_ind import add_all_indicators
+
+
+class FakeFeed:
+    """
+    Serves a growing slice of a fixed 5m-bar series instead of calling Yahoo, in
+    the normalized shape _fetch_stock_history_bulk returns (RangeIndex plus a
+    string Datetime column).
+    """
+
+    def __init__(self, closes):
+        index = pd.date_range("2026-01-05 09:15", periods=len(closes), freq="5min", tz="Asia/Kolkata")
+        self.frame = pd.DataFrame({
+            "Datetime": index.astype(str), "Open": closes, "High": closes, "Low": closes,
+            "Close": closes, "Volume": 1000.0,
+        })
+        self.visible = 0
+
+    def __call__(self, tickers, period, interval):
+        # Like a live "1d" poll, every response starts its index at 0
+        return {t: self.frame.iloc[: self.visible].reset_index(drop=True) for t in tickers}
+
+
+def test_intraday_monitor_updates_incrementally_and_publishes():
+    """
+    Each poll should feed only newly completed bars, match the batch indicators
+    and publish indicator events to subscribers.
+    """
+    rng = np.random.default_rng(3)
+    closes = 100 + rng.normal(0, 1, 120).cumsum()
+    feed = FakeFeed(closes)
+    monitor = IntradayMonitor(["AAA.NS"], fetcher=feed)
+
+    async def run():
+        queue = monitor.subscribe()
+        feed.visible = 80
+        for event in monitor.poll_once():  # warm-up publishes nothing
+            monitor._publish(event)
+        assert queue.empty()
+
+        feed.visible = 90
+        for event in monitor.poll_once():
+            monitor._publish(event)
+        received = []
+        while not queue.empty():
+            received.append(queue.get_nowait())
+        return received
+
+    events = asyncio.run(run())
+    indicator_events = [e for e in events if e["type"] == "indicator"]
+    # Bars 79..88 are new and complete; bar 89 is still forming
+    assert len(indicator_events) == 10
+
+    expected = add_all_indicators(pd.DataFrame({"Close": closes[:89]}))
+    assert abs(indicator_events[-1]["values"]["RSI_14"] - expected["RSI_14"].iloc[-1]) < 1e-3
+    assert abs(indicator_events[-1]["values"]["MACD_Hist"] - expected["MACD_Hist"].iloc[-1]) < 1e-3
+    assert indicator_events[-1]["time"] == "2026-01-05T16:35:00+05:30"
+    latest = monitor.snapshot()["latest"]["AAA.NS"]
+    assert latest["values"]["SMA_50"] is not None
+    assert latest["time"] == indicator_events[-1]["time"]
+
+
+def test_detect_signals_crossings():
+    prev = {"Close": 99.0, "SMA_20": 100.0, "RSI_14": 69.0, "MACD_Hist": -0.1}
+    curr = {"Close": 101.0, "SMA_20": 100.0, "RSI_14": 72.0, "MACD_Hist": 0.2}
+    assert detect_signals(prev, curr) == ["RSI_OVERBOUGHT", "MACD_BULLISH_CROSS", "PRICE_ABOVE_SMA_20"]
+    assert detect_signals({}, curr) == []
+
+
+def test_intraday_stream_ends_when_monitor_stops():
+    """
+    Stopping (or replacing) the monitor ends every subscriber's stream with a
+    final "stopped" event instead of leaving it on keep-alives forever.
+    """
+    feed = FakeFeed(100 + np.arange(120, dtype=float))
+    monitor = IntradayMonitor(["AAA.NS"], poll_seconds=60, fetcher=feed)
+
+    async def run():
+        monitor.start()
+
+        async def consume():
+            return [e async for e in monitor.events(keepalive=0.01)]
+
+        stream = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        received = await asyncio.wait_for(stream, timeout=1)
+        late = [e async for e in monitor.events()]  # subscribing after stop ends at once
+        return received, late
+
+    received, late = asyncio.run(run())
+    assert received[-1] == {"type": "stopped"}
+    assert None in received  # keep-alives while idle
+    assert late == [{"type": "stopped"}]
+    assert monitor.snapshot()["subscribers"] == 0
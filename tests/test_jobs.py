@@ -0,0 +1,85 @@
+import threading
+import time
+from unittest.mock import patch
+
+from core import jobs
+
+
+def _wait_for(job_id, statuses, progress=None, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in statuses and progress in (None, job["progress"]):
+            return job
+        time.sleep(0.01)
+    job = jobs.get_job(job_id)
+    raise AssertionError(f"job {job_id} stuck in {job['status']} ({job['progress']})")
+
+
+def test_jobs_run_on_capped_pool_and_can_be_cancelled():
+    """
+    Jobs beyond JOB_MAX_WORKERS stay queued, a queued job can be cancelled,
+    and finished jobs persist their progress and result.
+    """
+    release = threading.Event()
+
+    def fake_route_query(query, on_progress=None):
+        on_progress("running crew")
+        release.wait(5)
+        return {"intent": "compare_stocks", "tickers": ["TCS.NS", "INFY.NS"], "crew_result": f"done: {query}"}
+
+    with patch.object(jobs.router, "route_query", side_effect=fake_route_query):
+        running = [jobs.submit_job(f"Compare {i}")["id"] for i in range(jobs.JOB_MAX_WORKERS)]
+        for job_id in running:
+            _wait_for(job_id, {jobs.RUNNING}, progress="running crew")
+
+        queued = jobs.submit_job("Compare later")["id"]
+        assert jobs.get_job(queued)["status"] == jobs.QUEUED
+        assert jobs.cancel_job(queued)["status"] == jobs.CANCELLED
+
+        release.set()
+        for job_id in running:
+            job = _wait_for(job_id, jobs.FINISHED_STATUSES)
+            assert job["status"] == jobs.SUCCEEDED
+            assert job["result"]["crew_result"].startswith("done: Compare")
+
+    assert jobs.get_job_stats()["by_status"] == {"cancelled": 1, "succeeded": jobs.JOB_MAX_WORKERS}
+
+
+def test_job_failure_is_recorded():
+    with patch.object(jobs.router, "route_query", side_effect=RuntimeError("quota exhausted")):
+        job_id = jobs.submit_job("Analyze TCS")["id"]
+        job = _wait_for(job_id, jobs.FINISHED_STATUSES)
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == "quota exhausted"
+    assert job["result"] is None
+
+
+def test_recovery_fails_only_jobs_of_dead_workers():
+    """
+    At startup a process fails queued/running jobs whose owner stopped heartbeating,
+    but leaves jobs of other live worker processes alone.
+    """
+    from contextlib import closing
+
+    now = time.time()
+    stale = now - jobs.JOB_OWNER_TIMEOUT_SECONDS - 1
+    with closing(jobs._connect()) as conn, conn:
+        conn.executemany(
+            "INSERT INTO job_workers (owner, heartbeat_at) VALUES (?, ?)",
+            [("live-worker", now), ("dead-worker", stale)],
+        )
+        conn.executemany(
+            "INSERT INTO jobs (id, query, status, created_at, owner) VALUES (?, ?, ?, ?, ?)",
+            [
+                ("live", "Compare A", jobs.RUNNING, now, "live-worker"),
+                ("dead", "Compare B", jobs.RUNNING, now, "dead-worker"),
+                ("gone", "Compare C", jobs.QUEUED, now, "vanished-worker"),
+                ("legacy", "Compare D", jobs.QUEUED, now, None),
+            ],
+        )
+
+    assert jobs._recover_interrupted() == 3
+    assert jobs.get_job("live")["status"] == jobs.RUNNING
+    for job_id in ("dead", "gone", "legacy"):
+        assert jobs.get_job(job_id)["status"] == jobs.FAILED
@@ -0,0 +1,81 @@
+import pytest
+
+
+class QuotaError(Exception):
+    """Stands in for the Gemini SDK's ClientError, which carries the HTTP status code."""
+
+    code = 429
+    status = "RESOURCE_EXHAUSTED"
+
+
+def test_gemini_scheduler_serves_interactive_before_batch():
+    """
+    When the per-minute budget is exhausted, waiting interactive calls should be
+    admitted before batch calls that queued earlier.
+    """
+    import threading
+    import time
+    from core.rate_limit import GeminiScheduler, INTERACTIVE, BATCH
+
+    scheduler = GeminiScheduler(rpm=1, tpm=0, window_seconds=0.2)
+    scheduler.acquire(priority=INTERACTIVE)  # uses the whole budget
+
+    order = []
+    def call(priority, name):
+        scheduler.acquire(priority=priority)
+        order.append(name)
+
+    batch = threading.Thread(target=call, args=(BATCH, "batch"))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=call, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    time.sleep(0.05)
+    assert scheduler.stats()["queue_depth_by_priority"] == {"interactive": 1, "batch": 1}
+
+    batch.join(2)
+    interactive.join(2)
+    assert order == ["interactive", "batch"]
+    assert scheduler.stats()["wait_seconds_max"] > 0
+
+
+def test_call_with_retry_backs_off_on_429(monkeypatch):
+    from core import rate_limit
+
+    monkeypatch.setattr(rate_limit, "GEMINI_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(rate_limit, "_scheduler", rate_limit.GeminiScheduler(rpm=0, tpm=0))
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise QuotaError("quota exceeded")
+        return "ok"
+
+    assert rate_limit.call_with_retry(flaky) == "ok"
+    assert len(attempts) == 3
+    assert rate_limit.get_rate_limit_stats()["throttled"] == 2
+
+    with pytest.raises(ValueError):
+        rate_limit.call_with_retry(lambda: (_ for _ in ()).throw(ValueError("bad request")))
+
+
+def test_is_retryable_checks_status_codes_not_message_text():
+    from core.rate_limit import is_retryable
+
+    assert is_retryable(QuotaError("quota exceeded"))
+    overloaded = RuntimeError("Service unavailable")
+    overloaded.status_code = 503
+    assert is_retryable(overloaded)
+
+    # LangChain re-raises the SDK error; the status code is on the cause
+    try:
+        try:
+            raise QuotaError("quota exceeded")
+        except QuotaError as e:
+            raise RuntimeError("Error calling model") from e
+    except RuntimeError as wrapped:
+        assert is_retryable(wrapped)
+
+    assert not is_retryable(RuntimeError("Order 4290 for 503 shares rejected"))
+    assert not is_retryable(ValueError("RESOURCE_EXHAUSTED in a user message"))
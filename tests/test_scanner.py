@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from core.scanner import scan_tickers
+
+
+class FakeGraph:
+    """Stands in for the compiled LangGraph app; sleeps per ticker instead of calling Gemini."""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def ainvoke(self, state):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.delays[state["ticker"]]
+            if delay is None:
+                raise ValueError("bad ticker")
+            await asyncio.sleep(delay)
+            return {**state, "final_recommendation": "FINAL RECOMMENDATION: BUY"}
+        finally:
+            self.in_flight -= 1
+
+
+def test_scan_tickers_runs_concurrently_with_limit():
+    """
+    Tickers should overlap in time but never exceed max_concurrency.
+    """
+    graph = FakeGraph({f"T{i}.NS": 0.2 for i in range(6)})
+
+    start = time.perf_counter()
+    results = asyncio.run(scan_tickers(list(graph.delays), graph=graph, max_concurrency=3))
+    elapsed = time.perf_counter() - start
+
+    assert [r["ticker"] for r in results] == list(graph.delays)
+    assert all(r["error"] is None for r in results)
+    assert graph.max_in_flight == 3
+    assert elapsed < 0.6  # 2 waves of 0.2s, not 6 serial runs
+
+
+def test_scan_tickers_isolates_slow_and_failing_tickers():
+    """
+    A ticker that times out or raises is reported as an error without affecting the others.
+    """
+    graph = FakeGraph({"SLOW.NS": 5, "BAD.NS": None, "OK.NS": 0.01})
+
+    results = asyncio.run(scan_tickers(["SLOW.NS", "BAD.NS", "OK.NS"], graph=graph, ticker_timeout=0.2))
+    by_ticker = {r["ticker"]: r for r in results}
+
+    assert "timed out" in by_ticker["SLOW.NS"]["error"]
+    assert by_ticker["BAD.NS"]["error"] == "bad ticker"
+    assert by_ticker["OK.NS"]["error"] is None
+    assert by_ticker["OK.NS"]["state"]["ticker"] == "OK.NS"
+
+
+class FakeStreamingGraph:
+    """Replays LangGraph astream() output for stream_mode=["updates", "messages"]."""
+
+    async def astream(self, state, stream_mode=None):
+        from langchain_core.messages import AIMessageChunk
+
+        yield "updates", {"supervisor": {"ticker": "TCS.NS"}}
+        yield "messages", (AIMessageChunk(content="Bullish"), {"langgraph_node": "technical_analyst"})
+        yield "updates", {"technical_analyst": {"technical_analysis": "Bullish"}}
+        yield "messages", (AIMessageChunk(content="FINAL "), {"langgraph_node": "judge"})
+        yield "messages", (AIMessageChunk(content="RECOMMENDATION: BUY"), {"langgraph_node": "judge"})
+        yield "updates", {"judge": {"final_recommendation": "FINAL RECOMMENDATION: BUY"}}
+
+
+def test_astream_analysis_emits_nodes_and_judge_tokens():
+    from core.router import astream_analysis
+
+    async def collect():
+        return [e async for e in astream_analysis({"user_query": "Analyze TCS"}, graph=FakeStreamingGraph())]
+
+    events = asyncio.run(collect())
+
+    assert [e["event"] for e in events] == ["node", "node", "token", "token", "node", "done"]
+    assert [e["content"] for e in events if e["event"] == "token"] == ["FINAL ", "RECOMMENDATION: BUY"]
+    assert events[-1]["state"]["ticker"] == "TCS.NS"
+    assert events[-1]["state"]["final_recommendation"] == "FINAL RECOMMENDATION: BUY"
+
+
+def test_screen_universe_filters_and_ranks_from_local_store():
+    """
+    The first screening stage works purely from stored prices and fundamentals:
+    filters are ANDed, missing values never pass, survivors are ranked and cut to top_k.
+    """
+    import numpy as np
+    import pandas as pd
+    import pytest
+    from core.screener import screen_universe
+    from tools import fundamentals_store, price_store
+
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=120).strftime("%Y-%m-%d")
+    growth = {"UP1.NS": 0.004, "UP2.NS": 0.002, "DOWN.NS": -0.003, "NOPE.NS": 0.003}
+    wiggle = np.tile([1.0, 0.995], 60)
+    for ticker, rate in growth.items():
+        close = 100 * np.exp(rate * np.arange(len(dates))) * wiggle
+        df = pd.DataFrame({"Date": dates, "Open": close, "High": close, "Low": close, "Close": close, "Volume": 1e6})
+        price_store.write_bars(ticker, "1d", df, covered_from="2000-01-01")
+    fundamentals_store.write_metrics("UP1.NS", {"peRatio": 18.0, "sector": "Energy"})
+    fundamentals_store.write_metrics("UP2.NS", {"peRatio": 22.0, "sector": "Energy"})
+    fundamentals_store.write_metrics("DOWN.NS", {"peRatio": 12.0, "sector": "Energy"})
+    # NOPE.NS has no fundamentals, so it can't pass a P/E filter
+
+    result = screen_universe(
+        [{"field": "return_3m", "op": ">", "value": 0}, {"field": "pe", "op": "between", "value": [5, 25]}],
+        tickers=list(growth) + ["MISSING.NS"],
+        sort_by="return_3m",
+        top_k=1,
+        fetch_missing=False,
+    )
+
+    assert result["universe_size"] == 5
+    assert result["screened"] == 4  # MISSING.NS has no stored prices
+    assert result["passed"] == 2
+    assert [c["ticker"] for c in result["candidates"]] == ["UP1.NS"]
+    assert result["candidates"][0]["pe"] == 18.0
+
+    with pytest.raises(ValueError):
+        screen_universe([{"field": "nope", "op": "<", "value": 1}], tickers=["UP1.NS"], fetch_missing=False)
+    for bad in (
+        {"field": "pe", "op": "<", "value": "abc"},
+        {"field": "rsi_14", "op": "between", "value": ["a", 3]},
+        {"field": "sector", "op": ">", "value": "Energy"},
+        {"field": "sector", "op": "in", "value": ["Energy", 1]},
+    ):
+        with pytest.raises(ValueError):
+            screen_universe([bad], tickers=["UP1.NS"], fetch_missing=False)
@@ -85,3 +85,408 @@ def test_search_financial_news():
         assert "snippet" in first_item
 
 
+
+# --- Tests for the market data cache ---
+
+def test_financial_metrics_are_cached():
+    """
+    Repeated lookups for the same ticker should only hit yfinance once.
+    """
+    from unittest.mock import patch
+    from tools import market_data
+
+    market_data.clear_cache()
+    with patch("tools.market_data._fetch_financial_metrics", return_value={"marketCap": 1}) as mock_fetch:
+        first = get_financial_metrics("CACHE.NS")
+        first["marketCap"] = 999  # callers get a copy, the cache must not change
+        second = get_financial_metrics("CACHE.NS")
+
+    assert mock_fetch.call_count == 1
+    assert second["marketCap"] == 1
+    market_data.clear_cache()
+
+
+def test_empty_history_is_not_cached():
+    """
+    Failed/empty fetches should be retried instead of being cached.
+    """
+    from unittest.mock import patch
+    from tools import market_data
+
+    market_data.clear_cache()
+    with patch("tools.market_data._fetch_stock_history", return_value=pd.DataFrame()) as mock_fetch:
+        get_stock_history("EMPTY.NS")
+        get_stock_history("EMPTY.NS")
+
+    assert mock_fetch.call_count == 2
+
+
+def test_ttl_cache_shares_inflight_fetch_and_evicts():
+    """
+    Concurrent misses on one key share a single loader call; the LRU bound evicts old keys.
+    """
+    import threading
+    from tools.cache import TTLCache
+
+    cache = TTLCache(maxsize=2, ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch("k", loader))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert stats["shared_fetches"] == 4
+
+
+def _fake_bulk_download(tickers, **kwargs):
+    """Build a frame shaped like yf.download(group_by='ticker') for the requested tickers."""
+    index = pd.date_range("2024-01-01", periods=40, freq="D", tz="Asia/Kolkata", name="Date")
+    rng = np.random.default_rng(7)
+    parts = {}
+    for ticker in tickers:
+        close = 100 + rng.normal(0, 1, len(index)).cumsum()
+        parts[ticker] = pd.DataFrame(
+            {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": 1000},
+            index=index,
+        )
+    return pd.concat(parts, axis=1)
+
+
+def test_get_stock_history_bulk_uses_one_download_and_fills_cache():
+    """
+    The bulk path should download all tickers in one call, return an aligned wide
+    Close frame, and leave per-ticker histories in the cache.
+    """
+    from unittest.mock import patch
+    from tools import market_data
+    from tools.market_data import get_stock_history_bulk
+    from tools.correlation import calculate_correlation_matrix, calculate_portfolio_metrics
+
+    market_data.clear_cache()
+    tickers = ["AAA.NS", "BBB.NS", "CCC.NS"]
+    with patch("tools.market_data.yf.download", side_effect=_fake_bulk_download) as mock_download, \
+            patch("tools.market_data._fetch_stock_history") as mock_single:
+        closes = get_stock_history_bulk(tickers)
+        corr = calculate_correlation_matrix(tickers)
+        metrics = calculate_portfolio_metrics({"AAA.NS": 0.5, "BBB.NS": 0.3, "CCC.NS": 0.2})
+        single = get_stock_history("AAA.NS")
+
+    assert mock_download.call_count == 1
+    mock_single.assert_not_called()
+    assert list(closes.columns) == tickers
+    assert len(closes) == 40
+    assert corr.shape == (3, 3)
+    assert set(metrics["individual_annual_returns"]) == set(tickers)
+    assert list(single.columns) == ["Date", "Open", "High", "Low", "Close", "Volume"]
+    assert single["Close"].tolist() == closes["AAA.NS"].tolist()
+
+    returns = get_stock_history_bulk(tickers, returns=True)
+    assert len(returns) == 39
+    market_data.clear_cache()
+
+
+def test_returns_matrix_appends_in_place_and_matches_pandas(tmp_path):
+    """
+    Daily updates append to the memory-mapped matrix without reallocating, and
+    subset/window covariance equals pandas on the same complete-case rows.
+    """
+    from tools.returns_matrix import ReturnsMatrix
+
+    rng = np.random.default_rng(7)
+    dates = pd.date_range("2024-01-01", periods=60, freq="D").strftime("%Y-%m-%d")
+    returns = pd.DataFrame(rng.normal(0, 0.01, (60, 4)), index=dates, columns=["A", "B", "C", "D"])
+    returns.iloc[5, 1] = np.nan
+
+    matrix = ReturnsMatrix(str(tmp_path), dtype="float64")
+    matrix.update(returns.iloc[:50])
+    capacity = matrix.stats()["capacity"]
+    assert matrix.update(returns.iloc[50:]) == {"tickers_added": 0, "dates_added": 10}
+    assert matrix.stats()["capacity"] == capacity
+
+    reopened = ReturnsMatrix(str(tmp_path))
+    window = returns.loc["2024-01-03":"2024-02-20", ["C", "B"]].dropna()
+    cov = reopened.cov(["C", "B"], start="2024-01-03", end="2024-02-20")
+    assert list(cov.columns) == ["C", "B"]
+    np.testing.assert_allclose(cov.to_numpy(), window.cov().to_numpy())
+    np.testing.assert_allclose(reopened.corr(["C", "B"]).to_numpy(), returns[["C", "B"]].dropna().corr().to_numpy())
+
+    reopened.cov(["B", "C"], start="2024-01-03", end="2024-02-20")
+    assert reopened.stats()["cache"]["hits"] >= 1
+
+
+def test_optimize_weights_respects_caps_and_beats_alternatives():
+    """
+    Every method returns long-only, fully invested weights within the per-stock
+    and sector caps; min-variance and max-Sharpe beat nearby feasible portfolios
+    and risk parity equalizes risk contributions.
+    """
+    from tools.optimizer import METHODS, optimize_weights
+
+    rng = np.random.default_rng(1)
+    n = 12
+    daily = rng.normal(0, 0.01, (250, n)) + rng.normal(0, 0.01, (250, 1)) * rng.uniform(0.5, 1.5, n)
+    cov = np.cov(daily.T) * 252
+    mu = rng.normal(0.12, 0.1, n)
+    sectors = ["IT"] * 6 + ["Banks"] * 4 + ["Pharma"] * 2
+    in_it = np.array(sectors) == "IT"
+
+    weights = {}
+    for method in METHODS:
+        w = optimize_weights(mu, cov, method, max_weight=0.2, sectors=sectors, sector_cap=0.4)
+        assert abs(w.sum() - 1) < 1e-9 and w.min() >= 0
+        if method != "risk_parity":
+            assert w.max() <= 0.2 + 1e-9 and w[in_it].sum() <= 0.4 + 1e-9
+        weights[method] = w
+
+    def sharpe(w):
+        return mu @ w / np.sqrt(w @ cov @ w)
+
+    for _ in range(200):
+        other = rng.dirichlet(np.full(n, 5.0))
+        if other.max() <= 0.2 and other[in_it].sum() <= 0.4:
+            assert weights["min_variance"] @ cov @ weights["min_variance"] <= other @ cov @ other
+            assert sharpe(weights["max_sharpe"]) >= sharpe(other)
+    contributions = weights["risk_parity"] * (cov @ weights["risk_parity"])
+    assert contributions.max() / contributions.min() < 1 + 1e-6
+
+
+# --- Tests for tools/price_store.py ---
+
+def _history_frame(start: str, periods: int) -> pd.DataFrame:
+    dates = pd.date_range(start, periods=periods, freq="D", tz="Asia/Kolkata")
+    close = np.arange(periods, dtype=float) + 100
+    return pd.DataFrame({
+        "Date": dates.astype(str), "Open": close, "High": close, "Low": close, "Close": close, "Volume": 10.0,
+    })
+
+
+def test_price_store_fetches_only_missing_bars():
+    """
+    The first call downloads the whole period; once stale, only bars since the last
+    completed stored bar are fetched and appended, and the full history is read back locally.
+    """
+    from unittest.mock import patch
+    from tools import market_data, price_store
+
+    market_data.clear_cache()
+    today = pd.Timestamp.now().normalize()
+    first = _history_frame((today - pd.Timedelta(days=59)).strftime("%Y-%m-%d"), 58)
+    # Re-fetched from the bar before the last stored one: same closes where they overlap
+    recent = _history_frame((today - pd.Timedelta(days=3)).strftime("%Y-%m-%d"), 4)
+    recent[["Open", "High", "Low", "Close"]] += 56
+
+    with patch("tools.market_data._fetch_stock_history", return_value=first) as mock_fetch:
+        df = get_stock_history("STORE.NS", period="1mo")
+        assert mock_fetch.call_count == 1
+        assert len(df) == 58
+
+        market_data.clear_cache()
+        df = get_stock_history("STORE.NS", period="1mo")
+        assert mock_fetch.call_count == 1  # fresh store: local read only
+        in_period = int((first["Date"].str[:10] >= price_store.period_start("1mo")).sum())
+        assert len(df) == in_period  # sliced to the requested period
+
+    market_data.clear_cache()
+    with patch("tools.market_data._fetch_stock_history", return_value=recent) as mock_fetch, \
+            patch.object(price_store, "PRICE_STORE_REFRESH_SECONDS", -1):
+        df = get_stock_history("STORE.NS", period="1mo")
+
+    mock_fetch.assert_called_once_with("STORE.NS", interval="1d", start=first["Date"].iloc[-2][:10])
+    assert len(df) == in_period + 2  # two new bars appended, the overlapping ones replaced
+    assert df["Date"].is_monotonic_increasing
+    assert price_store.stats() == {"series": 1, "bars": 60}
+
+    assert price_store.compact(retain_days=10)["expired_bars"] > 0
+    assert price_store.get_meta("STORE.NS", "1d")["covered_from"] > first["Date"].iloc[0][:10]
+    market_data.clear_cache()
+
+
+def test_price_store_refresh_skips_failures_and_refetches_rebased_history():
+    """
+    An empty refresh leaves the series stale instead of marking it fresh, and a
+    changed close on the overlapping bar (split/dividend re-adjustment) replaces
+    the whole covered range instead of appending to it.
+    """
+    from unittest.mock import patch
+    from tools import market_data, price_store
+
+    market_data.clear_cache()
+    today = pd.Timestamp.now().normalize()
+    first = _history_frame((today - pd.Timedelta(days=40)).strftime("%Y-%m-%d"), 39)
+    with patch("tools.market_data._fetch_stock_history", return_value=first):
+        get_stock_history("SPLIT.NS", period="1mo")
+    updated_at = price_store.get_meta("SPLIT.NS", "1d")["updated_at"]
+
+    market_data.clear_cache()
+    with patch("tools.market_data._fetch_stock_history", return_value=pd.DataFrame()), \
+            patch.object(price_store, "PRICE_STORE_REFRESH_SECONDS", -1):
+        df = get_stock_history("SPLIT.NS", period="1mo")
+    assert len(df) > 0
+    assert price_store.get_meta("SPLIT.NS", "1d")["updated_at"] == updated_at
+
+    # After a 1:2 split every adjusted close halves, including the overlapping bar
+    rebased = _history_frame((today - pd.Timedelta(days=40)).strftime("%Y-%m-%d"), 40)
+    rebased[["Open", "High", "Low", "Close"]] /= 2
+    delta = rebased.tail(3).reset_index(drop=True)
+    covered_from = price_store.get_meta("SPLIT.NS", "1d")["covered_from"]
+
+    market_data.clear_cache()
+    with patch("tools.market_data._fetch_stock_history", side_effect=[delta, rebased]) as mock_fetch, \
+            patch.object(price_store, "PRICE_STORE_REFRESH_SECONDS", -1):
+        df = get_stock_history("SPLIT.NS", period="1mo")
+
+    assert mock_fetch.call_args_list[-1].kwargs == {"interval": "1d", "start": covered_from}
+    stored = price_store.read_bars("SPLIT.NS", "1d")
+    assert len(stored) == 40
+    assert stored["Close"].tolist() == rebased["Close"].tolist()
+    market_data.clear_cache()
+
+
+def test_indicator_panel_matches_per_ticker_indicators():
+    """
+    The vectorized panel engine should reproduce add_all_indicators() for every
+    ticker, including one with a shorter history.
+    """
+    from tools.technical_ind import compute_indicator_panel, latest_indicator_snapshot, PANEL_INDICATORS
+
+    rng = np.random.default_rng(3)
+    close = pd.DataFrame(100 + rng.normal(0, 1, (120, 4)).cumsum(axis=0), columns=["A", "B", "C", "D"])
+    close.iloc[:30, 2] = np.nan  # C listed later
+
+    panel = compute_indicator_panel(close)
+
+    for ticker in close.columns:
+        expected = add_all_indicators(pd.DataFrame({"Close": close[ticker].dropna()}))
+        for name in PANEL_INDICATORS:
+            np.testing.assert_allclose(
+                panel[name][ticker].loc[expected.index], expected[name], rtol=1e-10, equal_nan=True
+            )
+
+    snapshot = latest_indicator_snapshot(close)
+    assert list(snapshot.index) == ["A", "B", "C", "D"]
+    assert snapshot.loc["C", "RSI_14"] == pytest.approx(panel["RSI_14"]["C"].iloc[-1])
+
+
+def test_scan_indicator_universe_prefetches_next_chunk():
+    """
+    While the caller screens one chunk, the next chunk's download is already running.
+    """
+    import threading
+    from unittest.mock import patch
+    from tools.technical_ind import scan_indicator_universe
+
+    rng = np.random.default_rng(5)
+    started = []
+    second_started = threading.Event()
+
+    def fake_bulk(tickers, **kwargs):
+        started.append(list(tickers))
+        if len(started) == 2:
+            second_started.set()
+        return pd.DataFrame(100 + rng.normal(0, 1, (80, len(tickers))).cumsum(axis=0), columns=tickers)
+
+    with patch("tools.market_data.get_stock_history_bulk", side_effect=fake_bulk):
+        scan = scan_indicator_universe(["A", "B", "C", "D", "E"], chunk_size=2)
+        first = next(scan)
+        assert second_started.wait(2)  # fetched before the first chunk was consumed
+        rest = list(scan)
+
+    assert started == [["A", "B"], ["C", "D"], ["E"]]
+    assert [list(s.index) for s in [first] + rest] == [["A", "B"], ["C", "D"], ["E"]]
+
+
+def test_incremental_indicators_match_batch_and_survive_serialization():
+    """
+    Feeding bars one at a time (with a JSON round-trip halfway) should give the
+    same values as add_all_indicators() over the full history.
+    """
+    import json
+    from tools.technical_ind import IncrementalIndicators, PANEL_INDICATORS
+
+    rng = np.random.default_rng(11)
+    closes = 100 + rng.normal(0, 1, 150).cumsum()
+    expected = add_all_indicators(pd.DataFrame({"Close": closes}))
+
+    state = IncrementalIndicators.from_history(closes[:80])
+    state = IncrementalIndicators.from_dict(json.loads(json.dumps(state.to_dict())))
+    rows = [state.update(x) for x in closes[80:]]
+
+    for name in PANEL_INDICATORS:
+        np.testing.assert_allclose(
+            [row[name] for row in rows], expected[name].iloc[80:], rtol=1e-9, equal_nan=True
+        )
+
+
+def test_summarize_indicators_fits_token_budget():
+    """The compact technical payload keeps derived features and trims the table to the budget."""
+    from tools.technical_ind import add_all_indicators, estimate_tokens, summarize_indicators
+
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "Date": pd.date_range("2025-01-01", periods=80, freq="B").astype(str),
+        "Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 80))),
+        "Volume": rng.integers(1_000_000, 5_000_000, 80),
+    })
+    df_ind = add_all_indicators(df)
+
+    full = summarize_indicators(df_ind, "TEST.NS", max_tokens=10_000)
+    assert "RSI14" in full and "MACD" in full and "volume z20" in full
+    assert len(full.splitlines()) == 19  # 8 feature lines + header + 10 rows
+    assert estimate_tokens(full) < estimate_tokens(df_ind.tail(10).to_json(orient="records")) / 2
+
+    tight = summarize_indicators(df_ind, "TEST.NS", max_tokens=200)
+    assert estimate_tokens(tight) <= 200
+    assert "RSI14" in tight
+
+    from tools.market_data import summarize_financial_metrics
+    metrics = {"marketCap": 1.5e12, "peRatio": 22.04, "returnOnEquity": 0.171, "beta": None, "sector": "Energy"}
+    assert summarize_financial_metrics(metrics) == "sector Energy | mcap 1.50T | PE 22.0 | ROE 17.1%"
+    assert summarize_financial_metrics(metrics, max_tokens=6) == "sector Energy"
+    odd = {**metrics, "peRatio": "Infinity", "forwardPE": float("inf"), "eps": "n/a", "beta": "1.25"}
+    assert summarize_financial_metrics(odd) == "sector Energy | mcap 1.50T | ROE 17.1% | beta 1.25"
+
+
+def test_score_technicals_separates_clear_and_conflicting_setups():
+    from tools.technical_ind import score_technicals
+
+    # Strong uptrend: price far above SMA 50 and every mild rule agrees
+    rally = pd.DataFrame({
+        "Close": [100.0, 112.0],
+        "SMA_20": [98.0, 105.0],
+        "SMA_50": [95.0, 100.0],
+        "RSI_14": [60.0, 65.0],
+        "MACD_Hist": [0.8, 1.0],
+    })
+    scored = score_technicals(rally)
+    assert scored["signal"] == "Bullish"
+    assert scored["confidence"] >= 0.75
+
+    # Same trend but deeply overbought: strong votes disagree, so never clear-cut
+    conflicted = score_technicals(rally.assign(RSI_14=[60.0, 90.0]))
+    assert conflicted["confidence"] <= 0.5
+    assert any("overbought" in r for r in conflicted["reasons"])
+
+    # A MACD cross on the last bar is a strong vote on its own
+    crossed = score_technicals(rally.assign(Close=[100.0, 101.0], MACD_Hist=[-0.5, 0.4]))
+    assert "fresh bullish MACD cross 0 bars ago" in crossed["reasons"]
+
+    assert score_technicals(pd.DataFrame())["signal"] == "Neutral"
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any
-from tools.market_data import get_stock_history
+from typing import List, Dict, Any, Optional
+from tools.market_data import get_stock_history_bulk
+from tools.price_store import period_start
+from tools.returns_matrix import get_returns_matrix, is_fresh
 
 
 def calculate_correlation_matrix(
@@ -11,16 +13,12 @@ def calculate_correlation_matrix(
     Fetch closing prices for multiple tickers and return their correlation matrix.
     Returns an empty DataFrame if fewer than 2 tickers have valid data.
     """
-    close_prices = {}
-    for ticker in tickers:
-        df = get_stock_history(ticker, period=period)
-        if not df.empty and "Close" in df.columns:
-            close_prices[ticker] = df.set_index("Date")["Close"]
+    close_prices = get_stock_history_bulk(tickers, period=period)
 
-    if len(close_prices) < 2:
+    if close_prices.shape[1] < 2:
         return pd.DataFrame()
 
-    combined = pd.DataFrame(close_prices).dropna()
+    combined = close_prices.dropna()
     return combined.corr()
 
 
@@ -39,23 +37,29 @@ def calculate_portfolio_metrics(
         portfolio return, portfolio volatility, and Sharpe ratio.
     """
     tickers = list(holdings.keys())
-    weights = np.array([holdings[t] for t in tickers])
-
-    returns_dict = {}
-    for ticker in tickers:
-        df = get_stock_history(ticker, period=period)
-        if not df.empty and "Close" in df.columns:
-            close = df.set_index("Date")["Close"]
-            returns_dict[ticker] = close.pct_change().dropna()
-
-    if len(returns_dict) < 2:
-        return {}
-
-    returns_df = pd.DataFrame(returns_dict).dropna()
-    cov_matrix = returns_df.cov() * 252  # annualized covariance
-    corr_matrix = returns_df.corr()
-
-    mean_returns = returns_df.mean() * 252  # annualized returns
+    moments = _matrix_moments(tickers, period)
+    if moments is not None:
+        columns = moments["tickers"]
+        mean_daily = pd.Series(moments["mean"], index=columns)
+        std_daily = pd.Series(moments["std"], index=columns)
+        cov_matrix = pd.DataFrame(moments["cov"], index=columns, columns=columns) * 252
+        corr_matrix = pd.DataFrame(moments["corr"], index=columns, columns=columns)
+    else:
+        returns_df = get_stock_history_bulk(tickers, period=period, returns=True)
+
+        if returns_df.shape[1] < 2:
+            return {}
+
+        returns_df = returns_df.dropna()
+        columns = list(returns_df.columns)
+        mean_daily = returns_df.mean()
+        std_daily = returns_df.std()
+        cov_matrix = returns_df.cov() * 252  # annualized covariance
+        corr_matrix = returns_df.corr()
+
+    # Weights follow the tickers that actually returned data
+    weights = np.array([holdings[t] for t in columns])
+    mean_returns = mean_daily * 252  # annualized returns
     portfolio_return = float(np.dot(weights, mean_returns))
     portfolio_volatility = float(
         np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
@@ -66,7 +70,7 @@ def calculate_portfolio_metrics(
 
     return {
         "individual_annual_returns": mean_returns.to_dict(),
-        "individual_annual_volatility": (returns_df.std() * np.sqrt(252)).to_dict(),
+        "individual_annual_volatility": (std_daily * np.sqrt(252)).to_dict(),
         "correlation_matrix": corr_matrix.to_dict(),
         "portfolio_annual_return": round(portfolio_return, 4),
         "portfolio_annual_volatility": round(portfolio_volatility, 4),
@@ -74,6 +78,19 @@ def calculate_portfolio_metrics(
     }
 
 
+def _matrix_moments(tickers: List[str], period: str) -> Optional[Dict[str, Any]]:
+    """
+    Daily return moments for `tickers` from the memory-mapped returns matrix, or
+    None when it doesn't hold all of them, is stale, or the window is too short
+    (callers then fetch returns instead).
+    """
+    matrix = get_returns_matrix()
+    if len(tickers) < 2 or not is_fresh(matrix, tickers):
+        return None
+    moments = matrix.moments(tickers, start=period_start(period))
+    return moments if moments["cov"] is not None else None
+
+
 def get_sector_diversity(tickers: List[str]) -> Dict[str, List[str]]:
     """
     Group tickers by their sector using yfinance data.
@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from core.db import connect
+
+# Fundamentals change quarterly; stored metrics are trusted for this long
+# before get_financial_metrics() fetches them again.
+FUNDAMENTALS_STORE_TTL = float(os.getenv("FUNDAMENTALS_STORE_TTL", str(24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fundamentals (
+    ticker TEXT PRIMARY KEY,
+    metrics TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_schema_ready = set()
+
+# SQLite caps the number of bound parameters per statement
+_IN_CHUNK = 500
+
+
+def _connect():
+    conn = connect()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def is_enabled() -> bool:
+    """Fundamentals are persisted alongside prices (PRICE_STORE_ENABLED=0 bypasses both)."""
+    return os.getenv("PRICE_STORE_ENABLED", "1") != "0"
+
+
+def read_metrics(tickers: List[str], max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """Stored metrics updated within `max_age` seconds (default FUNDAMENTALS_STORE_TTL), by ticker."""
+    max_age = FUNDAMENTALS_STORE_TTL if max_age is None else max_age
+    cutoff = time.time() - max_age
+    found: Dict[str, Dict[str, Any]] = {}
+    tickers = list(dict.fromkeys(tickers))
+    with closing(_connect()) as conn:
+        for i in range(0, len(tickers), _IN_CHUNK):
+            chunk = tickers[i:i + _IN_CHUNK]
+            rows = conn.execute(
+                f"SELECT ticker, metrics FROM fundamentals "
+                f"WHERE updated_at >= ? AND ticker IN ({', '.join('?' * len(chunk))})",
+                (cutoff, *chunk),
+            ).fetchall()
+            found.update((ticker, json.loads(metrics)) for ticker, metrics in rows)
+    return found
+
+
+def write_metrics(ticker: str, metrics: Dict[str, Any]) -> None:
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO fundamentals (ticker, metrics, updated_at) VALUES (?, ?, ?)",
+            (ticker, json.dumps(metrics, default=str), time.time()),
+        )
@@ -1,32 +1,454 @@
+import math
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from core.tracing import span, traced
+from tools import fundamentals_store, price_store
+from tools.cache import TTLCache
+from tools.technical_ind import estimate_tokens
+
+# Process-wide caches so that one analysis (technical, fundamental, risk and the
+# crew's sector lookup) shares a single yfinance round-trip per ticker.
+_history_cache = TTLCache(
+    maxsize=int(os.getenv("MARKET_DATA_HISTORY_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("MARKET_DATA_HISTORY_TTL", "300")),
+    name="stock_history",
+)
+_metrics_cache = TTLCache(
+    maxsize=int(os.getenv("MARKET_DATA_METRICS_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MARKET_DATA_METRICS_TTL", "900")),
+    name="financial_metrics",
+)
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss/eviction counters for the market data caches."""
+    return {
+        "stock_history": _history_cache.stats(),
+        "financial_metrics": _metrics_cache.stats(),
+    }
+
+
+def clear_cache() -> None:
+    """Drop all cached market data (counters are kept)."""
+    _history_cache.clear()
+    _metrics_cache.clear()
+
 
 def get_stock_history(ticker: str, period: str = "6mo", interval: str = "1d") -> pd.DataFrame:
     """
     Fetches historical OHLCV data for a given ticker.
     Supports Indian stocks if suffixed with .NS (NSE) or .BO (BSE).
+    Results are cached per (ticker, period, interval); callers get their own copy.
+    Daily bars are served from the local price store, which only fetches the bars it is missing.
     """
+    with span("market_data.stock_history", kind="tool", ticker=ticker) as s:
+        loaded = []
+        df = _history_cache.get_or_fetch(
+            (ticker, period, interval),
+            lambda: loaded.append(True) or _load_stock_history(ticker, period, interval),
+            should_cache=lambda d: not d.empty,
+        )
+        s.set(cache_hit=not loaded, rows=len(df))
+    return df.copy()
+
+
+def _normalize_history(df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten a yfinance OHLCV frame into the tabular Date/Open/High/Low/Close/Volume layout."""
+    # Reset index to make strictly tabular
+    df = df.reset_index()
+    # Convert timezone-aware datetime to string if exists
+    if "Date" in df.columns or "Datetime" in df.columns:
+        date_col = "Date" if "Date" in df.columns else "Datetime"
+        df[date_col] = df[date_col].astype(str)
+    return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']] if 'Date' in df.columns else df[['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+def _refresh_anchor(ticker: str, interval: str) -> pd.Series:
+    """
+    The stored bar an incremental refresh starts from: the one before the last,
+    since the last may have been stored while still forming. Its close is
+    compared with the re-fetched one to detect a re-based adjusted history.
+    """
+    return price_store.last_bars(ticker, interval, 2).iloc[0]
+
+
+def _apply_refresh(
+    ticker: str, interval: str, meta: Dict[str, Any], anchor: pd.Series, delta: pd.DataFrame
+) -> int:
+    """
+    Store the bars of an incremental refresh. Nothing is written for an empty
+    download, so a failed refresh leaves the series stale and is retried. If the
+    anchor bar's adjusted close moved (a split or dividend since it was stored),
+    appending would mix adjustment bases, so the whole covered range is
+    re-fetched and replaces the stored series.
+    """
+    if delta.empty:
+        return 0
+    overlap = delta.loc[delta[delta.columns[0]] == anchor["Date"], "Close"]
+    if not overlap.empty and not math.isclose(float(overlap.iloc[0]), float(anchor["Close"]), rel_tol=1e-6):
+        covered_from = meta["covered_from"]
+        if covered_from:
+            full = _fetch_stock_history(ticker, interval=interval, start=covered_from)
+        else:
+            full = _fetch_stock_history(ticker, "max", interval)
+        if full.empty:
+            return 0
+        return price_store.write_bars(ticker, interval, full, covered_from=covered_from, replace=True)
+    return price_store.write_bars(ticker, interval, delta)
+
+
+def _load_stock_history(ticker: str, period: str = "6mo", interval: str = "1d") -> pd.DataFrame:
+    """Read history from the local price store, downloading only the missing date range."""
+    if not price_store.is_enabled(interval):
+        return _fetch_stock_history(ticker, period, interval)
+
+    try:
+        start = price_store.period_start(period)
+        meta = price_store.get_meta(ticker, interval)
+        if not price_store.covers(meta, start):
+            # Nothing stored yet (or not far enough back): fetch the whole period once
+            df = _fetch_stock_history(ticker, period, interval)
+            if not df.empty:
+                price_store.write_bars(ticker, interval, df, covered_from=start or "")
+            return df
+
+        if price_store.is_stale(meta):
+            anchor = _refresh_anchor(ticker, interval)
+            delta = _fetch_stock_history(ticker, interval=interval, start=anchor["Date"][:10])
+            _apply_refresh(ticker, interval, meta, anchor, delta)
+        return price_store.read_bars(ticker, interval, start)
+    except sqlite3.Error as e:
+        print(f"Price store unavailable for {ticker}, fetching directly: {e}")
+        return _fetch_stock_history(ticker, period, interval)
+
+
+@traced("yfinance.history", kind="io")
+def _fetch_stock_history(
+    ticker: str, period: str = "6mo", interval: str = "1d", start: Optional[str] = None
+) -> pd.DataFrame:
     try:
         stock = yf.Ticker(ticker)
-        df = stock.history(period=period, interval=interval)
+        if start:
+            df = stock.history(start=start, interval=interval)
+        else:
+            df = stock.history(period=period, interval=interval)
         if df.empty:
             return pd.DataFrame()
-        # Reset index to make strictly tabular
-        df = df.reset_index()
-        # Convert timezone-aware datetime to string if exists
-        if "Date" in df.columns or "Datetime" in df.columns:
-            date_col = "Date" if "Date" in df.columns else "Datetime"
-            df[date_col] = df[date_col].astype(str)
-        return df[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']] if 'Date' in df.columns else df[['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume']]
+        return _normalize_history(df)
     except Exception as e:
         print(f"Error fetching history for {ticker}: {e}")
         return pd.DataFrame()
 
+
+@traced("yfinance.download", kind="io")
+def _fetch_stock_history_bulk(
+    tickers: List[str], period: str = "6mo", interval: str = "1d", start: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """Download OHLCV for many tickers in one batched request. Returns {ticker: normalized frame}."""
+    range_kwargs = {"start": start} if start else {"period": period}
+    try:
+        raw = yf.download(
+            tickers,
+            interval=interval,
+            **range_kwargs,
+            group_by="ticker",
+            auto_adjust=True,
+            ignore_tz=False,  # keep the same timestamps as Ticker.history()
+            threads=True,
+            progress=False,
+        )
+    except Exception as e:
+        print(f"Error bulk fetching history for {', '.join(tickers)}: {e}")
+        return {}
+
+    if raw is None or raw.empty:
+        return {}
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for ticker in tickers:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if ticker not in raw.columns.get_level_values(0):
+                continue
+            df = raw[ticker]
+        else:
+            df = raw
+        df = df.dropna(how="all")
+        if df.empty:
+            continue
+        frames[ticker] = _normalize_history(df)
+    return frames
+
+
+def _read_fresh_from_store(
+    ticker: str, interval: str, start: Optional[str], allow_stale: bool = False
+) -> Optional[pd.DataFrame]:
+    """Stored bars if the store covers `start` and is fresh (or allow_stale), else None."""
+    try:
+        meta = price_store.get_meta(ticker, interval)
+        if price_store.covers(meta, start) and (allow_stale or not price_store.is_stale(meta)):
+            return price_store.read_bars(ticker, interval, start)
+    except sqlite3.Error as e:
+        print(f"Price store unavailable for {ticker}: {e}")
+    return None
+
+
+def _write_to_store(ticker: str, interval: str, df: pd.DataFrame, covered_from: Optional[str] = None) -> None:
+    if not price_store.is_enabled(interval):
+        return
+    try:
+        price_store.write_bars(ticker, interval, df, covered_from=covered_from)
+    except sqlite3.Error as e:
+        print(f"Could not write {ticker} to the price store: {e}")
+
+
+def warm_price_store(tickers: List[str], period: str = "1y", interval: str = "1d") -> Dict[str, Any]:
+    """
+    Pre-load the local price store for a whole watchlist, e.g. before market open.
+    Tickers with no (or too short) history are downloaded for the full period in one
+    batch; tickers already stored only fetch the bars since their last stored bar.
+    """
+    start = price_store.period_start(period)
+    full, stale, fresh = [], [], []
+    for ticker in dict.fromkeys(tickers):
+        meta = price_store.get_meta(ticker, interval)
+        if not price_store.covers(meta, start):
+            full.append(ticker)
+        elif price_store.is_stale(meta):
+            stale.append((ticker, meta, _refresh_anchor(ticker, interval)))
+        else:
+            fresh.append(ticker)
+
+    written: Dict[str, int] = {}
+    if full:
+        for ticker, df in _fetch_stock_history_bulk(full, period, interval).items():
+            written[ticker] = price_store.write_bars(ticker, interval, df, covered_from=start or "")
+    if stale:
+        since = min(anchor["Date"][:10] for _, _, anchor in stale)
+        fetched = _fetch_stock_history_bulk([t for t, _, _ in stale], interval=interval, start=since)
+        for ticker, meta, anchor in stale:
+            delta = fetched.get(ticker, pd.DataFrame())
+            written[ticker] = _apply_refresh(ticker, interval, meta, anchor, delta)
+
+    return {
+        "downloaded": full,
+        "updated": [t for t, _, _ in stale],
+        "already_fresh": fresh,
+        "failed": [t for t in full if t not in written],
+        "bars_written": sum(written.values()),
+    }
+
+
+def get_stock_history_bulk(
+    tickers: List[str],
+    period: str = "6mo",
+    interval: str = "1d",
+    returns: bool = False,
+    fetch_missing: bool = True,
+) -> pd.DataFrame:
+    """
+    Fetches closing prices for many tickers as one aligned wide frame
+    (index: Date, one column per ticker with data).
+
+    Tickers already in the history cache or fresh in the local price store are
+    served from there; the rest are pulled in a single batched yfinance download
+    and added to both, so later get_stock_history() calls for the same period are free.
+
+    Args:
+        tickers: Tickers to fetch (duplicates are ignored)
+        period / interval: Same meaning as get_stock_history()
+        returns: If True, return per-ticker simple returns instead of prices.
+            Returns are computed per ticker before alignment, so a missing bar
+            in one ticker doesn't create a gap in the others.
+        fetch_missing: If False, nothing is downloaded: stale stored bars are used as-is
+            and tickers not cached or stored are left out.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    frames: Dict[str, pd.DataFrame] = {}
+    missing = []
+    for ticker in tickers:
+        cached = _history_cache.get((ticker, period, interval))
+        if cached is not None:
+            frames[ticker] = cached
+        else:
+            missing.append(ticker)
+
+    if missing and price_store.is_enabled(interval):
+        start = price_store.period_start(period)
+        still_missing = []
+        for ticker in missing:
+            # Without downloads, stored bars are the best available even if stale
+            stored = _read_fresh_from_store(ticker, interval, start, allow_stale=not fetch_missing)
+            if stored is not None and not stored.empty:
+                _history_cache.set((ticker, period, interval), stored)
+                frames[ticker] = stored
+            else:
+                still_missing.append(ticker)
+        missing = still_missing
+
+    if missing and fetch_missing:
+        for ticker, df in _fetch_stock_history_bulk(missing, period, interval).items():
+            _history_cache.set((ticker, period, interval), df)
+            _write_to_store(ticker, interval, df, covered_from=price_store.period_start(period) or "")
+            frames[ticker] = df
+
+    columns = {}
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None or df.empty or "Close" not in df.columns:
+            continue
+        series = df.set_index(df.columns[0])["Close"]
+        columns[ticker] = series.pct_change().dropna() if returns else series
+
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
+
+
 def get_financial_metrics(ticker: str) -> Dict[str, Any]:
     """
     Fetches fundamental metrics (P/E, EPS, Market Cap, etc.)
+    Results are cached per ticker; callers get their own copy.
+    Fetched metrics are also kept in the local store for FUNDAMENTALS_STORE_TTL.
+    """
+    with span("market_data.financial_metrics", kind="tool", ticker=ticker) as s:
+        loaded = []
+        metrics = _metrics_cache.get_or_fetch(
+            ticker,
+            lambda: loaded.append(True) or _load_financial_metrics(ticker),
+            should_cache=bool,
+        )
+        s.set(cache_hit=not loaded)
+    return dict(metrics)
+
+
+def _load_financial_metrics(ticker: str) -> Dict[str, Any]:
+    """Read metrics from the local store, fetching (and storing) them when absent or expired."""
+    if not fundamentals_store.is_enabled():
+        return _fetch_financial_metrics(ticker)
+    try:
+        stored = fundamentals_store.read_metrics([ticker]).get(ticker)
+        if stored:
+            return stored
+        metrics = _fetch_financial_metrics(ticker)
+        if metrics:
+            fundamentals_store.write_metrics(ticker, metrics)
+        return metrics
+    except sqlite3.Error as e:
+        print(f"Fundamentals store unavailable for {ticker}, fetching directly: {e}")
+        return _fetch_financial_metrics(ticker)
+
+
+def get_financial_metrics_bulk(
+    tickers: List[str], fetch_missing: bool = True, max_workers: int = 8
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Metrics for many tickers at once. Served from the in-memory cache, then the
+    local store in one query; with fetch_missing, the rest are fetched in
+    parallel (yfinance has no batch endpoint for fundamentals). Without it,
+    expired stored metrics are used as-is. Tickers without data are left out.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    found: Dict[str, Dict[str, Any]] = {}
+    for ticker in tickers:
+        cached = _metrics_cache.get(ticker)
+        if cached:
+            found[ticker] = dict(cached)
+
+    missing = [t for t in tickers if t not in found]
+    if missing and fundamentals_store.is_enabled():
+        try:
+            max_age = None if fetch_missing else float("inf")
+            for ticker, metrics in fundamentals_store.read_metrics(missing, max_age=max_age).items():
+                _metrics_cache.set(ticker, metrics)
+                found[ticker] = dict(metrics)
+        except sqlite3.Error as e:
+            print(f"Fundamentals store unavailable: {e}")
+        missing = [t for t in missing if t not in found]
+
+    if missing and fetch_missing:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for ticker, metrics in zip(missing, pool.map(get_financial_metrics, missing)):
+                if metrics:
+                    found[ticker] = metrics
+    return found
+
+# Input-token budget for the fundamental analyst's data block.
+FUNDAMENTAL_PROMPT_TOKENS = int(os.getenv("FUNDAMENTAL_PROMPT_TOKENS", "120"))
+
+
+def _human(value: float) -> str:
+    for divisor, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= divisor:
+            return f"{value / divisor:.2f}{suffix}"
+    return f"{value:.0f}"
+
+
+def _ratio(value: float) -> str:
+    return f"{value * 100:.1f}%"
+
+
+# (metric, label, formatter) in order of importance; the least important are
+# dropped first when the summary runs over its token budget.
+_METRIC_FIELDS = [
+    ("sector", "sector", str),
+    ("industry", "industry", str),
+    ("marketCap", "mcap", _human),
+    ("peRatio", "PE", "{:.1f}".format),
+    ("forwardPE", "fwdPE", "{:.1f}".format),
+    ("returnOnEquity", "ROE", _ratio),
+    ("profitMargins", "netMargin", _ratio),
+    ("revenueGrowth", "revGrowth", _ratio),
+    ("debtToEquity", "D/E", "{:.1f}".format),
+    ("eps", "EPS", "{:.2f}".format),
+    ("forwardEps", "fwdEPS", "{:.2f}".format),
+    ("operatingMargins", "opMargin", _ratio),
+    ("returnOnAssets", "ROA", _ratio),
+    ("freeCashflow", "FCF", _human),
+    ("beta", "beta", "{:.2f}".format),
+    ("dividendYield", "divYield", "{:g}".format),
+    ("fiftyTwoWeekHigh", "52wHigh", "{:.2f}".format),
+    ("fiftyTwoWeekLow", "52wLow", "{:.2f}".format),
+]
+
+
+def summarize_financial_metrics(metrics: Dict[str, Any], max_tokens: int = FUNDAMENTAL_PROMPT_TOKENS) -> str:
+    """
+    Encode get_financial_metrics() output as compact `label value` pairs for an
+    LLM prompt: fixed precision, large amounts as T/B/M, margins and returns as
+    percentages, missing values omitted. Fields are dropped, least important
+    first, until the estimate fits `max_tokens`.
     """
+    parts = []
+    for key, label, fmt in _METRIC_FIELDS:
+        value = metrics.get(key)
+        if value is None:
+            continue
+        if fmt is not str:
+            # yfinance sometimes reports numbers as strings such as "Infinity";
+            # anything that is not a finite number is left out
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if not math.isfinite(value):
+                continue
+        parts.append(f"{label} {fmt(value)}")
+
+    while parts:
+        text = " | ".join(parts)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        parts.pop()
+    return ""
+
+
+@traced("yfinance.info", kind="io")
+def _fetch_financial_metrics(ticker: str) -> Dict[str, Any]:
     try:
         stock = yf.Ticker(ticker)
         info = stock.info
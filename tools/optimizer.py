@@ -0,0 +1,522 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.correlation import calculate_portfolio_metrics, get_sector_diversity
+
+# History used to estimate expected returns and covariance.
+OPTIMIZER_LOOKBACK = os.getenv("OPTIMIZER_LOOKBACK", "1y")
+# Upper bound per stock and per sector (fractions of the portfolio). Both are
+# raised just enough to stay feasible when there are too few stocks/sectors.
+OPTIMIZER_MAX_WEIGHT = float(os.getenv("OPTIMIZER_MAX_WEIGHT", "0.35"))
+OPTIMIZER_SECTOR_CAP = float(os.getenv("OPTIMIZER_SECTOR_CAP", "0.40"))
+# Risk aversion of the mean-variance portfolio: maximize mu'w - (lambda/2) w'Sigma w.
+OPTIMIZER_RISK_AVERSION = float(os.getenv("OPTIMIZER_RISK_AVERSION", "4.0"))
+# Annual risk-free rate for max-Sharpe (0 matches calculate_portfolio_metrics).
+OPTIMIZER_RISK_FREE_RATE = float(os.getenv("OPTIMIZER_RISK_FREE_RATE", "0.0"))
+
+METHODS = ("min_variance", "max_sharpe", "risk_parity", "mean_variance")
+
+_TOL = 1e-9
+_MAX_ITER = 20000
+# Iterations the set of binding constraints must hold before an exact solve on it.
+_FACE_STABLE_ITERATIONS = 3
+
+
+# ---------------------------------------------------------------- projection
+
+def _shifts_for_sums(
+    v: np.ndarray, upper: np.ndarray, floor: np.ndarray, groups: np.ndarray, targets: np.ndarray
+) -> np.ndarray:
+    """
+    Per group g, the shift tau_g with sum over its assets of
+    clip(v - max(tau_g, floor), 0, upper) == targets[g] (-inf if the sum never
+    exceeds the target).
+
+    Each asset's term falls with slope -1 between max(v - upper, floor) and
+    max(v, floor) and is flat elsewhere, so after one sort of those breakpoints
+    per group the piecewise-linear sums come from segmented cumulative sums.
+    """
+    start = np.maximum(v - upper, floor)
+    end = np.maximum(v, floor)
+    base = np.bincount(groups, np.clip(v - floor, 0.0, upper), minlength=len(targets))
+
+    points = np.concatenate([start, end])
+    owner = np.concatenate([groups, groups])
+    order = np.lexsort((points, owner))
+    points, owner = points[order], owner[order]
+    slope = np.concatenate([np.ones(len(v)), -np.ones(len(v))])[order]
+    starts = np.searchsorted(owner, np.arange(len(targets)))
+    first = starts[owner]  # index of each breakpoint's group start
+
+    active = np.cumsum(slope)
+    active -= active[first] - slope[first]  # decreasing terms right after each point
+    drop = np.concatenate([[0.0], np.cumsum(active[:-1] * np.diff(points))])
+    totals = base[owner] - (drop - drop[first])
+
+    # Totals fall along each group, so the first point at or below the target
+    # follows the ones above it
+    k = starts + np.bincount(owner, totals > targets[owner], minlength=len(targets)).astype(int)
+    crossing = k > starts  # otherwise the target is met for any tau
+    shifts = np.full(len(targets), -np.inf)
+    k = k[crossing]
+    shifts[crossing] = points[k - 1] + (totals[k - 1] - targets[crossing]) / active[k - 1]
+    return shifts
+
+
+def _project(
+    v: np.ndarray,
+    upper: np.ndarray,
+    groups: Optional[np.ndarray] = None,
+    caps: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Euclidean projection onto {sum(w) = 1, 0 <= w <= upper, group sums <= caps},
+    where `groups` gives each asset's group index (a partition).
+
+    The KKT conditions give w = clip(v - max(tau, tau_g), 0, upper), where tau_g
+    makes group g sum to its cap on its own; so all tau_g are solved at once,
+    then the common tau.
+    """
+    floor = np.full(len(v), -np.inf)
+    if groups is not None:
+        floor = _shifts_for_sums(v, upper, floor, groups, caps)[groups]
+    tau = _shifts_for_sums(v, upper, floor, np.zeros(len(v), dtype=int), np.ones(1))[0]
+    return np.clip(v - np.maximum(tau, floor), 0.0, upper)
+
+
+# ---------------------------------------------------------------- solvers
+
+def _free_rows(
+    free: np.ndarray, groups: Optional[np.ndarray], working_groups: List[int]
+) -> Tuple[np.ndarray, List[int]]:
+    """Equality rows on a face: the budget plus each working sector cap that still has free assets."""
+    rows, kept = [np.ones(len(free))], []
+    for g in working_groups:
+        members = groups == g
+        if (members & free).any():
+            kept.append(g)
+            rows.append(members.astype(float))
+    return np.array(rows), kept
+
+
+def _solve_on_face(hessian: np.ndarray, a: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Solve the equality-constrained KKT system [[H, A'], [A, 0]] x = rhs (rhs may have columns)."""
+    k, m = len(hessian), len(a)
+    kkt = np.zeros((k + m, k + m))
+    kkt[:k, :k] = hessian
+    kkt[:k, k:] = a.T
+    kkt[k:, :k] = a
+    try:
+        return np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:  # e.g. redundant budget and sector equalities
+        return np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+
+
+def _active_set(
+    cov: np.ndarray,
+    linear: np.ndarray,
+    risk_aversion: float,
+    w: np.ndarray,
+    upper: np.ndarray,
+    groups: Optional[np.ndarray],
+    caps: Optional[np.ndarray],
+) -> Optional[np.ndarray]:
+    """
+    Primal active-set refinement from a feasible, nearly optimal `w`: solve the
+    KKT system on the current face, step to the first blocking constraint, or
+    release the constraint with the most negative multiplier. Starting from the
+    face FISTA identified this usually takes a handful of linear solves.
+    Returns the exact optimum, or None if it did not settle.
+    """
+    tol = 1e-7
+    x = np.clip(w, 0.0, upper)
+    at_lower, at_upper = x <= tol, x >= upper - tol
+    x[at_lower], x[at_upper] = 0.0, upper[at_upper]
+    working_groups: List[int] = []
+    if groups is not None:
+        sums = np.bincount(groups, x, minlength=len(caps))
+        working_groups = [int(g) for g in np.flatnonzero(sums >= caps - tol)]
+
+    for _ in range(2 * len(w) + 10):
+        free = ~(at_lower | at_upper)
+        a, kept = _free_rows(free, groups, working_groups)
+        fixed = np.where(at_upper, upper, 0.0)
+        targets = np.concatenate([[1.0], caps[kept]]) if kept else np.ones(1)
+        k = free.sum()
+        rhs = np.concatenate([linear[free] - risk_aversion * cov[free] @ fixed, targets - a @ fixed])
+        solution = _solve_on_face(risk_aversion * cov[np.ix_(free, free)], a[:, free], rhs)
+        target = fixed.copy()
+        target[free] = solution[:k]
+        step = target - x
+
+        if np.abs(step).max() > 1e-12:
+            # Largest feasible fraction of the step, and what blocks it
+            alpha, blocker = 1.0, None
+            with np.errstate(divide="ignore", invalid="ignore"):
+                to_lower = np.where(free & (step < 0), -x / step, np.inf)
+                to_upper = np.where(free & (step > 0), (upper - x) / step, np.inf)
+            i = int(np.argmin(to_lower))
+            if to_lower[i] < alpha:
+                alpha, blocker = to_lower[i], ("lower", i)
+            i = int(np.argmin(to_upper))
+            if to_upper[i] < alpha:
+                alpha, blocker = to_upper[i], ("upper", i)
+            if groups is not None:
+                rise = np.bincount(groups, step, minlength=len(caps))
+                room = caps - np.bincount(groups, x, minlength=len(caps))
+                for g in np.flatnonzero(rise > 1e-15):
+                    if g not in working_groups and room[g] / rise[g] < alpha:
+                        alpha, blocker = max(room[g] / rise[g], 0.0), ("group", int(g))
+            x = x + alpha * step
+            if blocker is None:
+                continue
+            kind, index = blocker
+            if kind == "lower":
+                at_lower[index], x[index] = True, 0.0
+            elif kind == "upper":
+                at_upper[index], x[index] = True, upper[index]
+            else:
+                working_groups.append(index)
+            continue
+
+        # Stationary on this face: optimal unless a multiplier has the wrong sign
+        multipliers = solution[k:]
+        shift = np.full(len(w), multipliers[0])
+        worst, release = -1e-9 * (1.0 + np.abs(linear).max()), None
+        for g, eta in zip(kept, multipliers[1:]):
+            shift[groups == g] += eta
+            if eta < worst:
+                worst, release = eta, ("group", g)
+        reduced = risk_aversion * (cov @ x) - linear + shift
+        i = int(np.argmin(np.where(at_lower, reduced, np.inf)))
+        if at_lower[i] and reduced[i] < worst:
+            worst, release = reduced[i], ("lower", i)
+        i = int(np.argmax(np.where(at_upper, reduced, -np.inf)))
+        if at_upper[i] and -reduced[i] < worst:
+            worst, release = -reduced[i], ("upper", i)
+        if release is None:
+            return np.clip(x, 0.0, upper)
+        kind, index = release
+        if kind == "lower":
+            at_lower[index] = False
+        elif kind == "upper":
+            at_upper[index] = False
+        else:
+            working_groups.remove(index)
+    return None
+
+
+def _tangent_risk_aversion(
+    cov: np.ndarray,
+    excess: np.ndarray,
+    w: np.ndarray,
+    upper: np.ndarray,
+    groups: Optional[np.ndarray],
+    caps: Optional[np.ndarray],
+) -> Optional[float]:
+    """
+    On the face of `w`, mean-variance solutions are affine in t = 1/lambda:
+    w(t) = w0 + t * w1. Returns the lambda maximizing Sharpe along that line
+    (closed form), or None if it has no interior maximum.
+    """
+    tol = 1e-7
+    at_upper = w >= upper - tol
+    free = ~(at_upper | (w <= tol))
+    working_groups: List[int] = []
+    if groups is not None:
+        sums = np.bincount(groups, w, minlength=len(caps))
+        working_groups = [int(g) for g in np.flatnonzero(sums >= caps - tol)]
+    a, kept = _free_rows(free, groups, working_groups)
+    fixed = np.where(at_upper, upper, 0.0)
+    b = (np.concatenate([[1.0], caps[kept]]) if kept else np.ones(1)) - a @ fixed
+    k = free.sum()
+    rhs = np.zeros((k + len(a), 2))
+    rhs[:k, 0] = -cov[free] @ fixed
+    rhs[k:, 0] = b
+    rhs[:k, 1] = excess[free]
+    solution = _solve_on_face(cov[np.ix_(free, free)], a[:, free], rhs)
+    w0, w1 = fixed.copy(), np.zeros(len(w))
+    w0[free], w1[free] = solution[:k, 0], solution[:k, 1]
+
+    p, q = excess @ w0, excess @ w1
+    c0, c1, c2 = w0 @ cov @ w0, w0 @ cov @ w1, w1 @ cov @ w1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (p * c1 - q * c0) / (q * c1 - p * c2)
+    return 1.0 / t if np.isfinite(t) and t > 0 else None
+
+
+def _solve_quadratic(
+    cov: np.ndarray,
+    linear: np.ndarray,
+    risk_aversion: float,
+    upper: np.ndarray,
+    groups: Optional[np.ndarray],
+    caps: Optional[np.ndarray],
+    start: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Minimize (risk_aversion / 2) w'Σw - linear'w over the constraint set.
+
+    Accelerated projected gradient (FISTA with adaptive restart) identifies the
+    binding constraints; once they stay the same for a few iterations an exact
+    active-set refinement takes over from there.
+    """
+    n = len(linear)
+    lipschitz = risk_aversion * float(np.linalg.eigvalsh(cov)[-1])
+    step = 1.0 / max(lipschitz, 1e-12)
+    w = _project(start if start is not None else np.full(n, 1.0 / n), upper, groups, caps)
+    if start is not None:
+        # A neighbouring solution's face is usually close: refine it directly
+        refined = _active_set(cov, linear, risk_aversion, w, upper, groups, caps)
+        if refined is not None:
+            return refined
+    y, momentum = w.copy(), 1.0
+    face, stable, tried = None, 0, set()
+    for _ in range(_MAX_ITER):
+        grad = risk_aversion * (cov @ y) - linear
+        w_next = _project(y - step * grad, upper, groups, caps)
+        delta = w_next - w
+        converged = np.abs(delta).max() < _TOL
+
+        key = (w_next <= 0).tobytes() + (w_next >= upper).tobytes()
+        if groups is not None:
+            key += (np.bincount(groups, w_next, minlength=len(caps)) >= caps - 1e-12).tobytes()
+        stable = stable + 1 if key == face else 0
+        face = key
+        if (stable >= _FACE_STABLE_ITERATIONS and key not in tried) or converged:
+            tried.add(key)
+            refined = _active_set(cov, linear, risk_aversion, w_next, upper, groups, caps)
+            if refined is not None:
+                return refined
+        if converged:
+            return w_next
+
+        if grad @ delta > 0:  # moving uphill: drop the momentum
+            momentum = 1.0
+            y = w_next
+        else:
+            momentum_next = (1.0 + np.sqrt(1.0 + 4.0 * momentum ** 2)) / 2.0
+            y = w_next + ((momentum - 1.0) / momentum_next) * delta
+            momentum = momentum_next
+        w = w_next
+    return w
+
+
+def _max_sharpe(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    risk_free: float,
+    upper: np.ndarray,
+    groups: Optional[np.ndarray],
+    caps: Optional[np.ndarray],
+) -> np.ndarray:
+    """
+    Max-Sharpe over the constraint set. Its KKT conditions match those of the
+    mean-variance problem with lambda = (mu'w - rf) / w'Σw at the optimum. Each
+    mean-variance solve identifies a face; the best lambda on that face is
+    computed in closed form and re-solved until the face stops changing
+    (usually two or three solves). The best Sharpe seen is kept.
+    """
+    excess = mu - risk_free
+    w = _solve_quadratic(cov, np.zeros_like(mu), 1.0, upper, groups, caps)
+    if excess.max() <= 0:
+        return w  # no portfolio beats the risk-free rate; fall back to min variance
+    best, best_sharpe = w, _sharpe(w, excess, cov)
+    lam = max((excess @ w) / (w @ cov @ w), 1e-6)
+    for _ in range(30):
+        w = _solve_quadratic(cov, excess, lam, upper, groups, caps, start=w)
+        sharpe = _sharpe(w, excess, cov)
+        if sharpe > best_sharpe:
+            best, best_sharpe = w, sharpe
+        lam_next = _tangent_risk_aversion(cov, excess, w, upper, groups, caps)
+        if lam_next is None:  # fall back to the plain fixed-point step
+            lam_next = (excess @ w) / (w @ cov @ w)
+        if lam_next <= 0 or abs(lam_next - lam) <= 1e-9 * lam:
+            break
+        lam = lam_next
+    return best
+
+
+def _risk_parity(cov: np.ndarray) -> np.ndarray:
+    """
+    Equal risk contributions: minimize 0.5 y'Σy - (1/n) sum(log y) with damped
+    Newton steps, then normalize. Long-only and fully invested; the weight and
+    sector caps are not applied.
+    """
+    n = len(cov)
+    budget = np.full(n, 1.0 / n)
+    y = budget / np.sqrt(np.diag(cov))
+    for _ in range(100):
+        grad = cov @ y - budget / y
+        hessian = cov + np.diag(budget / y ** 2)
+        direction = np.linalg.solve(hessian, grad)
+        t = 1.0
+        while np.any(y - t * direction <= 0):  # stay in the log barrier's domain
+            t /= 2.0
+        y = y - t * direction
+        if np.abs(grad).max() < 1e-12:
+            break
+    return y / y.sum()
+
+
+def _sharpe(w: np.ndarray, excess: np.ndarray, cov: np.ndarray) -> float:
+    variance = float(w @ cov @ w)
+    return float(excess @ w) / float(np.sqrt(variance)) if variance > 0 else 0.0
+
+
+# ---------------------------------------------------------------- public API
+
+def _feasible_cap(cap: float, capacities: np.ndarray) -> float:
+    """Smallest cap >= `cap` with sum(min(cap, capacity)) >= 1 over the groups."""
+    def total(c):
+        return float(np.minimum(c, capacities).sum())
+
+    if total(cap) >= 1.0:
+        return cap
+    points = np.unique(np.concatenate([[cap], capacities[capacities > cap]]))
+    return float(np.interp(1.0, [total(p) for p in points], points))
+
+
+def _sector_constraints(sectors: List[str], upper: np.ndarray, sector_cap: float) -> Tuple[np.ndarray, float]:
+    """Sector index per asset and the sector cap raised to feasibility."""
+    _, groups = np.unique(np.asarray(sectors, dtype=str), return_inverse=True)
+    return groups, _feasible_cap(sector_cap, np.bincount(groups, upper))
+
+
+def optimize_weights(
+    mu: np.ndarray,
+    cov: np.ndarray,
+    method: str = "max_sharpe",
+    max_weight: float = OPTIMIZER_MAX_WEIGHT,
+    sectors: Optional[List[str]] = None,
+    sector_cap: float = OPTIMIZER_SECTOR_CAP,
+    risk_aversion: float = OPTIMIZER_RISK_AVERSION,
+    risk_free_rate: float = OPTIMIZER_RISK_FREE_RATE,
+) -> np.ndarray:
+    """
+    Long-only, fully invested weights for annualized expected returns `mu` and
+    covariance `cov`.
+
+    Args:
+        method: min_variance, max_sharpe, risk_parity or mean_variance.
+        max_weight: Cap per asset (raised to 1/n if that is infeasible).
+        sectors: Sector label per asset; enables `sector_cap` per sector (raised
+            to the smallest feasible cap when there are too few sectors).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown optimization method '{method}'. Valid methods: {', '.join(METHODS)}")
+    mu = np.asarray(mu, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n = len(mu)
+    # Tiny ridge keeps the solvers stable when Σ is singular (more assets than days)
+    cov = (cov + cov.T) / 2.0 + np.eye(n) * 1e-10 * max(np.trace(cov) / n, 1e-12)
+    if method == "risk_parity":
+        return _risk_parity(cov)
+
+    upper = np.full(n, max(max_weight, 1.0 / n))
+    groups = caps = None
+    if sectors is not None:
+        groups, cap = _sector_constraints(sectors, upper, sector_cap)
+        caps = np.full(groups.max() + 1, cap)
+
+    if method == "min_variance":
+        return _solve_quadratic(cov, np.zeros(n), 1.0, upper, groups, caps)
+    if method == "mean_variance":
+        return _solve_quadratic(cov, mu, risk_aversion, upper, groups, caps)
+    return _max_sharpe(mu, cov, risk_free_rate, upper, groups, caps)
+
+
+def estimate_inputs(
+    tickers: List[str], period: str = OPTIMIZER_LOOKBACK
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Annualized expected returns and covariance from calculate_portfolio_metrics
+    (rebuilt as D·corr·D from its volatilities and correlations). Tickers
+    without data or with a flat price are dropped.
+    """
+    metrics = calculate_portfolio_metrics({t: 1.0 / len(tickers) for t in tickers}, period=period)
+    if not metrics:
+        return [], np.empty(0), np.empty((0, 0))
+    returns = pd.Series(metrics["individual_annual_returns"], dtype=float)
+    vol = pd.Series(metrics["individual_annual_volatility"], dtype=float).reindex(returns.index)
+    usable = np.isfinite(returns) & np.isfinite(vol) & (vol > 0)
+    names = list(returns.index[usable])
+    corr = pd.DataFrame(metrics["correlation_matrix"]).loc[names, names].fillna(0.0).to_numpy(dtype=float)
+    sigma = vol[names].to_numpy()
+    return names, returns[names].to_numpy(), corr * np.outer(sigma, sigma)
+
+
+def optimize_portfolio(
+    tickers: List[str],
+    methods: Tuple[str, ...] = METHODS,
+    period: str = OPTIMIZER_LOOKBACK,
+    max_weight: float = OPTIMIZER_MAX_WEIGHT,
+    sector_cap: float = OPTIMIZER_SECTOR_CAP,
+    risk_aversion: float = OPTIMIZER_RISK_AVERSION,
+    risk_free_rate: float = OPTIMIZER_RISK_FREE_RATE,
+) -> Dict[str, Any]:
+    """
+    Optimized allocations for `tickers`, one per method, with sector caps from
+    get_sector_diversity.
+
+    Returns tickers (those with price data), sectors, the constraints applied
+    and, per method, weights, expected_return, volatility, sharpe_ratio,
+    risk_contributions and sector_weights (annualized fractions; stocks and
+    sectors with zero weight are left out).
+    Empty if fewer than 2 tickers have data.
+    """
+    names, mu, cov = estimate_inputs(list(dict.fromkeys(tickers)), period)
+    if len(names) < 2:
+        return {}
+    sector_map = get_sector_diversity(names)
+    sector_of = {t: sector for sector, members in sector_map.items() for t in members}
+    sectors = [sector_of.get(t, "Unknown") for t in names]
+
+    weight_cap = max(max_weight, 1.0 / len(names))
+    _, effective_cap = _sector_constraints(sectors, np.full(len(names), weight_cap), sector_cap)
+    start = time.perf_counter()
+    portfolios = {}
+    for method in methods:
+        w = optimize_weights(
+            mu, cov, method, max_weight=max_weight, sectors=sectors, sector_cap=sector_cap,
+            risk_aversion=risk_aversion, risk_free_rate=risk_free_rate,
+        )
+        portfolios[method] = _describe(w, names, sectors, mu, cov, risk_free_rate)
+    seconds = time.perf_counter() - start
+
+    return {
+        "tickers": names,
+        "sectors": sector_map,
+        "constraints": {
+            "max_weight": round(weight_cap, 4),
+            "sector_cap": round(effective_cap, 4),
+            "risk_aversion": risk_aversion,
+            "risk_free_rate": risk_free_rate,
+            "lookback": period,
+        },
+        "portfolios": portfolios,
+        "solve_seconds": round(seconds, 4),
+    }
+
+
+def _describe(
+    w: np.ndarray, names: List[str], sectors: List[str], mu: np.ndarray, cov: np.ndarray, risk_free: float
+) -> Dict[str, Any]:
+    variance = float(w @ cov @ w)
+    contributions = w * (cov @ w) / variance if variance > 0 else np.zeros_like(w)
+    sector_weights: Dict[str, float] = {}
+    for sector, weight in zip(sectors, w):
+        sector_weights[sector] = sector_weights.get(sector, 0.0) + float(weight)
+    held = [i for i, x in enumerate(w) if round(float(x), 4) > 0]  # zero weights are left out
+    return {
+        "weights": {names[i]: round(float(w[i]), 4) for i in held},
+        "expected_return": round(float(mu @ w), 4),
+        "volatility": round(float(np.sqrt(variance)), 4),
+        "sharpe_ratio": round(_sharpe(w, mu - risk_free, cov), 4),
+        "risk_contributions": {names[i]: round(float(contributions[i]), 4) for i in held},
+        "sector_weights": {s: round(x, 4) for s, x in sector_weights.items() if round(x, 4) > 0},
+    }
@@ -0,0 +1,233 @@
+import os
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from core.db import connect
+
+# Intervals persisted to the local store. Intraday bars are short-lived and stay
+# in memory only.
+PRICE_STORE_INTERVALS = {
+    i.strip() for i in os.getenv("PRICE_STORE_INTERVALS", "1d").split(",") if i.strip()
+}
+# How long stored bars are trusted before the latest bars are re-fetched.
+PRICE_STORE_REFRESH_SECONDS = float(os.getenv("PRICE_STORE_REFRESH_SECONDS", "900"))
+# Bars older than this are dropped by compact().
+PRICE_STORE_RETAIN_DAYS = int(os.getenv("PRICE_STORE_RETAIN_DAYS", str(5 * 365)))
+
+_OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_bars (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (ticker, interval, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS price_store_meta (
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    covered_from TEXT,
+    last_bar TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (ticker, interval)
+);
+"""
+
+_schema_ready = set()
+
+
+def _connect():
+    conn = connect()
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    if path not in _schema_ready:
+        conn.executescript(_SCHEMA)
+        _schema_ready.add(path)
+    return conn
+
+
+def is_enabled(interval: str) -> bool:
+    """True if bars of this interval are persisted (set PRICE_STORE_ENABLED=0 to bypass)."""
+    return os.getenv("PRICE_STORE_ENABLED", "1") != "0" and interval in PRICE_STORE_INTERVALS
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[str]:
+    """
+    First date (YYYY-MM-DD) covered by a yfinance period string such as '3mo' or '1y'.
+    Returns None for 'max' and for periods that can't be parsed.
+    """
+    now = now or pd.Timestamp.now()
+    if period == "ytd":
+        return f"{now.year}-01-01"
+    units = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+    for suffix, unit in units.items():
+        if period.endswith(suffix) and period[: -len(suffix)].isdigit():
+            offset = pd.DateOffset(**{unit: int(period[: -len(suffix)])})
+            return (now - offset).strftime("%Y-%m-%d")
+    return None
+
+
+def get_meta(ticker: str, interval: str) -> Optional[Dict[str, Any]]:
+    """Coverage info for a stored series, or None if nothing is stored."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT covered_from, last_bar, updated_at FROM price_store_meta WHERE ticker = ? AND interval = ?",
+            (ticker, interval),
+        ).fetchone()
+    if row is None:
+        return None
+    return {"covered_from": row[0], "last_bar": row[1], "updated_at": row[2]}
+
+
+def is_stale(meta: Dict[str, Any]) -> bool:
+    return time.time() - meta["updated_at"] > PRICE_STORE_REFRESH_SECONDS
+
+
+def covers(meta: Optional[Dict[str, Any]], start: Optional[str]) -> bool:
+    """True if the stored series reaches back to `start` (None means full history)."""
+    if meta is None or meta["last_bar"] is None:
+        return False
+    if start is None:
+        return meta["covered_from"] == ""
+    return meta["covered_from"] is not None and meta["covered_from"] <= start
+
+
+def read_bars(ticker: str, interval: str, start: Optional[str] = None) -> pd.DataFrame:
+    """Stored bars from `start` (inclusive) onwards in get_stock_history() layout."""
+    query = "SELECT ts, open, high, low, close, volume FROM price_bars WHERE ticker = ? AND interval = ?"
+    params: List[Any] = [ticker, interval]
+    if start:
+        query += " AND ts >= ?"
+        params.append(start)
+    query += " ORDER BY ts"
+    with closing(_connect()) as conn:
+        rows = conn.execute(query, params).fetchall()
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows, columns=["Date"] + _OHLCV)
+
+
+def last_bars(ticker: str, interval: str, count: int = 2) -> pd.DataFrame:
+    """The newest `count` stored bars (oldest first) in get_stock_history() layout."""
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT ts, open, high, low, close, volume FROM price_bars WHERE ticker = ? AND interval = ? "
+            "ORDER BY ts DESC LIMIT ?",
+            (ticker, interval, count),
+        ).fetchall()
+    return pd.DataFrame(rows[::-1], columns=["Date"] + _OHLCV)
+
+
+def write_bars(
+    ticker: str,
+    interval: str,
+    df: pd.DataFrame,
+    covered_from: Optional[str] = None,
+    replace: bool = False,
+) -> int:
+    """
+    Upsert bars from a get_stock_history()-shaped frame and update coverage.
+    Existing bars with the same timestamp are replaced, so re-fetching the latest
+    (possibly still forming) bar is safe.
+
+    Args:
+        covered_from: New start of coverage; '' marks full history, None keeps the old value.
+        replace: Drop every stored bar of the series first (a re-based adjusted history).
+    """
+    rows = []
+    if not df.empty:
+        date_col = df.columns[0]
+        rows = [
+            (ticker, interval, str(r[0]), *(None if pd.isna(v) else float(v) for v in r[1:]))
+            for r in df[[date_col] + _OHLCV].itertuples(index=False, name=None)
+        ]
+
+    with closing(_connect()) as conn, conn:
+        if replace:
+            conn.execute("DELETE FROM price_bars WHERE ticker = ? AND interval = ?", (ticker, interval))
+        if rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO price_bars (ticker, interval, ts, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        last_bar = conn.execute(
+            "SELECT MAX(ts) FROM price_bars WHERE ticker = ? AND interval = ?",
+            (ticker, interval),
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO price_store_meta (ticker, interval, covered_from, last_bar, updated_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (ticker, interval) DO UPDATE SET "
+            "covered_from = COALESCE(excluded.covered_from, covered_from), "
+            "last_bar = excluded.last_bar, updated_at = excluded.updated_at",
+            (ticker, interval, covered_from, last_bar, time.time()),
+        )
+    return len(rows)
+
+
+def compact(retain_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    Drop bars older than the retention window and bars with no coverage record,
+    then reclaim disk space. Run it off-hours; VACUUM locks the database.
+    """
+    retain_days = PRICE_STORE_RETAIN_DAYS if retain_days is None else retain_days
+    cutoff = (pd.Timestamp.now() - pd.Timedelta(days=retain_days)).strftime("%Y-%m-%d")
+    with closing(_connect()) as conn:
+        with conn:
+            expired = conn.execute("DELETE FROM price_bars WHERE ts < ?", (cutoff,)).rowcount
+            orphaned = conn.execute(
+                "DELETE FROM price_bars WHERE NOT EXISTS ("
+                "SELECT 1 FROM price_store_meta m "
+                "WHERE m.ticker = price_bars.ticker AND m.interval = price_bars.interval)"
+            ).rowcount
+            # Coverage now starts at the cutoff for series that reached further back
+            conn.execute(
+                "UPDATE price_store_meta SET covered_from = ? "
+                "WHERE covered_from IS NULL OR covered_from < ?",
+                (cutoff, cutoff),
+            )
+            conn.execute(
+                "DELETE FROM price_store_meta WHERE NOT EXISTS ("
+                "SELECT 1 FROM price_bars b "
+                "WHERE b.ticker = price_store_meta.ticker AND b.interval = price_store_meta.interval)"
+            )
+        conn.execute("VACUUM")
+    return {"expired_bars": expired, "orphaned_bars": orphaned}
+
+
+def stats() -> Dict[str, Any]:
+    """Number of stored series and bars."""
+    with closing(_connect()) as conn:
+        series, bars = conn.execute(
+            "SELECT (SELECT COUNT(*) FROM price_store_meta), (SELECT COUNT(*) FROM price_bars)"
+        ).fetchone()
+    return {"series": series, "bars": bars}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the local OHLCV store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    warm = sub.add_parser("warm", help="Pre-load daily bars for a watchlist (run before market open)")
+    warm.add_argument("tickers", nargs="+")
+    warm.add_argument("--period", default="1y")
+    sub.add_parser("compact", help="Drop expired bars and vacuum the database")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        from tools.market_data import warm_price_store
+
+        print(warm_price_store(args.tickers, period=args.period))
+    else:
+        print(compact())
+    print(stats())
@@ -0,0 +1,307 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from core.db import get_db_path
+from tools.cache import TTLCache
+
+# Storage precision of the on-disk matrix. float32 halves the file and page-cache
+# footprint; covariance is always accumulated in float64.
+RETURNS_MATRIX_DTYPE = os.getenv("RETURNS_MATRIX_DTYPE", "float32")
+# calculate_portfolio_metrics() only uses the matrix when its last date is at
+# most this many days old; otherwise it falls back to fetching returns.
+RETURNS_MATRIX_MAX_AGE_DAYS = int(os.getenv("RETURNS_MATRIX_MAX_AGE_DAYS", "4"))
+
+# Minimum capacity when the file is (re)allocated; capacity doubles beyond that.
+_MIN_TICKERS = 64
+_MIN_DATES = 512
+# Tickers copied per step when the file is reallocated, to bound memory.
+_COPY_CHUNK = 256
+
+
+def default_directory() -> str:
+    """Directory of the matrix files: RETURNS_MATRIX_DIR, else `returns/` next to the database."""
+    return os.getenv("RETURNS_MATRIX_DIR") or os.path.join(os.path.dirname(get_db_path()) or ".", "returns")
+
+
+def _date_key(value: Any) -> str:
+    return str(value)[:10]
+
+
+class ReturnsMatrix:
+    """
+    Daily simple returns for a ticker universe in a memory-mapped .npy file.
+
+    The matrix is ticker-major (one contiguous row of dates per ticker) with
+    spare capacity in both dimensions, so a daily update appends a column in
+    place and a subset/window read touches only those tickers' pages. The
+    ticker and date index lives in index.json beside it; missing values are NaN.
+
+    Covariance, correlation and mean returns for a subset and date window are
+    computed from just that block and cached per (subset hash, window, version).
+    One process should write at a time; readers in other processes pick up
+    changes when they reopen the matrix.
+    """
+
+    def __init__(self, directory: Optional[str] = None, dtype: Optional[str] = None):
+        self.directory = directory or default_directory()
+        self.dtype = np.dtype(dtype or RETURNS_MATRIX_DTYPE)
+        self.tickers: List[str] = []
+        self.dates: List[str] = []
+        self.version = 0
+        self._ticker_pos: Dict[str, int] = {}
+        self._data: Optional[np.ndarray] = None
+        self._lock = threading.RLock()
+        self._cache = TTLCache(maxsize=256, ttl=24 * 3600, name="returns_matrix")
+        self._load()
+
+    # -------------------------------------------------------------- storage
+
+    @property
+    def _data_path(self) -> str:
+        return os.path.join(self.directory, "returns.npy")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _load(self) -> None:
+        if not (os.path.exists(self._index_path) and os.path.exists(self._data_path)):
+            return
+        with open(self._index_path) as f:
+            index = json.load(f)
+        self.tickers = index["tickers"]
+        self.dates = index["dates"]
+        self.version = index.get("version", 0)
+        self._ticker_pos = {t: i for i, t in enumerate(self.tickers)}
+        self._data = np.load(self._data_path, mmap_mode="r+")
+        self.dtype = self._data.dtype
+
+    def _write_index(self) -> None:
+        tmp = self._index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"tickers": self.tickers, "dates": self.dates, "version": self.version,
+                       "dtype": self.dtype.name}, f)
+        os.replace(tmp, self._index_path)
+
+    def _reallocate(self, n_tickers: int, dates: List[str]) -> None:
+        """Copy the used block into a larger file; `dates` is the new (sorted) date index."""
+        capacity = self._data.shape if self._data is not None else (0, 0)
+        shape = (
+            max(n_tickers, _MIN_TICKERS, capacity[0] * 2 if n_tickers > capacity[0] else capacity[0]),
+            max(len(dates), _MIN_DATES, capacity[1] * 2 if len(dates) > capacity[1] else capacity[1]),
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._data_path + ".tmp"
+        new = open_memmap(tmp, mode="w+", dtype=self.dtype, shape=shape)
+        new[:] = np.nan
+        if self._data is not None and self.tickers and self.dates:
+            # Old dates keep their values at their (possibly shifted) new positions
+            new_pos = np.searchsorted(dates, self.dates)
+            for i in range(0, len(self.tickers), _COPY_CHUNK):
+                rows = slice(i, min(i + _COPY_CHUNK, len(self.tickers)))
+                new[rows, new_pos] = self._data[rows, :len(self.dates)]
+        new.flush()
+        del new
+        self._data = None
+        os.replace(tmp, self._data_path)
+        self._data = np.load(self._data_path, mmap_mode="r+")
+
+    # -------------------------------------------------------------- writes
+
+    def update(self, returns: pd.DataFrame) -> Dict[str, int]:
+        """
+        Upsert a wide (date x ticker) frame of daily returns, e.g.
+        get_stock_history_bulk(..., returns=True). New dates after the last
+        stored one are appended in place; older unseen dates (a backfill) trigger
+        one reallocation. NaN cells never overwrite stored values.
+        """
+        if returns.empty:
+            return {"tickers_added": 0, "dates_added": 0}
+        frame = returns.copy()
+        frame.index = [_date_key(d) for d in frame.index]
+        frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+
+        with self._lock:
+            new_tickers = [t for t in frame.columns if t not in self._ticker_pos]
+            known_dates = set(self.dates)
+            new_dates = sorted(d for d in frame.index if d not in known_dates)
+            n_tickers = len(self.tickers) + len(new_tickers)
+            dates = self.dates + new_dates
+            backfill = bool(new_dates and self.dates and new_dates[0] < self.dates[-1])
+            if backfill:
+                dates = sorted(known_dates | set(new_dates))
+            capacity = self._data.shape if self._data is not None else (0, 0)
+            if backfill or n_tickers > capacity[0] or len(dates) > capacity[1]:
+                self._reallocate(n_tickers, dates)
+
+            self.tickers = self.tickers + new_tickers
+            self._ticker_pos = {t: i for i, t in enumerate(self.tickers)}
+            self.dates = dates
+
+            rows = np.array([self._ticker_pos[t] for t in frame.columns])
+            cols = np.searchsorted(self.dates, list(frame.index))
+            values = frame.to_numpy(dtype=float).T
+            block = np.ix_(rows, cols)
+            current = self._data[block]
+            self._data[block] = np.where(np.isnan(values), current, values)
+            self._data.flush()
+
+            self.version += 1
+            self._write_index()
+            self._cache.clear()
+        return {"tickers_added": len(new_tickers), "dates_added": len(new_dates)}
+
+    # -------------------------------------------------------------- reads
+
+    @property
+    def last_date(self) -> Optional[str]:
+        return self.dates[-1] if self.dates else None
+
+    def has(self, tickers: List[str]) -> bool:
+        return all(t in self._ticker_pos for t in tickers)
+
+    def window(
+        self, tickers: List[str], start: Optional[str] = None, end: Optional[str] = None
+    ) -> Tuple[np.ndarray, List[str], List[str]]:
+        """
+        Returns for `tickers` (those present) between `start` and `end` inclusive
+        as a (dates x tickers) float64 array, plus the tickers and dates it covers.
+        Only that block is read from disk.
+        """
+        with self._lock:
+            present = [t for t in tickers if t in self._ticker_pos]
+            d0 = bisect.bisect_left(self.dates, start) if start else 0
+            d1 = bisect.bisect_right(self.dates, end) if end else len(self.dates)
+            if not present or self._data is None or d1 <= d0:
+                return np.empty((0, len(present))), present, []
+            rows = np.array([self._ticker_pos[t] for t in present])
+            block = self._data[rows, d0:d1].T.astype(np.float64)
+            return block, present, self.dates[d0:d1]
+
+    def moments(
+        self, tickers: List[str], start: Optional[str] = None, end: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Daily mean, std, covariance and correlation over dates where every
+        ticker has a return (same as DataFrame.dropna() then mean/std/cov/corr).
+        Cached per (subset hash, window) until the next update().
+        """
+        subset = sorted(set(tickers))
+        digest = hashlib.sha1(",".join(subset).encode()).hexdigest()
+        key = (digest, start, end, self.version)
+        return self._cache.get_or_fetch(key, lambda: self._compute_moments(subset, start, end))
+
+    def _compute_moments(self, tickers: List[str], start: Optional[str], end: Optional[str]) -> Dict[str, Any]:
+        block, present, _ = self.window(tickers, start, end)
+        complete = block[~np.isnan(block).any(axis=1)] if block.size else block
+        n = len(complete)
+        if n < 2:
+            return {"tickers": present, "observations": n, "mean": None, "std": None, "cov": None, "corr": None}
+        mean = complete.mean(axis=0)
+        centered = complete - mean
+        cov = centered.T @ centered / (n - 1)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(std, std)
+        return {"tickers": present, "observations": n, "mean": mean, "std": std, "cov": cov, "corr": corr}
+
+    def cov(self, tickers: List[str], start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Daily covariance of the subset over the window (empty if under 2 complete dates)."""
+        return self._frame(tickers, "cov", start, end)
+
+    def corr(self, tickers: List[str], start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        """Correlation of the subset over the window (empty if under 2 complete dates)."""
+        return self._frame(tickers, "corr", start, end)
+
+    def _frame(self, tickers: List[str], name: str, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+        m = self.moments(tickers, start, end)
+        if m[name] is None:
+            return pd.DataFrame()
+        frame = pd.DataFrame(m[name], index=m["tickers"], columns=m["tickers"])
+        order = [t for t in tickers if t in frame.index]
+        return frame.loc[order, order].copy()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            capacity = self._data.shape if self._data is not None else (0, 0)
+            return {
+                "tickers": len(self.tickers),
+                "dates": len(self.dates),
+                "first_date": self.dates[0] if self.dates else None,
+                "last_date": self.last_date,
+                "capacity": list(capacity),
+                "dtype": self.dtype.name,
+                "version": self.version,
+                "cache": self._cache.stats(),
+            }
+
+
+_matrices: Dict[str, ReturnsMatrix] = {}
+_matrices_lock = threading.Lock()
+
+
+def get_returns_matrix(directory: Optional[str] = None) -> ReturnsMatrix:
+    """The shared matrix for `directory` (default: default_directory()), opened on first use."""
+    directory = directory or default_directory()
+    with _matrices_lock:
+        matrix = _matrices.get(directory)
+        if matrix is None:
+            matrix = ReturnsMatrix(directory)
+            _matrices[directory] = matrix
+        return matrix
+
+
+def is_fresh(matrix: ReturnsMatrix, tickers: List[str]) -> bool:
+    """True if the matrix holds every ticker and was updated within RETURNS_MATRIX_MAX_AGE_DAYS."""
+    if not matrix.last_date or not matrix.has(tickers):
+        return False
+    age = pd.Timestamp.now().normalize() - pd.Timestamp(matrix.last_date)
+    return age.days <= RETURNS_MATRIX_MAX_AGE_DAYS
+
+
+def refresh_returns_matrix(
+    tickers: List[str], period: str = "3y", recent_period: str = "1mo", directory: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Daily maintenance: append the latest returns for tickers already in the
+    matrix (fetching only `recent_period`) and backfill `period` of history for
+    new ones. Both go through get_stock_history_bulk, so stored prices are reused.
+    """
+    from tools.market_data import get_stock_history_bulk
+
+    matrix = get_returns_matrix(directory)
+    tickers = list(dict.fromkeys(tickers))
+    known = [t for t in tickers if matrix.has([t])]
+    new = [t for t in tickers if t not in known]
+    result = {"tickers_added": 0, "dates_added": 0}
+    for group, group_period in ((known, recent_period), (new, period)):
+        if group:
+            returns = get_stock_history_bulk(group, period=group_period, returns=True)
+            for name, count in matrix.update(returns).items():
+                result[name] += count
+    return {**result, **matrix.stats()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the memory-mapped returns matrix.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Append the latest returns (run daily after the close)")
+    update.add_argument("tickers", nargs="+")
+    update.add_argument("--period", default="3y", help="history loaded for tickers new to the matrix")
+    sub.add_parser("stats", help="Show matrix size and coverage")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        print(refresh_returns_matrix(args.tickers, period=args.period))
+    else:
+        print(get_returns_matrix().stats())
@@ -1,11 +1,48 @@
+import os
 from duckduckgo_search import DDGS
 from typing import List, Dict
 
+from core.tracing import traced
+from tools.cache import TTLCache
+
+# Headlines change slowly relative to an analysis run; sharing results lets a
+# speculative prefetch and the sentiment analyst use a single search.
+_news_cache = TTLCache(
+    maxsize=int(os.getenv("NEWS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("NEWS_CACHE_TTL", "600")),
+    name="news",
+)
+
+
+def stock_news_query(ticker: str) -> str:
+    """The news search used for a ticker (exchange suffix dropped for better results)."""
+    return ticker.split(".")[0] + " share news Indian stock market"
+
+
+def get_news_cache_stats() -> Dict[str, object]:
+    return _news_cache.stats()
+
+
+def clear_cache() -> None:
+    _news_cache.clear()
+
+
 def search_financial_news(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     """
     Scrapes DuckDuckGo specifically for news articles about a financial query.
     Returns a list of dictionaries with 'title', 'body', 'date', and 'url'.
+    Non-empty results are cached per (query, max_results); callers get their own copy.
     """
+    items = _news_cache.get_or_fetch(
+        (query, max_results),
+        lambda: _fetch_financial_news(query, max_results),
+        should_cache=bool,
+    )
+    return [dict(item) for item in items]
+
+
+@traced("duckduckgo.news", kind="io")
+def _fetch_financial_news(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     try:
         with DDGS() as ddgs:
             # We use 'news' to get current events
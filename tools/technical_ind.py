@@ -1,3 +1,5 @@
+import os
+
 import pandas as pd
 import numpy as np
 
@@ -55,6 +57,612 @@ def add_all_indicators(df: pd.DataFrame) -> pd.DataFrame:
         
         macd_df = calculate_macd(df)
         if not macd_df.empty:
-            df = pd.concat([df, macd_df], axis=1)
+            # Assign in place rather than concat, which would copy the whole frame again
+            for col in macd_df.columns:
+                df[col] = macd_df[col]
             
     return df
+
+
+# ============================================================
+# Compact prompt encoding
+# ============================================================
+
+# Input-token budget for the technical analyst's data block.
+TECHNICAL_PROMPT_TOKENS = int(os.getenv("TECHNICAL_PROMPT_TOKENS", "300"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about 4 characters per token) for budgeting prompts."""
+    return (len(text) + 3) // 4
+
+
+def _pct(value: float, digits: int = 1) -> str:
+    return f"{value:+.{digits}f}%"
+
+
+def _slope_pct(close: np.ndarray, n: int):
+    """Least-squares slope of log price over the last `n` bars, in % per bar, and its R^2."""
+    y = np.log(close[-n:])
+    x = np.arange(len(y), dtype=float)
+    slope, intercept = np.polyfit(x, y, 1)
+    residual = y - (slope * x + intercept)
+    total = ((y - y.mean()) ** 2).sum()
+    r2 = 1 - (residual ** 2).sum() / total if total > 0 else 0.0
+    return (np.exp(slope) - 1) * 100, r2
+
+
+def _rsi_regime(rsi: float) -> str:
+    if rsi >= 70:
+        return "overbought"
+    if rsi <= 30:
+        return "oversold"
+    return "bullish zone" if rsi >= 50 else "bearish zone"
+
+
+def _valid(row: pd.Series, *columns) -> bool:
+    return all(c in row.index and pd.notna(row[c]) for c in columns)
+
+
+def summarize_indicators(df: pd.DataFrame, ticker: str = "", max_tokens: int = TECHNICAL_PROMPT_TOKENS,
+                         rows: int = 10) -> str:
+    """
+    Encode the output of add_all_indicators() as a short text summary for an LLM prompt.
+
+    Derived features (returns, trend slopes, distance from moving averages, RSI
+    regime, MACD cross, volume z-score, volatility) come first, followed by a
+    fixed-precision table of the last `rows` bars. Table rows are dropped,
+    oldest first, until the estimate fits `max_tokens`; the features are always kept.
+    """
+    if df.empty or 'Close' not in df:
+        return f"No price data for {ticker}." if ticker else "No price data."
+
+    close = df['Close'].astype(float).values
+    last = df.iloc[-1]
+    price = float(last['Close'])
+
+    def change(n: int) -> str:
+        return _pct((price / close[-n - 1] - 1) * 100, 2) if len(close) > n else "n/a"
+
+    span = ""
+    if 'Date' in df:
+        span = f" to {str(last['Date'])[:10]}"
+    lines = [
+        f"{ticker + ' ' if ticker else ''}daily, {len(df)} bars{span}",
+        f"close {price:.2f} | chg 1d {change(1)} 5d {change(5)} 20d {change(20)}",
+    ]
+
+    slopes = []
+    for n in (10, 20):
+        if len(close) >= n:
+            slope, r2 = _slope_pct(close, n)
+            slopes.append(f"{n}d {_pct(slope, 2)} (r2 {r2:.2f})")
+    if slopes:
+        lines.append("trend slope/day: " + " ".join(slopes))
+
+    averages = [
+        f"{name.replace('_', '')} {last[name]:.2f} ({_pct((price / last[name] - 1) * 100)})"
+        for name in ('SMA_20', 'SMA_50', 'EMA_20') if _valid(last, name)
+    ]
+    if _valid(last, 'SMA_20', 'SMA_50'):
+        averages.append("SMA20>SMA50" if last['SMA_20'] > last['SMA_50'] else "SMA20<SMA50")
+    if averages:
+        lines.append(" ".join(averages))
+
+    if _valid(last, 'RSI_14'):
+        rsi = f"RSI14 {last['RSI_14']:.1f} {_rsi_regime(last['RSI_14'])}"
+        if len(df) > 5 and pd.notna(df['RSI_14'].iloc[-6]):
+            rsi += f" (5d ago {df['RSI_14'].iloc[-6]:.1f})"
+        lines.append(rsi)
+
+    if _valid(last, 'MACD_Line', 'MACD_Signal', 'MACD_Hist'):
+        hist = df['MACD_Hist'].dropna().values
+        side = "bullish" if hist[-1] > 0 else "bearish"
+        flips = np.nonzero(np.sign(hist[1:]) != np.sign(hist[:-1]))[0]
+        crossed = f", crossed {len(hist) - 2 - flips[-1]} bars ago" if len(flips) else ""
+        lines.append(
+            f"MACD {last['MACD_Line']:.2f} sig {last['MACD_Signal']:.2f} hist {last['MACD_Hist']:+.2f} {side}{crossed}"
+        )
+
+    if 'Volume' in df and len(df) > 20:
+        volume = df['Volume'].astype(float).values
+        prior = volume[-21:-1]
+        std = prior.std()
+        if std > 0:
+            z = (volume[-1] - prior.mean()) / std
+            lines.append(f"volume z20 {z:+.2f} ({volume[-1] / 1e6:.2f}M vs avg {prior.mean() / 1e6:.2f}M)")
+
+    if len(close) > 20:
+        returns = np.diff(np.log(close[-21:]))
+        lines.append(f"volatility 20d ann {returns.std(ddof=1) * np.sqrt(252) * 100:.1f}%")
+
+    header = "recent (date,close,rsi,macd_hist,vol_M):"
+    table = []
+    for _, row in df.tail(rows).iterrows():
+        cells = [
+            str(row['Date'])[5:10] if 'Date' in row.index else "",
+            f"{row['Close']:.2f}",
+            f"{row['RSI_14']:.1f}" if _valid(row, 'RSI_14') else "",
+            f"{row['MACD_Hist']:.2f}" if _valid(row, 'MACD_Hist') else "",
+            f"{row['Volume'] / 1e6:.2f}" if _valid(row, 'Volume') else "",
+        ]
+        table.append(",".join(cells))
+
+    summary = "\n".join(lines)
+    while table:
+        text = "\n".join([summary, header] + table)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        table.pop(0)
+    return summary
+
+
+# ============================================================
+# Rule-based technical scoring
+# ============================================================
+
+# Thresholds for the "clear-cut" states that carry the most weight.
+RULE_RSI_OVERSOLD = float(os.getenv("RULE_RSI_OVERSOLD", "25"))
+RULE_RSI_OVERBOUGHT = float(os.getenv("RULE_RSI_OVERBOUGHT", "80"))
+RULE_SMA50_DISTANCE = float(os.getenv("RULE_SMA50_DISTANCE", "0.10"))  # fraction above/below SMA_50
+RULE_MACD_CROSS_BARS = int(os.getenv("RULE_MACD_CROSS_BARS", "3"))  # a cross this recent counts as fresh
+
+_STRONG, _MILD = 3.0, 1.0
+
+
+def score_technicals(df: pd.DataFrame) -> dict:
+    """
+    Deterministic technical signal from the output of add_all_indicators().
+
+    Each rule votes bullish (+1) or bearish (-1) with a weight. Strong votes:
+    RSI beyond RULE_RSI_OVERSOLD/RULE_RSI_OVERBOUGHT (mean reversion), a MACD
+    cross in the last RULE_MACD_CROSS_BARS bars, and price more than
+    RULE_SMA50_DISTANCE from SMA_50 (trend). Mild votes: RSI side of 50, MACD
+    histogram sign, price vs SMA_20 and SMA_20 vs SMA_50.
+
+    Returns {"signal": "Bullish"|"Bearish"|"Neutral", "confidence": 0..1,
+    "score": -1..1, "reasons": [...]}. Confidence is the weighted agreement of
+    the votes, capped at 0.5 unless a strong vote supports the signal and none
+    opposes it, so conflicting setups are never reported as clear-cut.
+    """
+    votes = []  # (direction, weight, reason)
+    if df.empty or 'Close' not in df:
+        return {"signal": "Neutral", "confidence": 0.0, "score": 0.0, "reasons": ["no price data"]}
+    last = df.iloc[-1]
+    price = float(last['Close'])
+
+    if _valid(last, 'RSI_14'):
+        rsi = float(last['RSI_14'])
+        if rsi <= RULE_RSI_OVERSOLD:
+            votes.append((1, _STRONG, f"RSI14 {rsi:.1f} deeply oversold"))
+        elif rsi >= RULE_RSI_OVERBOUGHT:
+            votes.append((-1, _STRONG, f"RSI14 {rsi:.1f} deeply overbought"))
+        else:
+            votes.append((1 if rsi >= 50 else -1, _MILD, f"RSI14 {rsi:.1f} {_rsi_regime(rsi)}"))
+
+    if _valid(last, 'MACD_Hist'):
+        hist = df['MACD_Hist'].dropna().values
+        direction = 1 if hist[-1] > 0 else -1
+        flips = np.nonzero(np.sign(hist[1:]) != np.sign(hist[:-1]))[0]
+        bars_ago = len(hist) - 2 - flips[-1] if len(flips) else None
+        if bars_ago is not None and bars_ago < RULE_MACD_CROSS_BARS:
+            side = "bullish" if direction > 0 else "bearish"
+            votes.append((direction, _STRONG, f"fresh {side} MACD cross {bars_ago} bars ago"))
+        else:
+            votes.append((direction, _MILD, f"MACD histogram {hist[-1]:+.2f}"))
+
+    if _valid(last, 'SMA_50'):
+        distance = price / float(last['SMA_50']) - 1
+        if abs(distance) >= RULE_SMA50_DISTANCE:
+            side = "above" if distance > 0 else "below"
+            votes.append((1 if distance > 0 else -1, _STRONG, f"price {abs(distance):.1%} {side} SMA50"))
+        if _valid(last, 'SMA_20'):
+            above = last['SMA_20'] > last['SMA_50']
+            votes.append((1 if above else -1, _MILD, "SMA20 above SMA50" if above else "SMA20 below SMA50"))
+
+    if _valid(last, 'SMA_20'):
+        above = price > last['SMA_20']
+        votes.append((1 if above else -1, _MILD, "price above SMA20" if above else "price below SMA20"))
+
+    total = sum(weight for _, weight, _ in votes)
+    if not total:
+        return {"signal": "Neutral", "confidence": 0.0, "score": 0.0, "reasons": ["not enough history"]}
+    score = sum(direction * weight for direction, weight, _ in votes) / total
+    signal = "Bullish" if score > 0.2 else "Bearish" if score < -0.2 else "Neutral"
+    sign = np.sign(score)
+    supported = any(weight == _STRONG and direction == sign for direction, weight, _ in votes)
+    opposed = any(weight == _STRONG and direction == -sign for direction, weight, _ in votes)
+    confidence = abs(score) if supported and not opposed and signal != "Neutral" else min(abs(score), 0.5)
+    return {
+        "signal": signal,
+        "confidence": round(float(confidence), 3),
+        "score": round(float(score), 3),
+        "reasons": [reason for _, _, reason in votes],
+    }
+
+
+# ============================================================
+# Panel (multi-ticker) indicator engine
+# ============================================================
+
+PANEL_INDICATORS = ['SMA_20', 'SMA_50', 'EMA_20', 'RSI_14', 'MACD_Line', 'MACD_Signal', 'MACD_Hist']
+
+
+def _ema_panel(values: np.ndarray, spans) -> list:
+    """
+    EMAs (adjust=False, like pandas .ewm(span, adjust=False)) for several spans in
+    one pass over time, vectorized across columns. Each column's EMA is seeded
+    with its first non-NaN value, so tickers with shorter histories line up with
+    their per-ticker results.
+    """
+    alphas = [2.0 / (span + 1.0) for span in spans]
+    out = [np.full(values.shape, np.nan) for _ in spans]
+    prev = [np.full(values.shape[1], np.nan) for _ in spans]
+    for t in range(values.shape[0]):
+        x = values[t]
+        valid = ~np.isnan(x)
+        for k, alpha in enumerate(alphas):
+            p = prev[k]
+            seeded = ~np.isnan(p)
+            # Same arithmetic as pandas' ewm(adjust=False) so results match bit for bit
+            cur = np.where(seeded, ((1.0 - alpha) * p + alpha * x) / ((1.0 - alpha) + alpha), x)
+            cur = np.where(valid, cur, p)
+            out[k][t] = np.where(valid, cur, np.nan)
+            prev[k] = cur
+    return out
+
+
+def _rolling_mean_panel(values: np.ndarray, window: int) -> np.ndarray:
+    """Rolling mean over a full window of valid values (pandas rolling(window).mean())."""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    csum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(filled, axis=0)])
+    ccount = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(valid, axis=0)])
+    sums = csum[window:] - csum[:-window]
+    counts = ccount[window:] - ccount[:-window]
+    out = np.full(values.shape, np.nan)
+    out[window - 1:] = np.where(counts == window, sums / window, np.nan)
+    return out
+
+
+def compute_indicator_panel(close: pd.DataFrame) -> dict:
+    """
+    Computes SMA_20/SMA_50/EMA_20/RSI_14/MACD for every column of a wide
+    (date x ticker) close-price frame in one vectorized NumPy pass.
+
+    The EMA recursions for spans 12, 20 and 26 run together and feed both
+    EMA_20 and the MACD line, so nothing is computed twice. Interior gaps
+    (e.g. a ticker that didn't trade on a date) are forward-filled; leading gaps
+    are left as NaN so each ticker starts from its own first bar.
+
+    Returns {indicator_name: DataFrame shaped like `close`}.
+    """
+    if close.empty:
+        return {name: pd.DataFrame(index=close.index, columns=close.columns, dtype=float) for name in PANEL_INDICATORS}
+
+    values = close.astype(float).ffill().to_numpy()
+    ema12, ema20, ema26 = _ema_panel(values, (12, 20, 26))
+    macd_line = ema12 - ema26
+    (macd_signal,) = _ema_panel(macd_line, (9,))
+
+    # RSI (simple moving average of gains/losses, matching calculate_rsi)
+    delta = np.vstack([np.full((1, values.shape[1]), np.nan), np.diff(values, axis=0)])
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    # NaN before each ticker's first bar; the first bar itself counts as a zero move
+    no_price = np.isnan(values)
+    gains[no_price] = np.nan
+    losses[no_price] = np.nan
+    avg_gain = _rolling_mean_panel(gains, 14)
+    avg_loss = _rolling_mean_panel(losses, 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    arrays = {
+        'SMA_20': _rolling_mean_panel(values, 20),
+        'SMA_50': _rolling_mean_panel(values, 50),
+        'EMA_20': ema20,
+        'RSI_14': rsi,
+        'MACD_Line': macd_line,
+        'MACD_Signal': macd_signal,
+        'MACD_Hist': macd_line - macd_signal,
+    }
+    return {
+        name: pd.DataFrame(arr, index=close.index, columns=close.columns)
+        for name, arr in arrays.items()
+    }
+
+
+# Momentum and volatility columns added to snapshots: name -> bars looked back.
+SNAPSHOT_RETURNS = {'Return_1M': 21, 'Return_3M': 63}
+SNAPSHOT_VOLATILITY_BARS = 20
+
+
+def latest_indicator_snapshot(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per ticker with the latest Close and indicator values (ready for screening),
+    plus simple returns over SNAPSHOT_RETURNS and annualized volatility of the last
+    SNAPSHOT_VOLATILITY_BARS daily returns (NaN where a ticker's history is too short).
+    """
+    if close.empty:
+        return pd.DataFrame(columns=['Close'] + PANEL_INDICATORS + list(SNAPSHOT_RETURNS) + ['Volatility_20'])
+    panel = compute_indicator_panel(close)
+    values = close.astype(float).ffill().to_numpy()
+    snapshot = pd.DataFrame({'Close': values[-1]}, index=close.columns)
+    for name, frame in panel.items():
+        snapshot[name] = frame.iloc[-1]
+    for name, bars in SNAPSHOT_RETURNS.items():
+        snapshot[name] = values[-1] / values[-bars - 1] - 1 if len(values) > bars else np.nan
+    if len(values) > SNAPSHOT_VOLATILITY_BARS:
+        with np.errstate(invalid='ignore'):
+            log_returns = np.diff(np.log(values[-SNAPSHOT_VOLATILITY_BARS - 1:]), axis=0)
+        snapshot['Volatility_20'] = log_returns.std(axis=0, ddof=1) * np.sqrt(252)
+    else:
+        snapshot['Volatility_20'] = np.nan
+    snapshot.index.name = 'Ticker'
+    return snapshot
+
+
+def scan_indicator_universe(tickers, period: str = "6mo", interval: str = "1d", chunk_size: int = 100,
+                            fetch_missing: bool = True):
+    """
+    Streams indicator snapshots for a large universe (e.g. NIFTY 500).
+    Prices are pulled chunk by chunk with one batched download each, so memory
+    stays bounded. The next chunk is fetched on a background thread while the
+    current one is computed and screened by the caller. Yields one
+    latest_indicator_snapshot() frame per chunk.
+    With fetch_missing=False only cached/stored prices are used.
+    """
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+
+    from tools.market_data import get_stock_history_bulk
+
+    tickers = list(tickers)
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    if not chunks:
+        return
+
+    def fetch(chunk):
+        return get_stock_history_bulk(chunk, period=period, interval=interval, fetch_missing=fetch_missing)
+
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-prefetch")
+    try:
+        pending = pool.submit(contextvars.copy_context().run, fetch, chunks[0])
+        for i in range(len(chunks)):
+            close = pending.result()
+            if i + 1 < len(chunks):
+                pending = pool.submit(contextvars.copy_context().run, fetch, chunks[i + 1])
+            if not close.empty:
+                yield latest_indicator_snapshot(close)
+    finally:
+        # A consumer that stops early shouldn't wait for a download it won't use
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ============================================================
+# Incremental (per-bar) indicator state for live updates
+# ============================================================
+
+class RunningEMA:
+    """
+    EMA updated one bar at a time; matches calculate_ema (pandas ewm(span, adjust=False)).
+    `value` is available from the first bar; `ready` mirrors calculate_ema's
+    requirement of at least `span` bars.
+    """
+
+    def __init__(self, span: int, value: float = None, count: int = 0):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = value
+        self.count = count
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = float(x)
+        else:
+            a = self.alpha
+            self.value = ((1.0 - a) * self.value + a * x) / ((1.0 - a) + a)
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.span
+
+    def to_dict(self) -> dict:
+        return {"span": self.span, "value": self.value, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningEMA":
+        return cls(state["span"], state["value"], state["count"])
+
+
+class RollingSMA:
+    """
+    Simple moving average over a fixed-size ring buffer with a compensated
+    running sum, so each update is O(1). Matches calculate_sma within float rounding.
+    """
+
+    def __init__(self, window: int, buffer: list = None, pos: int = 0, count: int = 0,
+                 total: float = 0.0, compensation: float = 0.0):
+        self.window = window
+        self.buffer = list(buffer) if buffer is not None else [0.0] * window
+        self.pos = pos
+        self.count = count
+        self.total = total
+        self.compensation = compensation
+
+    def _add(self, x: float) -> None:
+        # Kahan summation keeps the running sum from drifting over long sessions
+        y = x - self.compensation
+        t = self.total + y
+        self.compensation = (t - self.total) - y
+        self.total = t
+
+    def update(self, x: float) -> float:
+        if self.count >= self.window:
+            self._add(-self.buffer[self.pos])
+        self.buffer[self.pos] = float(x)
+        self._add(float(x))
+        self.pos = (self.pos + 1) % self.window
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.window
+
+    @property
+    def value(self) -> float:
+        return self.total / self.window if self.ready else float("nan")
+
+    def to_dict(self) -> dict:
+        return {
+            "window": self.window, "buffer": list(self.buffer), "pos": self.pos,
+            "count": self.count, "total": self.total, "compensation": self.compensation,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RollingSMA":
+        return cls(**state)
+
+
+class RollingRSI:
+    """
+    RSI updated one bar at a time. By default it uses the same simple average of
+    gains/losses as calculate_rsi, so live values agree with the batch numbers the
+    analysts see; the first bar counts as a zero move, as in the batch version.
+    With wilder=True the averages switch to Wilder smoothing once the first
+    `window` bars have seeded them.
+    """
+
+    def __init__(self, window: int = 14, wilder: bool = False, last: float = None,
+                 gains: dict = None, losses: dict = None,
+                 avg_gain: float = None, avg_loss: float = None):
+        self.window = window
+        self.wilder = wilder
+        self.last = last
+        self.gains = RollingSMA.from_dict(gains) if gains else RollingSMA(window)
+        self.losses = RollingSMA.from_dict(losses) if losses else RollingSMA(window)
+        self.avg_gain = avg_gain
+        self.avg_loss = avg_loss
+
+    def update(self, x: float) -> float:
+        delta = 0.0 if self.last is None else float(x) - self.last
+        self.last = float(x)
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if self.wilder and self.avg_gain is not None:
+            n = self.window
+            self.avg_gain = (self.avg_gain * (n - 1) + gain) / n
+            self.avg_loss = (self.avg_loss * (n - 1) + loss) / n
+        else:
+            self.gains.update(gain)
+            self.losses.update(loss)
+            if self.wilder and self.gains.ready:
+                self.avg_gain, self.avg_loss = self.gains.value, self.losses.value
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.gains.ready
+
+    @property
+    def value(self) -> float:
+        if not self.ready:
+            return float("nan")
+        if self.wilder:
+            gain, loss = self.avg_gain, self.avg_loss
+        else:
+            gain, loss = self.gains.value, self.losses.value
+        if loss == 0:
+            return 100.0 if gain > 0 else float("nan")
+        return 100 - (100 / (1 + gain / loss))
+
+    def to_dict(self) -> dict:
+        return {"window": self.window, "wilder": self.wilder, "last": self.last,
+                "gains": self.gains.to_dict(), "losses": self.losses.to_dict(),
+                "avg_gain": self.avg_gain, "avg_loss": self.avg_loss}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RollingRSI":
+        return cls(**state)
+
+
+class RunningMACD:
+    """MACD line, signal and histogram updated one bar at a time; matches calculate_macd."""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9,
+                 fast_ema: dict = None, slow_ema: dict = None, signal_ema: dict = None):
+        self.fast_ema = RunningEMA.from_dict(fast_ema) if fast_ema else RunningEMA(fast)
+        self.slow_ema = RunningEMA.from_dict(slow_ema) if slow_ema else RunningEMA(slow)
+        self.signal_ema = RunningEMA.from_dict(signal_ema) if signal_ema else RunningEMA(signal)
+
+    def update(self, x: float) -> dict:
+        line = self.fast_ema.update(x) - self.slow_ema.update(x)
+        signal = self.signal_ema.update(line)
+        return {"MACD_Line": line, "MACD_Signal": signal, "MACD_Hist": line - signal}
+
+    @property
+    def ready(self) -> bool:
+        return self.slow_ema.ready
+
+    def to_dict(self) -> dict:
+        return {"fast_ema": self.fast_ema.to_dict(), "slow_ema": self.slow_ema.to_dict(),
+                "signal_ema": self.signal_ema.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningMACD":
+        return cls(**state)
+
+
+class IncrementalIndicators:
+    """
+    The add_all_indicators() set (SMA_20, SMA_50, EMA_20, RSI_14, MACD) kept
+    current one bar at a time. State is plain JSON-serializable data via
+    to_dict()/from_dict(), so it can be persisted between sessions and
+    restored without re-scanning history.
+    """
+
+    def __init__(self, sma_20: dict = None, sma_50: dict = None, ema_20: dict = None,
+                 rsi_14: dict = None, macd: dict = None, last: dict = None):
+        self.sma_20 = RollingSMA.from_dict(sma_20) if sma_20 else RollingSMA(20)
+        self.sma_50 = RollingSMA.from_dict(sma_50) if sma_50 else RollingSMA(50)
+        self.ema_20 = RunningEMA.from_dict(ema_20) if ema_20 else RunningEMA(20)
+        self.rsi_14 = RollingRSI.from_dict(rsi_14) if rsi_14 else RollingRSI(14)
+        self.macd = RunningMACD.from_dict(macd) if macd else RunningMACD()
+        self.last = dict(last) if last else {}
+
+    @classmethod
+    def from_history(cls, closes) -> "IncrementalIndicators":
+        """Warm up from a series/list of historical closes."""
+        state = cls()
+        for x in closes:
+            if not pd.isna(x):
+                state.update(x)
+        return state
+
+    def update(self, close: float) -> dict:
+        """Feed one closing price and return the latest indicator values."""
+        values = {
+            "Close": float(close),
+            "SMA_20": self.sma_20.update(close),
+            "SMA_50": self.sma_50.update(close),
+            "EMA_20": self.ema_20.update(close),
+            "RSI_14": self.rsi_14.update(close),
+        }
+        values.update(self.macd.update(close))
+        self.last = values
+        return values
+
+    def to_dict(self) -> dict:
+        return {
+            "sma_20": self.sma_20.to_dict(), "sma_50": self.sma_50.to_dict(),
+            "ema_20": self.ema_20.to_dict(), "rsi_14": self.rsi_14.to_dict(),
+            "macd": self.macd.to_dict(), "last": dict(self.last),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "IncrementalIndicators":
+        return cls(**state)